@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import Field, ValidationError
 from pydantic_settings import BaseSettings
 
@@ -37,6 +39,11 @@ class Settings(BaseSettings):
         env="AZURE_OPEN_AI_LLM_EVAL_MODEL_NAME"
     )
 
+    # Embedding cache, an SQLite database of already computed embeddings
+    EMBEDDING_CACHE_PATH: Optional[str] = Field(
+        default=None, env="EMBEDDING_CACHE_PATH"
+    )
+
     # Misc
     NLTK_DATA: str = Field(env="NLTK_DATA")
 
@@ -13,6 +13,7 @@ from ragathon.data.models import (
 from ragathon.llms.azure import instantiate_llm_for_rag
 from ragathon.llms.common import LLM
 from ragathon.pipelines.common import RAGPipelineOutput
+from ragathon.pipelines.journal import RunJournal, get_query_id
 from ragathon.utils.strings import generate_id
 
 
@@ -25,13 +26,12 @@ class PipelineEvaluator:
         self._llm: LLM = instantiate_llm_for_rag(settings=app_settings)
 
     async def run(self) -> None:
-        outputs = await self._load_outputs()
         questions = await self._load_questions()
-
-        question_to_output = {out.query_info.original_query: out for out in outputs}
+        question_to_output = await self._load_outputs(q_set=questions)
 
         logger.debug(
-            f"Loaded {len(outputs)} outputs and {len(questions.questions)} questions."
+            f"Loaded {len(question_to_output)} outputs and "
+            f"{len(questions.questions)} questions."
         )
 
         # Compute the reciprocal rank metric for each questions
@@ -86,14 +86,23 @@ class PipelineEvaluator:
 
         return metrics
 
-    async def _load_outputs(self) -> List[RAGPipelineOutput]:
-        outputs: List[RAGPipelineOutput] = []
-
-        async with aio_open(self._pipeline_result_path, mode="r") as f:
-            async for line in f:
-                outputs.append(RAGPipelineOutput.model_validate_json(json_data=line))
-
-        return outputs
+    async def _load_outputs(
+        self, q_set: SyntheticQuestionSet
+    ) -> Dict[str, RAGPipelineOutput]:
+        # Only read the outputs of the questions, instead of the whole run
+        question_to_output: Dict[str, RAGPipelineOutput] = {}
+
+        journal = RunJournal(log_path=self._pipeline_result_path, read_only=True)
+        await journal.open()
+        try:
+            for item in q_set.questions:
+                output = await journal.read(query_id=get_query_id(query=item.question))
+                if output is not None:
+                    question_to_output[item.question] = output
+        finally:
+            await journal.close()
+
+        return question_to_output
 
     async def _load_questions(self) -> SyntheticQuestionSet:
         async with aio_open(self._questions_file_path, mode="r") as file:
@@ -1,5 +1,11 @@
+import hashlib
+import os
 from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List
 
+import numpy as np
+from numpy.typing import NDArray
 from pydantic import BaseModel, Field
 
 from ragathon.data.models import ChunkedTextSet, SearchResult
@@ -19,6 +25,45 @@ class CorpusItem(BaseModel):
     """Text of the chunk."""
 
 
+def fingerprint_directory(directory: Path) -> str:
+    """Compute a fingerprint of the files in a directory.
+
+    The fingerprint is based on the path, size and modification time of every file,
+    so it changes whenever a file is written, without reading the contents.
+
+    Args:
+        directory (Path): The directory to fingerprint.
+
+    Returns:
+        str: The fingerprint, as a hexadecimal string.
+    """
+    digest = hashlib.sha256(str(directory.resolve()).encode("utf-8"))
+    if directory.exists():
+        for path in sorted(directory.rglob("*")):
+            if not path.is_file():
+                continue
+            stat = path.stat()
+            entry = f"{path.relative_to(directory)}:{stat.st_size}:{stat.st_mtime_ns}"
+            digest.update(entry.encode("utf-8") + b"\n")
+
+    return digest.hexdigest()
+
+
+def save_array(path: Path, array: NDArray) -> None:
+    """Save an array to a `.npy` file by replacing the file instead of overwriting it.
+
+    Processes that memory-map the previous file keep reading its contents, rather
+    than seeing a partially written file or crashing because it was truncated.
+
+    Args:
+        path (Path): The path of the `.npy` file.
+        array (NDArray): The array to save.
+    """
+    temporary_path = path.with_suffix(".tmp.npy")
+    np.save(temporary_path, array)
+    os.replace(temporary_path, path)
+
+
 class Indexer(ABC):
     """Abstract class for indexing models."""
 
@@ -49,6 +94,34 @@ class Indexer(ABC):
         """
         raise NotImplementedError
 
+    async def search_many(self, queries: List[str], k: int) -> List[SearchResult]:
+        """Search for each of the given queries.
+
+        The default implementation calls `search()` once per query. Indexers that can
+        score a batch of queries more efficiently should override this method.
+
+        Args:
+            queries (List[str]): The queries to search for.
+            k (int): The number of results to return for each query.
+
+        Returns:
+            List[SearchResult]: One search result per query, in the same order as
+                `queries`.
+        """
+        return [await self.search(query=query, k=k) for query in queries]
+
+    @abstractmethod
+    async def fingerprint(self) -> str:
+        """Get a fingerprint of the stored index.
+
+        The fingerprint changes whenever the index is created, rebuilt or updated,
+        which lets caches detect that their entries are stale.
+
+        Returns:
+            str: The fingerprint.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     async def exists(self) -> bool:
         """Check if the index exists.
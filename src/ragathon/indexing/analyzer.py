@@ -0,0 +1,161 @@
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional
+
+import nltk
+from aiofiles import open as aio_open
+from nltk.stem import SnowballStemmer
+from nltk.stem.api import StemmerI
+
+STEM_TABLE_FILE_NAME = "stems.index.json"
+
+# Same token pattern as the default one used by `bm25s.tokenize`
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+
+class BM25Analyzer:
+    """Turns texts into lists of stemmed terms for BM25.
+
+    Stemming is the expensive part of the analysis, so the result of stemming every
+    term is kept in a term-to-stem table. The table is filled while indexing and saved
+    next to the index. When searching, the table is only read: terms that are not in
+    it (unseen query terms) are stemmed through a bounded LRU cache instead, so the
+    table does not grow with the query traffic.
+    """
+
+    def __init__(
+        self,
+        stemmer: StemmerI,
+        stop_words: Iterable[str],
+        stem_table: Optional[Dict[str, str]] = None,
+        lru_size: int = 10_000,
+    ) -> None:
+        """Initialize the analyzer.
+
+        Args:
+            stemmer (StemmerI): The stemmer used for terms not in the stem table.
+            stop_words (Iterable[str]): The stop words to remove.
+            stem_table (Optional[Dict[str, str]], optional): An initial term-to-stem
+                table. Defaults to an empty table.
+            lru_size (int, optional): The maximum number of unseen terms to keep in
+                the LRU cache. Defaults to 10_000.
+        """
+        self._stemmer: StemmerI = stemmer
+        self._stop_words: FrozenSet[str] = frozenset(stop_words)
+        self._stem_table: Dict[str, str] = dict(stem_table or {})
+        self._split: Callable[[str], List[str]] = re.compile(TOKEN_PATTERN).findall
+        self._stem_unseen: Callable[[str], str] = lru_cache(maxsize=lru_size)(
+            self._stemmer.stem
+        )
+
+    @classmethod
+    def for_language(cls, language: str) -> "BM25Analyzer":
+        """Create an analyzer using the Snowball stemmer and NLTK stop words.
+
+        Args:
+            language (str): The language of the texts, e.g. "danish".
+
+        Returns:
+            BM25Analyzer: The analyzer.
+        """
+        return cls(
+            stemmer=SnowballStemmer(language=language),
+            stop_words=nltk.corpus.stopwords.words(language),
+        )
+
+    @property
+    def stop_words(self) -> FrozenSet[str]:
+        """The stop words removed by this analyzer."""
+        return self._stop_words
+
+    @property
+    def stem_table(self) -> Dict[str, str]:
+        """The term-to-stem table."""
+        return self._stem_table
+
+    def analyze(self, text: str, learn: bool = False) -> List[str]:
+        """Split a text into lower-cased, stemmed terms without stop words.
+
+        Args:
+            text (str): The text to analyze.
+            learn (bool, optional): Whether to add unseen terms to the stem table.
+                Defaults to False.
+
+        Returns:
+            List[str]: The stemmed terms.
+        """
+        return self.stem(
+            tokens=[
+                token
+                for token in self._split(text.lower())
+                if token not in self._stop_words
+            ],
+            learn=learn,
+        )
+
+    def analyze_many(self, texts: List[str], learn: bool = False) -> List[List[str]]:
+        """Analyze each of the given texts.
+
+        Args:
+            texts (List[str]): The texts to analyze.
+            learn (bool, optional): Whether to add unseen terms to the stem table.
+                Defaults to False.
+
+        Returns:
+            List[List[str]]: The stemmed terms of each text.
+        """
+        return [self.analyze(text=text, learn=learn) for text in texts]
+
+    def stem(self, tokens: List[str], learn: bool = False) -> List[str]:
+        """Stem the given tokens using the stem table.
+
+        Args:
+            tokens (List[str]): The tokens to stem.
+            learn (bool, optional): Whether to add unseen terms to the stem table. If
+                False, unseen terms are stemmed through the LRU cache. Defaults to
+                False.
+
+        Returns:
+            List[str]: The stemmed tokens.
+        """
+        stem_table = self._stem_table
+        result: List[str] = []
+
+        for token in tokens:
+            stem = stem_table.get(token)
+            if stem is None:
+                if learn:
+                    stem = self._stemmer.stem(token)
+                    stem_table[token] = stem
+                else:
+                    stem = self._stem_unseen(token)
+            result.append(stem)
+
+        return result
+
+    async def save(self, storage_dir: Path) -> None:
+        """Save the stem table to the given directory.
+
+        Args:
+            storage_dir (Path): The directory to save the stem table to.
+        """
+        async with aio_open(storage_dir / STEM_TABLE_FILE_NAME, mode="w") as f:
+            await f.write(json.dumps(self._stem_table, ensure_ascii=False))
+
+    async def load(self, storage_dir: Path) -> None:
+        """Load the stem table from the given directory, if it exists.
+
+        The loaded entries are added to the current table.
+
+        Args:
+            storage_dir (Path): The directory to load the stem table from.
+        """
+        stem_table_path = storage_dir / STEM_TABLE_FILE_NAME
+        if not stem_table_path.exists():
+            return
+
+        async with aio_open(stem_table_path, mode="r") as f:
+            content = await f.read()
+            self._stem_table.update(json.loads(content))
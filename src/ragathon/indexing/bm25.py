@@ -1,57 +1,224 @@
+import json
+import math
+from enum import StrEnum
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 
 import bm25s
-import nltk
+import numpy as np
+from aiofiles import open as aio_open
 from loguru import logger
-from nltk.stem import SnowballStemmer
+from pydantic import BaseModel, Field
 
-from ragathon.data.models import ChunkedTextSet, MatchedChunk, SearchResult
-from ragathon.indexing import CorpusItem, Indexer
+from ragathon.data.models import (
+    ChunkedText,
+    ChunkedTextSet,
+    MatchedChunk,
+    SearchResult,
+)
+from ragathon.indexing import CorpusItem, Indexer, fingerprint_directory
+from ragathon.indexing.analyzer import BM25Analyzer
+from ragathon.indexing.corpus import JsonlCorpusReader
+from ragathon.indexing.delta import (
+    STATS_FILE_NAME,
+    BM25CollectionStats,
+    BM25DeltaSegment,
+)
+from ragathon.indexing.maxscore import (
+    MaxScoreScorer,
+    compute_max_impacts,
+    load_max_impacts,
+    save_max_impacts,
+)
 
 BM25_INDEX_FILE_NAME = "params.index.json"
+BM25_CORPUS_FILE_NAME = "corpus.jsonl"
+TERM_STATISTICS_FILE_NAME = "term_stats.index.json"
+
+
+class BM25Engine(StrEnum):
+    """The algorithm used to retrieve the top k documents of a query."""
+
+    EXHAUSTIVE = "exhaustive"
+    """Score every document containing a query term with `bm25s`, then select the
+    top k."""
+
+    MAX_SCORE = "maxscore"
+    """Process the query terms by descending maximum impact and stop reading posting
+    lists once the remaining terms cannot lift a new document into the top k."""
+
+
+class BM25TermStatistics(BaseModel):
+    """Term statistics of a document collection, used to compute the IDF of terms."""
+
+    num_docs: int = Field(..., description="Number of documents in the collection.")
+    """Number of documents in the collection."""
+
+    document_frequencies: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Number of documents containing each term.",
+    )
+    """Number of documents containing each term."""
+
+    @classmethod
+    def from_tokens(cls, texts_tokens: List[List[str]]) -> "BM25TermStatistics":
+        """Compute the term statistics of analyzed documents.
+
+        Args:
+            texts_tokens (List[List[str]]): The analyzed terms of every document.
+
+        Returns:
+            BM25TermStatistics: The term statistics.
+        """
+        document_frequencies: Dict[str, int] = {}
+        for tokens in texts_tokens:
+            for token in set(tokens):
+                document_frequencies[token] = document_frequencies.get(token, 0) + 1
+
+        return cls(
+            num_docs=len(texts_tokens), document_frequencies=document_frequencies
+        )
+
+    def updated(
+        self, removed_tokens: List[List[str]], added_tokens: List[List[str]]
+    ) -> "BM25TermStatistics":
+        """Get the statistics of the collection after some documents were changed.
+
+        Args:
+            removed_tokens (List[List[str]]): The analyzed terms of every document
+                removed from the collection.
+            added_tokens (List[List[str]]): The analyzed terms of every document
+                added to the collection.
+
+        Returns:
+            BM25TermStatistics: The updated term statistics.
+        """
+        document_frequencies = dict(self.document_frequencies)
+        for tokens in removed_tokens:
+            for token in set(tokens):
+                document_frequency = document_frequencies.get(token, 0) - 1
+                if document_frequency > 0:
+                    document_frequencies[token] = document_frequency
+                else:
+                    document_frequencies.pop(token, None)
+        for tokens in added_tokens:
+            for token in set(tokens):
+                document_frequencies[token] = document_frequencies.get(token, 0) + 1
+
+        return BM25TermStatistics(
+            num_docs=self.num_docs - len(removed_tokens) + len(added_tokens),
+            document_frequencies=document_frequencies,
+        )
 
 
 class BM25Index(Indexer):
-    def __init__(self, storage_dir: Path, language: str) -> None:
+    def __init__(
+        self,
+        storage_dir: Path,
+        language: str,
+        n_threads: int = -1,
+        mmap: bool = False,
+        merge_threshold: int = 1000,
+        analyzer: Optional[BM25Analyzer] = None,
+        engine: BM25Engine = BM25Engine.EXHAUSTIVE,
+        stem_table_dir: Optional[Path] = None,
+    ) -> None:
+        """Initialize the BM25 index.
+
+        Args:
+            storage_dir (Path): The directory where the index is stored.
+            language (str): The language used for stemming and stop words.
+            n_threads (int, optional): The number of threads used when searching for
+                a batch of queries. -1 uses all available CPUs. Defaults to -1.
+            mmap (bool, optional): Whether `load()` should memory-map the score
+                arrays and leave the corpus on disk, decoding only the retrieved
+                items. Defaults to False.
+            merge_threshold (int, optional): The number of added and deleted chunks
+                after which the delta segment is merged into the base index.
+                Defaults to 1000.
+            analyzer (Optional[BM25Analyzer], optional): The analyzer to use, e.g. to
+                share one stem table between several indices. If None, an analyzer
+                for `language` is created.
+            engine (BM25Engine, optional): The retrieval algorithm. MaxScore pays off
+                for large corpora and small k. Defaults to BM25Engine.EXHAUSTIVE.
+            stem_table_dir (Optional[Path], optional): The directory where the stem
+                table of the analyzer is stored, e.g. to store one table for several
+                indices. Defaults to `storage_dir`.
+        """
         self._storage_dir = storage_dir
         self._language = language
+        self._n_threads = n_threads
+        self._mmap = mmap
+        self._merge_threshold = merge_threshold
         self._model: Optional[bm25s.BM25] = None
-        self._stemmer = SnowballStemmer(language=language)
-        self._stop_words: List[str] = nltk.corpus.stopwords.words(language)
+        self._corpus: Optional[Sequence[Dict[str, Any]]] = None
+        self._stats: Optional[BM25CollectionStats] = None
+        self._term_statistics: Optional[BM25TermStatistics] = None
+        self._base_chunk_ids: Optional[Set[str]] = None
+        self._analyzer: BM25Analyzer = analyzer or BM25Analyzer.for_language(
+            language=language
+        )
+        self._delta: BM25DeltaSegment = BM25DeltaSegment()
+        self._engine = engine
+        self._stem_table_dir: Path = stem_table_dir or storage_dir
+        self._max_score: Optional[MaxScoreScorer] = None
 
-    async def create(self, data_set: ChunkedTextSet) -> None:
+    async def create(
+        self,
+        data_set: ChunkedTextSet,
+        term_statistics: Optional[BM25TermStatistics] = None,
+    ) -> None:
         """Create a BM25 index from the given data set.
 
         Args:
             data_set (ChunkedTextSet): The data set to create the index from.
+            term_statistics (Optional[BM25TermStatistics], optional): Statistics of a
+                larger collection that the data set is part of. If given, the IDF of
+                every term is computed from these statistics instead of from the data
+                set, so that scores are comparable across indices built from parts of
+                the same collection. They are saved with the index, and kept up to
+                date with the chunks added and deleted later on. Defaults to None.
         """
-        texts = [chunk.text for chunk in data_set.chunks]
+        await self._build(chunks=data_set.chunks, term_statistics=term_statistics)
+
+    async def load(self) -> None:
+        """Load the BM25 model from the storage directory.
 
-        texts_tokens = bm25s.tokenize(
-            texts=texts, stopwords=self._stop_words, stemmer=self._stem
+        In mmap mode the score arrays are memory-mapped and the corpus stays on disk,
+        so loading does not depend on the size of the corpus.
+        """
+        self._model = bm25s.BM25.load(
+            save_dir=self._storage_dir, load_corpus=False, mmap=self._mmap
         )
+        await self._analyzer.load(storage_dir=self._stem_table_dir)
 
-        self._model = bm25s.BM25()
-        self._model.index(texts_tokens)
+        if isinstance(self._corpus, JsonlCorpusReader):
+            self._corpus.close()
 
-        # Build the corpus that will be saved with the model
-        corpus = [
-            CorpusItem(
-                index=index,
-                chunk_id=chunk.id,
-                section_id=chunk.section_id,
-                text=chunk.text,
-            ).model_dump()
-            for index, chunk in enumerate(data_set.chunks)
-        ]
+        corpus_path = self._storage_dir / BM25_CORPUS_FILE_NAME
+        if self._mmap:
+            self._corpus = JsonlCorpusReader(corpus_path=corpus_path)
+        else:
+            async with aio_open(corpus_path, mode="r") as f:
+                self._corpus = [json.loads(line) async for line in f]
 
-        assert self._model is not None
-        self._model.save(save_dir=self._storage_dir, corpus=corpus)
+        self._stats = None
+        stats_path = self._storage_dir / STATS_FILE_NAME
+        if stats_path.exists():
+            async with aio_open(stats_path, mode="r") as f:
+                self._stats = BM25CollectionStats.model_validate_json(await f.read())
 
-    async def load(self) -> None:
-        """Load the BM25 model from the storage directory."""
-        self._model = bm25s.BM25.load(save_dir=self._storage_dir, load_corpus=True)
+        self._term_statistics = None
+        term_statistics_path = self._storage_dir / TERM_STATISTICS_FILE_NAME
+        if term_statistics_path.exists():
+            async with aio_open(term_statistics_path, mode="r") as f:
+                self._term_statistics = BM25TermStatistics.model_validate_json(
+                    await f.read()
+                )
+
+        self._init_max_score_scorer()
+        self._base_chunk_ids = None
+        await self._delta.load(storage_dir=self._storage_dir, analyzer=self._analyzer)
 
     async def search(self, query: str, k: int) -> SearchResult:
         """Search for the given query.
@@ -63,42 +230,232 @@ class BM25Index(Indexer):
         Returns:
             SearchResult: The search result.
         """
+        results = await self.search_many(queries=[query], k=k)
+        return results[0]
+
+    async def search_many(self, queries: List[str], k: int) -> List[SearchResult]:
+        """Search for all the given queries in a single batch.
+
+        The queries are tokenized together and handed to the BM25 model as one query
+        matrix, which avoids paying the per-call overhead once per query. Chunks that
+        were added or deleted since the index was built are taken into account.
+
+        Args:
+            queries (List[str]): The queries to search for.
+            k (int): The number of results to return for each query.
+
+        Returns:
+            List[SearchResult]: One search result per query, in the same order as
+                `queries`.
+        """
+        return self.search_many_sync(queries=queries, k=k)
+
+    def search_many_sync(self, queries: List[str], k: int) -> List[SearchResult]:
+        """Synchronous version of `search_many()`, usable from worker threads.
+
+        Args:
+            queries (List[str]): The queries to search for.
+            k (int): The number of results to return for each query.
+
+        Returns:
+            List[SearchResult]: One search result per query, in the same order as
+                `queries`.
+        """
 
-        if self._model is None:
+        if self._model is None or self._corpus is None:
             raise ValueError(
                 "The BM25 model has not been loaded. Please create or load it first"
             )
 
-        logger.debug(f"Searching for query: {query}")
-        query_tokens = bm25s.tokenize(
-            texts=query, stopwords=self._stop_words, stemmer=self._stem
-        )
+        if len(queries) == 0:
+            return []
+
+        logger.debug(f"Searching for {len(queries)} queries")
+        query_tokens = self._analyzer.analyze_many(texts=queries)
+
+        # Fetch enough results from the base index to still have k results after
+        # dropping the deleted chunks
+        tombstones = self._delta.tombstones
+        k_base = min(k + len(tombstones), self._model.scores["num_docs"])
+
+        if self._max_score is not None:
+            indices, scores = self._retrieve_max_score(
+                query_tokens=query_tokens, k=k_base
+            )
+        else:
+            indices, scores = self._retrieve_exhaustive(
+                query_tokens=query_tokens, k=k_base
+            )
 
-        # Perform the search
+        results: List[SearchResult] = []
+        for i, query in enumerate(queries):
+            hits = [
+                (score, self._corpus[index])
+                for index, score in zip(indices[i], scores[i])
+            ]
+
+            if not self._delta.is_empty:
+                hits = [hit for hit in hits if hit[1]["chunk_id"] not in tombstones]
+                hits = sorted(
+                    hits + self._score_delta(query_terms=query_tokens[i]),
+                    key=lambda hit: hit[0],
+                    reverse=True,
+                )
+
+            results.append(self._build_search_result(query=query, hits=hits[:k]))
+
+        return results
+
+    def _retrieve_exhaustive(
+        self, query_tokens: List[List[str]], k: int
+    ) -> Tuple[List[List[int]], List[List[float]]]:
+        """Retrieve the top k documents of every query by scoring all matches.
+
+        Args:
+            query_tokens (List[List[str]]): The analyzed terms of every query.
+            k (int): The number of documents to retrieve per query.
+
+        Returns:
+            Tuple[List[List[int]], List[List[float]]]: The corpus indices and scores
+                of the retrieved documents of every query.
+        """
+        # Multithreading only pays off for more than one query. The model has no
+        # corpus attached, so it returns the document indices and only the retrieved
+        # items are looked up in the corpus.
         assert self._model is not None
-        results, scores = self._model.retrieve(
-            query_tokens=query_tokens,  # pyre-ignore[6]
+        indices, scores = self._model.retrieve(
+            query_tokens=query_tokens,
             k=k,
-            show_progress=True,
+            show_progress=False,
+            n_threads=self._n_threads if len(query_tokens) > 1 else 0,
         )
+        return indices.tolist(), scores.tolist()
 
-        # Build the search result
-        result: SearchResult = SearchResult(query=query)
+    def _retrieve_max_score(
+        self, query_tokens: List[List[str]], k: int
+    ) -> Tuple[List[List[int]], List[List[float]]]:
+        """Retrieve the top k documents of every query with MaxScore pruning.
 
-        for i in range(results.shape[1]):
-            corpus_item = CorpusItem(**results[0, i])
-            score = scores[0, i]
+        Unlike the exhaustive engine, documents that match none of the query terms are
+        never returned, so fewer than k documents may be retrieved.
 
-            matched_chunk = MatchedChunk(
-                chunk_id=corpus_item.chunk_id,
-                section_id=corpus_item.section_id,
-                chunk_text=corpus_item.text,
-                rank=i + 1,
-                score=score,
+        Args:
+            query_tokens (List[List[str]]): The analyzed terms of every query.
+            k (int): The number of documents to retrieve per query.
+
+        Returns:
+            Tuple[List[List[int]], List[List[float]]]: The corpus indices and scores
+                of the retrieved documents of every query.
+        """
+        assert self._model is not None and self._max_score is not None
+        vocab = self._model.vocab_dict
+
+        all_indices: List[List[int]] = []
+        all_scores: List[List[float]] = []
+        for tokens in query_tokens:
+            token_ids = [vocab[token] for token in tokens if token in vocab]
+            indices, scores = self._max_score.top_k(token_ids=token_ids, k=k)
+            all_indices.append(indices)
+            all_scores.append(scores)
+
+        return all_indices, all_scores
+
+    async def add(self, chunks: List[ChunkedText]) -> None:
+        """Add chunks to the index without rebuilding it.
+
+        The chunks are stored in a delta segment that is searched together with the
+        base index. Chunks with the ID of an existing chunk replace that chunk.
+
+        Args:
+            chunks (List[ChunkedText]): The chunks to add.
+        """
+        base_chunk_ids = self._get_base_chunk_ids()
+
+        for chunk in chunks:
+            if chunk.id in base_chunk_ids:
+                self._delta.tombstone(chunk_id=chunk.id)
+
+            item = CorpusItem(
+                index=len(self._delta),
+                chunk_id=chunk.id,
+                section_id=chunk.section_id,
+                text=chunk.text,
+            ).model_dump()
+            terms = self._analyzer.analyze(text=chunk.text, learn=True)
+            self._delta.add(item=item, terms=terms)
+
+        await self._save_delta_or_merge()
+
+    async def delete(self, chunk_ids: List[str]) -> None:
+        """Delete chunks from the index without rebuilding it.
+
+        Args:
+            chunk_ids (List[str]): The IDs of the chunks to delete.
+        """
+        base_chunk_ids = self._get_base_chunk_ids()
+
+        for chunk_id in chunk_ids:
+            self._delta.remove(chunk_id=chunk_id)
+            if chunk_id in base_chunk_ids:
+                self._delta.tombstone(chunk_id=chunk_id)
+
+        await self._save_delta_or_merge()
+
+    async def merge(self) -> None:
+        """Merge the delta segment into the base index by rebuilding it."""
+        if self._corpus is None:
+            raise ValueError(
+                "The BM25 model has not been loaded. Please create or load it first"
             )
-            result.matches.append(matched_chunk)
 
-        return result
+        tombstones = self._delta.tombstones
+        items = [
+            item for item in self._corpus if item["chunk_id"] not in tombstones
+        ] + self._delta.items
+
+        # Update the statistics of the larger collection with the changes made here
+        term_statistics = self._term_statistics
+        if term_statistics is not None:
+            term_statistics = term_statistics.updated(
+                removed_tokens=self._analyzer.analyze_many(
+                    texts=[
+                        item["text"]
+                        for item in self._corpus
+                        if item["chunk_id"] in tombstones
+                    ]
+                ),
+                added_tokens=self._analyzer.analyze_many(
+                    texts=[item["text"] for item in self._delta.items]
+                ),
+            )
+
+        logger.info(
+            f"Merging {len(self._delta)} added and {len(tombstones)} deleted chunks "
+            f"into the BM25 index at {self._storage_dir}"
+        )
+
+        await self._build(
+            chunks=[
+                ChunkedText(
+                    id=item["chunk_id"],
+                    section_id=item["section_id"],
+                    text=item["text"],
+                )
+                for item in items
+            ],
+            term_statistics=term_statistics,
+        )
+
+        if self._mmap:
+            await self.load()
+
+    async def fingerprint(self) -> str:
+        """Get a fingerprint of the files of the index, including the delta segment.
+
+        Returns:
+            str: The fingerprint.
+        """
+        return fingerprint_directory(directory=self._storage_dir)
 
     async def exists(self) -> bool:
         """Check if the BM25 index exists.
@@ -107,7 +464,7 @@ class BM25Index(Indexer):
             bool: True if the index exists, False otherwise.
         """
         file_names = [
-            "corpus.jsonl",
+            BM25_CORPUS_FILE_NAME,
             "corpus.mmindex.json",
             "data.csc.index.npy",
             "indices.csc.index.npy",
@@ -118,9 +475,243 @@ class BM25Index(Indexer):
 
         return all((self._storage_dir / file_name).exists() for file_name in file_names)
 
-    def _stem(self, tokens: List[str]) -> List[str]:
-        return [
-            self._stemmer.stem(token)
-            for token in tokens
-            if token not in self._stop_words
+    async def _build(
+        self,
+        chunks: List[ChunkedText],
+        term_statistics: Optional[BM25TermStatistics] = None,
+    ) -> None:
+        """Build the base index from the given chunks and clear the delta segment.
+
+        Args:
+            chunks (List[ChunkedText]): The chunks to index.
+            term_statistics (Optional[BM25TermStatistics], optional): Statistics used
+                to compute the IDF of every term instead of those of `chunks`.
+                Defaults to None.
+        """
+        texts = [chunk.text for chunk in chunks]
+
+        # Reuse the stems of a previous build of this index, if any
+        await self._analyzer.load(storage_dir=self._stem_table_dir)
+        texts_tokens = self._analyzer.analyze_many(texts=texts, learn=True)
+
+        self._model = bm25s.BM25()
+        self._model.index(texts_tokens)
+
+        if term_statistics is not None:
+            self._apply_term_statistics(term_statistics=term_statistics)
+
+        # Upper bounds of the term scores, used by the MaxScore engine
+        max_impacts = compute_max_impacts(scores=self._model.scores)
+
+        # Build the corpus that will be saved with the model
+        corpus = [
+            CorpusItem(
+                index=index,
+                chunk_id=chunk.id,
+                section_id=chunk.section_id,
+                text=chunk.text,
+            ).model_dump()
+            for index, chunk in enumerate(chunks)
         ]
+
+        # Keep the statistics needed to score chunks that are added later on
+        doc_lens = [len(tokens) for tokens in texts_tokens]
+        self._stats = BM25CollectionStats(
+            num_docs=len(chunks),
+            avg_doc_len=max(sum(doc_lens) / max(len(doc_lens), 1), 1.0),
+            k1=self._model.k1,
+            b=self._model.b,
+        )
+
+        assert self._model is not None
+        self._model.save(save_dir=self._storage_dir, corpus=corpus)
+        await self._analyzer.save(storage_dir=self._stem_table_dir)
+        save_max_impacts(storage_dir=self._storage_dir, max_impacts=max_impacts)
+        async with aio_open(self._storage_dir / STATS_FILE_NAME, mode="w") as f:
+            await f.write(self._stats.model_dump_json(indent=2))
+
+        self._term_statistics = term_statistics
+        term_statistics_path = self._storage_dir / TERM_STATISTICS_FILE_NAME
+        if term_statistics is not None:
+            async with aio_open(term_statistics_path, mode="w") as f:
+                await f.write(term_statistics.model_dump_json())
+        elif term_statistics_path.exists():
+            term_statistics_path.unlink()
+
+        if isinstance(self._corpus, JsonlCorpusReader):
+            self._corpus.close()
+        self._corpus = corpus
+        self._base_chunk_ids = {chunk.id for chunk in chunks}
+        self._init_max_score_scorer()
+
+        self._delta.clear()
+        await self._delta.save(storage_dir=self._storage_dir)
+
+    def _init_max_score_scorer(self) -> None:
+        """Create the MaxScore scorer of the current model, if that engine is used."""
+        self._max_score = None
+        if self._engine != BM25Engine.MAX_SCORE:
+            return
+
+        assert self._model is not None
+        max_impacts = load_max_impacts(storage_dir=self._storage_dir, mmap=self._mmap)
+        if max_impacts is None:
+            # Indices built before the maximum impacts were saved
+            logger.warning(
+                f"No maximum impacts found in {self._storage_dir}. Computing them, "
+                "rebuild the index to store them."
+            )
+            max_impacts = compute_max_impacts(scores=self._model.scores)
+
+        self._max_score = MaxScoreScorer(
+            scores=self._model.scores, max_impacts=max_impacts
+        )
+
+    def _apply_term_statistics(self, term_statistics: BM25TermStatistics) -> None:
+        """Rescale the precomputed scores to use the IDF of the given statistics.
+
+        `bm25s` stores the product of the IDF and the term frequency component for
+        every term and document, so the scores of a term only need to be multiplied by
+        the ratio between the new and the local IDF.
+
+        Args:
+            term_statistics (BM25TermStatistics): The statistics to use.
+        """
+        assert self._model is not None
+        scores = self._model.scores
+        indptr = scores["indptr"]
+        local_num_docs = scores["num_docs"]
+
+        def idf(df: int, num_docs: int) -> float:
+            return math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+
+        n_columns = len(indptr) - 1
+        factors = np.ones(n_columns, dtype=scores["data"].dtype)
+        for token, token_id in self._model.vocab_dict.items():
+            # The vocabulary may contain placeholder tokens without any scores
+            if token_id >= n_columns:
+                continue
+            local_df = int(indptr[token_id + 1] - indptr[token_id])
+            if local_df == 0:
+                continue
+            global_df = term_statistics.document_frequencies.get(token, local_df)
+            factors[token_id] = idf(global_df, term_statistics.num_docs) / idf(
+                local_df, local_num_docs
+            )
+
+        scores["data"] = scores["data"] * np.repeat(factors, np.diff(indptr))
+
+    async def _save_delta_or_merge(self) -> None:
+        """Persist the delta segment, or merge it once it has grown too large."""
+        if len(self._delta) + len(self._delta.tombstones) >= self._merge_threshold:
+            await self.merge()
+        else:
+            await self._delta.save(storage_dir=self._storage_dir)
+
+    def _get_base_chunk_ids(self) -> Set[str]:
+        """Get the IDs of all chunks in the base index.
+
+        Returns:
+            Set[str]: The chunk IDs.
+        """
+        if self._corpus is None:
+            raise ValueError(
+                "The BM25 model has not been loaded. Please create or load it first"
+            )
+
+        if self._base_chunk_ids is None:
+            self._base_chunk_ids = {item["chunk_id"] for item in self._corpus}
+
+        return self._base_chunk_ids
+
+    def _score_delta(
+        self, query_terms: List[str]
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Score the chunks of the delta segment with the base index statistics.
+
+        Args:
+            query_terms (List[str]): The analyzed terms of the query.
+
+        Returns:
+            List[Tuple[float, Dict[str, Any]]]: The scored corpus items.
+        """
+        assert self._model is not None
+        vocab = self._model.vocab_dict
+        indptr = self._model.scores["indptr"]
+
+        # Compute the IDF like the base index does, from the statistics of the larger
+        # collection if it was built with those
+        term_statistics = self._term_statistics
+
+        def base_document_frequency(term: str) -> int:
+            if term_statistics is not None:
+                return term_statistics.document_frequencies.get(term, 0)
+            token_id = vocab.get(term)
+            if token_id is None:
+                return 0
+            return int(indptr[token_id + 1] - indptr[token_id])
+
+        if self._stats is None:
+            self._stats = self._compute_collection_stats()
+        stats = self._stats
+        if term_statistics is not None:
+            stats = stats.model_copy(update={"num_docs": term_statistics.num_docs})
+
+        return self._delta.score(
+            query_terms=query_terms,
+            stats=stats,
+            base_document_frequency=base_document_frequency,
+        )
+
+    def _compute_collection_stats(self) -> BM25CollectionStats:
+        """Compute the statistics of an index built before they were saved.
+
+        The document lengths are not stored in the index, so the base corpus is
+        analyzed again, the same way it was when the index was built.
+
+        Returns:
+            BM25CollectionStats: The statistics of the base index.
+        """
+        assert self._model is not None and self._corpus is not None
+        logger.warning(
+            f"No collection statistics found in {self._storage_dir}. Computing them, "
+            "rebuild the index to store them."
+        )
+
+        n_terms = sum(
+            len(self._analyzer.analyze(text=item["text"])) for item in self._corpus
+        )
+        num_docs = self._model.scores["num_docs"]
+        return BM25CollectionStats(
+            num_docs=num_docs,
+            avg_doc_len=max(n_terms / max(num_docs, 1), 1.0),
+            k1=self._model.k1,
+            b=self._model.b,
+        )
+
+    def _build_search_result(
+        self, query: str, hits: List[Tuple[float, Dict[str, Any]]]
+    ) -> SearchResult:
+        """Build a search result from the retrieved documents of a single query.
+
+        Args:
+            query (str): The query that was searched for.
+            hits (List[Tuple[float, Dict[str, Any]]]): The score and corpus item of
+                every retrieved document, ordered by rank.
+
+        Returns:
+            SearchResult: The search result.
+        """
+        result: SearchResult = SearchResult(query=query)
+
+        for i, (score, document) in enumerate(hits):
+            matched_chunk = MatchedChunk(
+                chunk_id=document["chunk_id"],
+                section_id=document["section_id"],
+                chunk_text=document["text"],
+                rank=i + 1,
+                score=score,
+            )
+            result.matches.append(matched_chunk)
+
+        return result
@@ -0,0 +1,369 @@
+import hashlib
+import json
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from ragathon.data.models import ChunkedTextSet, SearchResult
+from ragathon.indexing import Indexer
+from ragathon.utils.sqlite import SqliteDatabase, select_many
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query, so that trivially different spellings share a cache entry.
+
+    Args:
+        query (str): The query to normalize.
+
+    Returns:
+        str: The query in Unicode NFKC form with collapsed whitespace.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", query)).strip()
+
+
+class SearchResultCache:
+    """An in-process LRU cache of search results with a time to live."""
+
+    def __init__(self, max_size: int = 10_000, ttl: Optional[float] = 3600.0) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_size (int, optional): The maximum number of entries. Defaults to
+                10,000.
+            ttl (Optional[float], optional): The number of seconds an entry is valid.
+                None keeps entries until they are evicted. Defaults to 3600.
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[str, Tuple[float, SearchResult]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[SearchResult]:
+        """Get an entry and mark it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[SearchResult]: The cached result, or None if it is missing or
+                has expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, result = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: SearchResult) -> None:
+        """Add an entry, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (str): The cache key.
+            result (SearchResult): The result to cache.
+        """
+        expires_at = time.time() + self._ttl if self._ttl is not None else float("inf")
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+
+
+class SqliteSearchResultCache:
+    """A search result cache in an SQLite database, shared between processes."""
+
+    def __init__(self, database_path: Path, ttl: Optional[float] = 3600.0) -> None:
+        """Initialize the cache.
+
+        Args:
+            database_path (Path): The path of the SQLite database. It is created if it
+                does not exist.
+            ttl (Optional[float], optional): The number of seconds an entry is valid.
+                None keeps entries until the index changes. Defaults to 3600.
+        """
+        self._ttl = ttl
+        self._database = SqliteDatabase(
+            database_path=database_path,
+            schema="CREATE TABLE IF NOT EXISTS search_results ("
+            "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, result TEXT NOT NULL)",
+        )
+
+    async def get_many(self, keys: List[str]) -> Dict[str, SearchResult]:
+        """Get the entries with the given keys.
+
+        Args:
+            keys (List[str]): The cache keys.
+
+        Returns:
+            Dict[str, SearchResult]: The valid entries that were found, by key.
+        """
+        if len(keys) == 0:
+            return {}
+        return await self._database.run(self._get_many, keys)
+
+    async def put_many(
+        self, entries: Dict[str, SearchResult], fingerprint: str
+    ) -> None:
+        """Add entries to the cache.
+
+        Args:
+            entries (Dict[str, SearchResult]): The results to cache, by key.
+            fingerprint (str): The fingerprint of the index the results come from.
+        """
+        if len(entries) == 0:
+            return
+        await self._database.run(self._put_many, entries, fingerprint)
+
+    async def invalidate(self, fingerprint: str) -> None:
+        """Remove the entries that come from a version of an index that has changed.
+
+        Args:
+            fingerprint (str): The fingerprint of the stale version of the index.
+        """
+        await self._database.run(self._invalidate, fingerprint)
+
+    async def close(self) -> None:
+        """Close the database connection."""
+        await self._database.close()
+
+    @staticmethod
+    def _get_many(
+        connection: sqlite3.Connection, keys: List[str]
+    ) -> Dict[str, SearchResult]:
+        rows = select_many(
+            connection=connection,
+            query="SELECT key, result FROM search_results "
+            "WHERE key IN ({placeholders}) AND expires_at >= ?",
+            keys=keys,
+            parameters=[time.time()],
+        )
+        return {key: SearchResult.model_validate_json(result) for key, result in rows}
+
+    def _put_many(
+        self,
+        connection: sqlite3.Connection,
+        entries: Dict[str, SearchResult],
+        fingerprint: str,
+    ) -> None:
+        expires_at = time.time() + self._ttl if self._ttl is not None else float("inf")
+
+        connection.executemany(
+            "INSERT OR REPLACE INTO search_results "
+            "(key, fingerprint, expires_at, result) VALUES (?, ?, ?, ?)",
+            [
+                (key, fingerprint, expires_at, result.model_dump_json())
+                for key, result in entries.items()
+            ],
+        )
+        connection.execute(
+            "DELETE FROM search_results WHERE expires_at < ?", (time.time(),)
+        )
+        connection.commit()
+
+    @staticmethod
+    def _invalidate(connection: sqlite3.Connection, fingerprint: str) -> None:
+        connection.execute(
+            "DELETE FROM search_results WHERE fingerprint = ?", (fingerprint,)
+        )
+        connection.commit()
+
+
+class CachedIndexer(Indexer):
+    """Caches the search results of another indexer.
+
+    Results are cached per normalized query, k and fingerprint of the index, in an
+    in-process LRU cache and optionally in an SQLite database shared by several
+    processes. The fingerprint of the index is checked periodically, so results are
+    invalidated automatically when the index is rebuilt or updated, also by another
+    process.
+    """
+
+    def __init__(
+        self,
+        index: Indexer,
+        max_size: int = 10_000,
+        ttl: Optional[float] = 3600.0,
+        database_path: Optional[Path] = None,
+        fingerprint_interval: float = 5.0,
+    ) -> None:
+        """Initialize the cached indexer.
+
+        Args:
+            index (Indexer): The indexer whose results are cached. It must implement
+                `fingerprint()`.
+            max_size (int, optional): The maximum number of results kept in memory.
+                Defaults to 10,000.
+            ttl (Optional[float], optional): The number of seconds a result is valid.
+                None keeps results until the index changes. Defaults to 3600.
+            database_path (Optional[Path], optional): The path of an SQLite database
+                to share results between processes. Defaults to None.
+            fingerprint_interval (float, optional): The number of seconds between
+                checks of the fingerprint of the index. Defaults to 5.
+        """
+        self._index = index
+        self._memory = SearchResultCache(max_size=max_size, ttl=ttl)
+        self._database: Optional[SqliteSearchResultCache] = (
+            SqliteSearchResultCache(database_path=database_path, ttl=ttl)
+            if database_path is not None
+            else None
+        )
+        self._fingerprint_interval = fingerprint_interval
+        self._fingerprint: Optional[str] = None
+        self._fingerprint_checked_at: float = 0.0
+
+    @property
+    def index(self) -> Indexer:
+        """The indexer whose results are cached."""
+        return self._index
+
+    async def create(self, data_set: ChunkedTextSet) -> None:
+        """Create the underlying index and drop the cached results.
+
+        Args:
+            data_set (ChunkedTextSet): The data set to create the index from.
+        """
+        await self._index.create(data_set=data_set)
+        await self._refresh_fingerprint()
+
+    async def load(self) -> None:
+        """Load the underlying index."""
+        await self._index.load()
+        await self._refresh_fingerprint()
+
+    async def search(self, query: str, k: int) -> SearchResult:
+        """Search for the given query, using a cached result if there is one.
+
+        Args:
+            query (str): The query to search for.
+            k (int): The number of results to return.
+
+        Returns:
+            SearchResult: The search result.
+        """
+        results = await self.search_many(queries=[query], k=k)
+        return results[0]
+
+    async def search_many(self, queries: List[str], k: int) -> List[SearchResult]:
+        """Search for the given queries, only passing on those without cached results.
+
+        Args:
+            queries (List[str]): The queries to search for.
+            k (int): The number of results to return for each query.
+
+        Returns:
+            List[SearchResult]: One search result per query, in the same order as
+                `queries`.
+        """
+        if self._is_fingerprint_due():
+            await self._refresh_fingerprint()
+
+        keys = [self._get_key(query=query, k=k) for query in queries]
+        cached: Dict[str, SearchResult] = {}
+        for key in keys:
+            result = self._memory.get(key)
+            if result is not None:
+                cached[key] = result
+
+        if self._database is not None:
+            missing = list({key for key in keys if key not in cached})
+            for key, result in (await self._database.get_many(keys=missing)).items():
+                self._memory.put(key=key, result=result)
+                cached[key] = result
+
+        # Search once for every distinct query without a cached result
+        to_search: Dict[str, str] = {}
+        for key, query in zip(keys, queries):
+            if key not in cached and key not in to_search:
+                to_search[key] = query
+
+        logger.debug(
+            f"Search result cache: {len(queries) - len(to_search)} hits, "
+            f"{len(to_search)} misses"
+        )
+
+        if len(to_search) > 0:
+            searched = await self._index.search_many(
+                queries=list(to_search.values()), k=k
+            )
+            new_entries = dict(zip(to_search.keys(), searched))
+            for key, result in new_entries.items():
+                self._memory.put(key=key, result=result)
+            if self._database is not None:
+                assert self._fingerprint is not None
+                await self._database.put_many(
+                    entries=new_entries, fingerprint=self._fingerprint
+                )
+            cached.update(new_entries)
+
+        # Copy the results, so that callers cannot modify the cached ones
+        return [
+            cached[key].model_copy(update={"query": query}, deep=True)
+            for key, query in zip(keys, queries)
+        ]
+
+    async def exists(self) -> bool:
+        """Check if the underlying index exists.
+
+        Returns:
+            bool: True if the index exists, False otherwise.
+        """
+        return await self._index.exists()
+
+    async def fingerprint(self) -> str:
+        """Get the fingerprint of the underlying index.
+
+        Returns:
+            str: The fingerprint.
+        """
+        return await self._index.fingerprint()
+
+    async def close(self) -> None:
+        """Close the shared cache, if any."""
+        if self._database is not None:
+            await self._database.close()
+
+    def _get_key(self, query: str, k: int) -> str:
+        payload = json.dumps([normalize_query(query), k, self._fingerprint])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_fingerprint_due(self) -> bool:
+        return (
+            self._fingerprint is None
+            or time.monotonic() - self._fingerprint_checked_at
+            >= self._fingerprint_interval
+        )
+
+    async def _refresh_fingerprint(self) -> None:
+        """Check the fingerprint of the index and drop stale results if it changed."""
+        fingerprint = await self._index.fingerprint()
+        self._fingerprint_checked_at = time.monotonic()
+        if fingerprint == self._fingerprint:
+            return
+
+        stale_fingerprint = self._fingerprint
+        self._fingerprint = fingerprint
+        self._memory.clear()
+
+        if stale_fingerprint is not None:
+            logger.info("The index has changed, dropping the cached search results")
+            if self._database is not None:
+                await self._database.invalidate(fingerprint=stale_fingerprint)
@@ -0,0 +1,259 @@
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ragathon.indexing import CorpusItem
+
+CORPUS_FILE_NAME = "corpus.columns.bin"
+CORPUS_COLUMNS = ["chunk_id", "section_id", "text"]
+
+
+class JsonlCorpusReader(Sequence[Dict[str, Any]]):
+    """Random access to the items of a JSON Lines corpus without loading it.
+
+    The corpus file is memory-mapped and every item is located through a byte-offset
+    index, so only the lines that are actually accessed are read and decoded. The
+    offsets are taken from the `.mmindex.json` file that `bm25s` saves next to the
+    corpus, or computed with a single scan of the file if it does not exist.
+    """
+
+    def __init__(self, corpus_path: Path) -> None:
+        """Open the corpus.
+
+        Args:
+            corpus_path (Path): The path of the JSON Lines corpus file.
+        """
+        self._corpus_path: Path = corpus_path
+        self._file = open(corpus_path, mode="rb")
+        self._mmap: Optional[mmap.mmap] = None
+        if corpus_path.stat().st_size > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._offsets: NDArray[np.int64] = self._load_offsets()
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:  # pyre-ignore[14]
+        """Decode the item at the given position in the corpus.
+
+        Args:
+            index (int): The position of the item.
+
+        Returns:
+            Dict[str, Any]: The decoded item.
+        """
+        if index < 0 or index >= len(self):
+            raise IndexError(f"Corpus index {index} out of range.")
+
+        assert self._mmap is not None
+        start = int(self._offsets[index])
+        end = int(self._offsets[index + 1])
+        return json.loads(self._mmap[start:end])
+
+    def close(self) -> None:
+        """Release the memory map and the file handle."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def _load_offsets(self) -> NDArray[np.int64]:
+        """Load the start offset of every line, followed by the size of the file.
+
+        Returns:
+            NDArray[np.int64]: The offsets. Line `i` spans the bytes between
+                `offsets[i]` and `offsets[i + 1]`.
+        """
+        file_size = self._corpus_path.stat().st_size
+        mmindex_path = self._corpus_path.with_suffix(".mmindex.json")
+
+        if mmindex_path.exists():
+            with open(mmindex_path, mode="r", encoding="utf-8") as f:
+                starts = np.array(json.load(f), dtype=np.int64)
+        elif self._mmap is not None:
+            newlines = np.flatnonzero(
+                np.frombuffer(self._mmap, dtype=np.uint8) == ord("\n")
+            )
+            starts = np.concatenate([[0], newlines + 1]).astype(np.int64)
+            starts = starts[starts < file_size]
+        else:
+            starts = np.zeros(0, dtype=np.int64)
+
+        return np.append(starts, np.int64(file_size))
+
+
+class ColumnarCorpus(Sequence[CorpusItem]):
+    """A corpus stored as encoded strings that is loaded without parsing it.
+
+    The chunk id, section id and text of every item are stored one after the other as
+    UTF-8, and an offsets array holds where every value starts. Both are saved in a
+    single file, after a header with the number of offsets, so that a new version of
+    the corpus replaces the old one at once. Loading memory-maps the file, so it takes
+    constant time, and a `CorpusItem` is only decoded when it is accessed, e.g. for a
+    search hit.
+    """
+
+    def __init__(self, offsets: NDArray[np.int64], strings: NDArray[np.uint8]) -> None:
+        """Wrap the arrays of a corpus.
+
+        Args:
+            offsets (NDArray[np.int64]): The offsets of the values, item by item.
+                Value `i * len(CORPUS_COLUMNS) + c` is column `c` of item `i`, and
+                value `j` spans the bytes between `offsets[j]` and `offsets[j + 1]` of
+                `strings`.
+            strings (NDArray[np.uint8]): The UTF-8 encoded values.
+        """
+        self._offsets: NDArray[np.int64] = offsets
+        self._strings: NDArray[np.uint8] = strings
+
+    @classmethod
+    def from_items(cls, items: Iterable[CorpusItem]) -> "ColumnarCorpus":
+        """Build a corpus in memory.
+
+        Args:
+            items (Iterable[CorpusItem]): The corpus items, ordered by index.
+
+        Returns:
+            ColumnarCorpus: The corpus.
+        """
+        offsets, strings = cls._encode(items=items, start=0)
+        return cls(offsets=np.concatenate([[0], offsets]), strings=strings)
+
+    @classmethod
+    def load(cls, directory: Path) -> "ColumnarCorpus":
+        """Memory-map a corpus saved in a directory.
+
+        Args:
+            directory (Path): The directory of the corpus file.
+
+        Returns:
+            ColumnarCorpus: The corpus.
+        """
+        # Both arrays are views of a single mapping, so they always belong together
+        data = np.memmap(directory / CORPUS_FILE_NAME, dtype=np.uint8, mode="r")
+        n_offsets = int(data[:8].view(np.int64)[0])
+        strings_start = 8 * (1 + n_offsets)
+
+        return cls(
+            offsets=data[8:strings_start].view(np.int64),
+            strings=data[strings_start:],
+        )
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        """Check if a directory holds a columnar corpus.
+
+        Args:
+            directory (Path): The directory to check.
+
+        Returns:
+            bool: True if the corpus file exists.
+        """
+        return (directory / CORPUS_FILE_NAME).exists()
+
+    def __len__(self) -> int:
+        return (len(self._offsets) - 1) // len(CORPUS_COLUMNS)
+
+    def __getitem__(self, index: int) -> CorpusItem:  # pyre-ignore[14]
+        """Decode the item at the given position in the corpus.
+
+        Args:
+            index (int): The position of the item.
+
+        Returns:
+            CorpusItem: The item.
+        """
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(f"Corpus index {index} out of range.")
+
+        values = [self._value(column, index) for column in range(len(CORPUS_COLUMNS))]
+        # The values were validated when the corpus was written
+        return CorpusItem.model_construct(
+            index=index, **dict(zip(CORPUS_COLUMNS, values))
+        )
+
+    def column(self, name: str) -> List[str]:
+        """Decode all the values of a column.
+
+        Args:
+            name (str): The name of the column, e.g. "text".
+
+        Returns:
+            List[str]: The values, ordered by index.
+        """
+        column = CORPUS_COLUMNS.index(name)
+        return [self._value(column, index) for index in range(len(self))]
+
+    def extended(self, items: Iterable[CorpusItem]) -> "ColumnarCorpus":
+        """Build a corpus in memory with items appended to this one.
+
+        The values of the current items are copied as they are, without decoding them.
+
+        Args:
+            items (Iterable[CorpusItem]): The items to append, ordered by index.
+
+        Returns:
+            ColumnarCorpus: The new corpus.
+        """
+        offsets, strings = self._encode(items=items, start=int(self._offsets[-1]))
+        return ColumnarCorpus(
+            offsets=np.concatenate([self._offsets, offsets]),
+            strings=np.concatenate([self._strings, strings]),
+        )
+
+    def save(self, directory: Path) -> None:
+        """Save the corpus to a directory.
+
+        The file is replaced rather than overwritten, since the current one may still
+        be memory-mapped by readers.
+
+        Args:
+            directory (Path): The directory of the corpus file.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+
+        path = directory / CORPUS_FILE_NAME
+        temporary_path = path.with_suffix(".tmp.bin")
+        with open(temporary_path, mode="wb") as f:
+            f.write(np.int64(len(self._offsets)).tobytes())
+            f.write(np.asarray(self._offsets, dtype=np.int64).tobytes())
+            f.write(self._strings.tobytes())
+
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def _encode(
+        items: Iterable[CorpusItem], start: int
+    ) -> Tuple[NDArray[np.int64], NDArray[np.uint8]]:
+        """Encode the values of items.
+
+        Args:
+            items (Iterable[CorpusItem]): The items.
+            start (int): The offset of the first value.
+
+        Returns:
+            Tuple[NDArray[np.int64], NDArray[np.uint8]]: The end offset of every
+                value, and the encoded values.
+        """
+        values = [
+            getattr(item, column).encode("utf-8")
+            for item in items
+            for column in CORPUS_COLUMNS
+        ]
+        lengths = np.fromiter((len(value) for value in values), dtype=np.int64)
+        strings = np.frombuffer(b"".join(values), dtype=np.uint8)
+        return start + np.cumsum(lengths), strings
+
+    def _value(self, column: int, index: int) -> str:
+        value = index * len(CORPUS_COLUMNS) + column
+        start = int(self._offsets[value])
+        end = int(self._offsets[value + 1])
+        return self._strings[start:end].tobytes().decode("utf-8")
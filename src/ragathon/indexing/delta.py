@@ -0,0 +1,380 @@
+import json
+import math
+import os
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from aiofiles import open as aio_open
+from aiofiles.os import remove as aio_remove
+from numpy.typing import NDArray
+from pydantic import BaseModel, Field
+
+from ragathon.indexing import CorpusItem
+from ragathon.indexing.analyzer import BM25Analyzer
+from ragathon.indexing.flat import top_k
+
+DELTA_FILE_NAME = "delta.jsonl"
+TOMBSTONES_FILE_NAME = "tombstones.json"
+VECTOR_DELTA_FILE_NAME = "delta.npz"
+STATS_FILE_NAME = "stats.index.json"
+
+
+class BM25CollectionStats(BaseModel):
+    """Collection statistics of a base BM25 index needed to score new documents."""
+
+    num_docs: int = Field(..., description="Number of documents in the base index.")
+    """Number of documents in the base index."""
+
+    avg_doc_len: float = Field(..., description="Average number of terms per document.")
+    """Average number of terms per document."""
+
+    k1: float = Field(..., description="The k1 parameter of the BM25 formula.")
+    """The k1 parameter of the BM25 formula."""
+
+    b: float = Field(..., description="The b parameter of the BM25 formula.")
+    """The b parameter of the BM25 formula."""
+
+
+class BM25DeltaSegment:
+    """A small, mutable segment holding the changes made since the base index was built.
+
+    The segment contains the chunks added after the base index was built and the IDs of
+    the base chunks that have been deleted (tombstones). The added chunks are scored
+    with the Lucene BM25 variant used by `bm25s`, using the collection statistics of the
+    base index, so that their scores can be compared with the scores of the base index.
+    """
+
+    def __init__(self) -> None:
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._doc_lens: Dict[str, int] = {}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._tombstones: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def items(self) -> List[Dict[str, Any]]:
+        """The corpus items added to the segment, in insertion order."""
+        return list(self._items.values())
+
+    @property
+    def tombstones(self) -> Set[str]:
+        """The IDs of the deleted base chunks."""
+        return self._tombstones
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether the segment holds no changes at all."""
+        return len(self._items) == 0 and len(self._tombstones) == 0
+
+    def add(self, item: Dict[str, Any], terms: List[str]) -> None:
+        """Add a corpus item, replacing any item with the same chunk ID.
+
+        Args:
+            item (Dict[str, Any]): The corpus item to add.
+            terms (List[str]): The analyzed terms of the item's text.
+        """
+        chunk_id = item["chunk_id"]
+        self.remove(chunk_id=chunk_id)
+
+        self._items[chunk_id] = item
+        self._doc_lens[chunk_id] = len(terms)
+
+        term_frequencies = Counter(terms)
+        self._doc_terms[chunk_id] = list(term_frequencies.keys())
+        for term, term_frequency in term_frequencies.items():
+            self._postings[term][chunk_id] = term_frequency
+
+    def remove(self, chunk_id: str) -> bool:
+        """Remove an added corpus item.
+
+        Args:
+            chunk_id (str): The chunk ID of the item to remove.
+
+        Returns:
+            bool: True if the item was part of the segment, False otherwise.
+        """
+        if chunk_id not in self._items:
+            return False
+
+        del self._items[chunk_id]
+        del self._doc_lens[chunk_id]
+        for term in self._doc_terms.pop(chunk_id):
+            del self._postings[term][chunk_id]
+            if len(self._postings[term]) == 0:
+                del self._postings[term]
+
+        return True
+
+    def tombstone(self, chunk_id: str) -> None:
+        """Mark a chunk of the base index as deleted.
+
+        Args:
+            chunk_id (str): The chunk ID to mark as deleted.
+        """
+        self._tombstones.add(chunk_id)
+
+    def clear(self) -> None:
+        """Remove all changes from the segment."""
+        self._items.clear()
+        self._doc_lens.clear()
+        self._doc_terms.clear()
+        self._postings.clear()
+        self._tombstones.clear()
+
+    def score(
+        self,
+        query_terms: List[str],
+        stats: BM25CollectionStats,
+        base_document_frequency: Callable[[str], int],
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Score the items of the segment against a query.
+
+        Args:
+            query_terms (List[str]): The analyzed terms of the query.
+            stats (BM25CollectionStats): The statistics of the base index.
+            base_document_frequency (Callable[[str], int]): Returns the number of base
+                documents containing a term.
+
+        Returns:
+            List[Tuple[float, Dict[str, Any]]]: The score and item of every item that
+                matches at least one query term, sorted by descending score.
+        """
+        scores: Dict[str, float] = defaultdict(float)
+
+        for term in query_terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+
+            # Terms that are unknown to the base index only count the delta documents
+            df = base_document_frequency(term) or len(postings)
+            idf = math.log(1 + (stats.num_docs - df + 0.5) / (df + 0.5))
+
+            for chunk_id, tf in postings.items():
+                doc_len_norm = 1 - stats.b + stats.b * (
+                    self._doc_lens[chunk_id] / stats.avg_doc_len
+                )
+                scores[chunk_id] += idf * tf / (stats.k1 * doc_len_norm + tf)
+
+        return sorted(
+            [(score, self._items[chunk_id]) for chunk_id, score in scores.items()],
+            key=lambda hit: hit[0],
+            reverse=True,
+        )
+
+    async def save(self, storage_dir: Path) -> None:
+        """Save the segment to the given directory.
+
+        The files are removed when the segment is empty.
+
+        Args:
+            storage_dir (Path): The directory to save the segment to.
+        """
+        delta_path = storage_dir / DELTA_FILE_NAME
+        tombstones_path = storage_dir / TOMBSTONES_FILE_NAME
+
+        if self.is_empty:
+            for path in [delta_path, tombstones_path]:
+                if path.exists():
+                    await aio_remove(path)
+            return
+
+        async with aio_open(delta_path, mode="w") as f:
+            for item in self._items.values():
+                await f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+        async with aio_open(tombstones_path, mode="w") as f:
+            await f.write(json.dumps(sorted(self._tombstones)))
+
+    async def load(self, storage_dir: Path, analyzer: BM25Analyzer) -> None:
+        """Load the segment from the given directory, if it exists.
+
+        Args:
+            storage_dir (Path): The directory to load the segment from.
+            analyzer (BM25Analyzer): The analyzer used to analyze the added items.
+        """
+        self.clear()
+
+        delta_path = storage_dir / DELTA_FILE_NAME
+        if delta_path.exists():
+            async with aio_open(delta_path, mode="r") as f:
+                async for line in f:
+                    item = json.loads(line)
+                    self.add(item=item, terms=analyzer.analyze(text=item["text"]))
+
+        tombstones_path = storage_dir / TOMBSTONES_FILE_NAME
+        if tombstones_path.exists():
+            async with aio_open(tombstones_path, mode="r") as f:
+                self._tombstones = set(json.loads(await f.read()))
+
+
+class VectorDeltaSegment:
+    """A small, mutable segment holding the changes made since a vector index was built.
+
+    The segment contains the chunks added after the base index was built, with their
+    normalized embeddings, and the IDs of the base chunks that have been deleted
+    (tombstones). The added chunks are searched exactly, so their cosine similarities
+    can be merged with those of the base index.
+    """
+
+    def __init__(self, embedding_size: int) -> None:
+        self._embedding_size = embedding_size
+        self._items: Dict[str, CorpusItem] = {}
+        self._embeddings: Dict[str, NDArray[np.float32]] = {}
+        self._tombstones: Set[str] = set()
+        self._matrix: Optional[NDArray[np.float32]] = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def items(self) -> List[CorpusItem]:
+        """The corpus items added to the segment, in insertion order."""
+        return list(self._items.values())
+
+    @property
+    def embeddings(self) -> NDArray[np.float32]:
+        """The normalized embeddings of the added items, one row per item."""
+        if self._matrix is None:
+            if len(self._embeddings) == 0:
+                self._matrix = np.zeros((0, self._embedding_size), dtype=np.float32)
+            else:
+                self._matrix = np.vstack(list(self._embeddings.values()))
+        return self._matrix
+
+    @property
+    def tombstones(self) -> Set[str]:
+        """The IDs of the deleted base chunks."""
+        return self._tombstones
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether the segment holds no changes at all."""
+        return len(self._items) == 0 and len(self._tombstones) == 0
+
+    def add(self, item: CorpusItem, embedding: NDArray[np.float32]) -> None:
+        """Add a corpus item, replacing any item with the same chunk ID.
+
+        Args:
+            item (CorpusItem): The corpus item to add.
+            embedding (NDArray[np.float32]): The normalized embedding of the item.
+        """
+        self.remove(chunk_id=item.chunk_id)
+        self._items[item.chunk_id] = item
+        self._embeddings[item.chunk_id] = np.asarray(embedding, dtype=np.float32)
+        self._matrix = None
+
+    def remove(self, chunk_id: str) -> bool:
+        """Remove an added corpus item.
+
+        Args:
+            chunk_id (str): The chunk ID of the item to remove.
+
+        Returns:
+            bool: True if the item was part of the segment, False otherwise.
+        """
+        if chunk_id not in self._items:
+            return False
+
+        del self._items[chunk_id]
+        del self._embeddings[chunk_id]
+        self._matrix = None
+        return True
+
+    def tombstone(self, chunk_id: str) -> None:
+        """Mark a chunk of the base index as deleted.
+
+        Args:
+            chunk_id (str): The chunk ID to mark as deleted.
+        """
+        self._tombstones.add(chunk_id)
+
+    def clear(self) -> None:
+        """Remove all changes from the segment."""
+        self._items.clear()
+        self._embeddings.clear()
+        self._tombstones.clear()
+        self._matrix = None
+
+    def search(
+        self, query_embeddings: NDArray[np.float32], k: int
+    ) -> List[List[Tuple[float, CorpusItem]]]:
+        """Find the added items most similar to each of the given query embeddings.
+
+        Args:
+            query_embeddings (NDArray[np.float32]): The L2-normalized query
+                embeddings, one per row.
+            k (int): The number of items to find per query.
+
+        Returns:
+            List[List[Tuple[float, CorpusItem]]]: The cosine similarity and item of
+                the found items of every query, sorted by descending similarity.
+        """
+        if len(self._items) == 0:
+            return [[] for _ in range(len(query_embeddings))]
+
+        items = self.items
+        indices, scores = top_k(similarities=query_embeddings @ self.embeddings.T, k=k)
+
+        return [
+            [(float(score), items[index]) for index, score in zip(row, row_scores)]
+            for row, row_scores in zip(indices, scores)
+        ]
+
+    async def save(self, storage_dir: Path) -> None:
+        """Save the segment to the given directory.
+
+        The items, embeddings and tombstones are stored together in one file, which
+        is replaced rather than overwritten, so that a crash while saving leaves the
+        previous segment readable. The file is removed when the segment is empty.
+
+        Args:
+            storage_dir (Path): The directory to save the segment to.
+        """
+        path = storage_dir / VECTOR_DELTA_FILE_NAME
+
+        if self.is_empty:
+            if path.exists():
+                await aio_remove(path)
+            return
+
+        items = "".join(item.model_dump_json() + "\n" for item in self._items.values())
+        tombstones = json.dumps(sorted(self._tombstones))
+
+        temporary_path = path.with_suffix(".tmp.npz")
+        with open(temporary_path, mode="wb") as f:
+            np.savez(
+                f,
+                embeddings=self.embeddings,
+                items=np.frombuffer(items.encode("utf-8"), dtype=np.uint8),
+                tombstones=np.frombuffer(tombstones.encode("utf-8"), dtype=np.uint8),
+            )
+        os.replace(temporary_path, path)
+
+    async def load(self, storage_dir: Path) -> None:
+        """Load the segment from the given directory, if it exists.
+
+        Args:
+            storage_dir (Path): The directory to load the segment from.
+        """
+        self.clear()
+
+        path = storage_dir / VECTOR_DELTA_FILE_NAME
+        if not path.exists():
+            return
+
+        with np.load(path) as data:
+            embeddings = data["embeddings"]
+            lines = data["items"].tobytes().decode("utf-8").splitlines()
+            tombstones = json.loads(data["tombstones"].tobytes().decode("utf-8"))
+
+        for line, embedding in zip(lines, embeddings):
+            self.add(
+                item=CorpusItem.model_validate_json(json_data=line), embedding=embedding
+            )
+        self._tombstones = set(tombstones)
@@ -0,0 +1,466 @@
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from aiofiles import open as aio_open
+from loguru import logger
+from numpy.typing import NDArray
+
+from ragathon.data.models import ChunkedText, ChunkedTextSet, MatchedChunk, SearchResult
+from ragathon.indexing import CorpusItem, Indexer, fingerprint_directory, save_array
+from ragathon.indexing.corpus import ColumnarCorpus
+from ragathon.indexing.quantization import EmbeddingPrecision, QuantizedEmbeddings
+from ragathon.llms.common import Embedder
+
+EMBEDDINGS_FILE_NAME = "embeddings.npy"
+VECTOR_CORPUS_FILE_NAME = "corpus.jsonl"
+
+
+def normalize_embeddings(
+    embeddings: Union[NDArray[np.float32], Sequence[NDArray[np.float32]]],
+) -> NDArray[np.float32]:
+    """Stack embeddings into one contiguous matrix of unit-length rows.
+
+    Args:
+        embeddings (Union[NDArray[np.float32], Sequence[NDArray[np.float32]]]): The
+            embeddings, as a matrix with one embedding per row, e.g. from
+            `Embedder.embed_matrix()`, or as a sequence of rows to stack.
+
+    Returns:
+        NDArray[np.float32]: The L2-normalized embeddings, one per row.
+    """
+    if isinstance(embeddings, np.ndarray) and embeddings.ndim == 2:
+        # A matrix is normalized without stacking it first
+        matrix = np.asarray(embeddings, dtype=np.float32)
+    else:
+        matrix = np.ascontiguousarray(np.vstack(embeddings), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    # Leave all-zero embeddings as they are instead of dividing by zero
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+async def read_corpus(corpus_path: Path) -> List[CorpusItem]:
+    """Read the JSON Lines corpus of an index created before `ColumnarCorpus`.
+
+    Args:
+        corpus_path (Path): The path of the corpus file.
+
+    Returns:
+        List[CorpusItem]: The corpus items, ordered by index.
+    """
+    corpus: List[CorpusItem] = []
+    async with aio_open(corpus_path, "r") as f:
+        async for line in f:
+            corpus.append(CorpusItem.model_validate_json(json_data=line))
+
+    return corpus
+
+
+def top_k(
+    similarities: NDArray[np.float32], k: int
+) -> Tuple[NDArray[np.int64], NDArray[np.float32]]:
+    """Select the k highest similarities of every row.
+
+    Args:
+        similarities (NDArray[np.float32]): The similarities, one row per query.
+        k (int): The number of similarities to select per row.
+
+    Returns:
+        Tuple[NDArray[np.int64], NDArray[np.float32]]: The column indices and values
+            of the selected similarities, sorted by descending similarity.
+    """
+    k = min(k, similarities.shape[1])
+    # Select the top k in linear time, then only sort those
+    if k < similarities.shape[1]:
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(similarities.shape[1]), (len(similarities), 1))
+    top_scores = np.take_along_axis(similarities, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+
+    return (
+        np.take_along_axis(top, order, axis=1),
+        np.take_along_axis(top_scores, order, axis=1),
+    )
+
+
+class FlatVectorIndex(Indexer):
+    """An exact vector index that compares the queries with every chunk.
+
+    The chunk embeddings are stored as one contiguous, L2-normalized float32 matrix,
+    which is memory-mapped when loaded. A batch of queries is answered with a single
+    matrix multiplication, so for corpora of up to a few hundred thousand chunks this
+    is both faster and more accurate than an approximate index. The score of a match
+    is the cosine similarity between the query and the chunk. The corpus is stored as
+    a `ColumnarCorpus`, so only the chunks of the matches are ever decoded.
+
+    With a lower precision, a float16 or int8 copy of the matrix, also memory-mapped,
+    is searched first, and the best `rescore_factor * k` candidates are rescored
+    with the memory-mapped float32 matrix, so the scores stay exact. With
+    `coarse_dimensions`, the first pass only compares the leading dimensions of the
+    embeddings. Matryoshka embeddings, like those of the `text-embedding-3` models,
+    are trained so that a normalized prefix is itself a good embedding, so one
+    embedding request serves both passes.
+    """
+
+    def __init__(
+        self,
+        storage_dir: Path,
+        embedder: Embedder,
+        query_batch_size: int = 256,
+        precision: EmbeddingPrecision = EmbeddingPrecision.FLOAT32,
+        rescore_factor: int = 10,
+        coarse_dimensions: Optional[int] = None,
+    ) -> None:
+        """Initialize the flat vector index.
+
+        Args:
+            storage_dir (Path): The directory where the index is stored.
+            embedder (Embedder): The embedder used for the chunks and the queries.
+            query_batch_size (int, optional): The number of queries multiplied with
+                the embedding matrix at once, which bounds the size of the score
+                matrix. Defaults to 256.
+            precision (EmbeddingPrecision, optional): The precision of the
+                embeddings searched in the first pass. Defaults to
+                EmbeddingPrecision.FLOAT32.
+            rescore_factor (int, optional): The number of candidates per result that
+                are rescored with full precision. Defaults to 10.
+            coarse_dimensions (Optional[int], optional): The number of leading
+                dimensions compared in the first pass, e.g. 256, or None to compare
+                all of them. Defaults to None.
+        """
+        self._storage_dir: Path = storage_dir
+        self._embedder: Embedder = embedder
+        self._query_batch_size: int = query_batch_size
+        self._precision: EmbeddingPrecision = precision
+        self._rescore_factor: int = rescore_factor
+        self._coarse_dimensions: Optional[int] = coarse_dimensions
+        self._embeddings: Optional[NDArray[np.float32]] = None
+        self._quantized: Optional[QuantizedEmbeddings] = None
+        self._corpus: Sequence[CorpusItem] = []
+
+        self._embeddings_path: Path = self._storage_dir / EMBEDDINGS_FILE_NAME
+        self._corpus_path: Path = self._storage_dir / VECTOR_CORPUS_FILE_NAME
+
+    @property
+    def corpus(self) -> Sequence[CorpusItem]:
+        """The corpus items, ordered by index."""
+        return self._corpus
+
+    @property
+    def embeddings(self) -> Optional[NDArray[np.float32]]:
+        """The normalized chunk embeddings, or None if the index is not loaded."""
+        return self._embeddings
+
+    async def create(self, data_set: ChunkedTextSet) -> None:
+        """Create the index from the given data set.
+
+        Args:
+            data_set (ChunkedTextSet): The data set to create the index from.
+        """
+        texts = [chunk.text for chunk in data_set.chunks]
+        logger.debug(f"Embedding {len(texts)} chunks...")
+
+        embeddings = await self._embedder.embed_matrix(texts=texts)
+        await self.create_from_embeddings(chunks=data_set.chunks, embeddings=embeddings)
+
+    async def create_from_embeddings(
+        self,
+        chunks: List[ChunkedText],
+        embeddings: Union[NDArray[np.float32], Sequence[NDArray[np.float32]]],
+    ) -> None:
+        """Create the index from chunks that have already been embedded.
+
+        Args:
+            chunks (List[ChunkedText]): The chunks to index.
+            embeddings (Union[NDArray[np.float32], Sequence[NDArray[np.float32]]]):
+                The embedding of every chunk, as a matrix or a sequence of rows.
+        """
+        if len(chunks) != len(embeddings):
+            raise ValueError(
+                f"Got {len(embeddings)} embeddings for {len(chunks)} chunks"
+            )
+
+        self._embeddings = normalize_embeddings(embeddings=embeddings)
+        corpus = ColumnarCorpus.from_items(
+            CorpusItem(
+                index=index,
+                chunk_id=chunk.id,
+                section_id=chunk.section_id,
+                text=chunk.text,
+            )
+            for index, chunk in enumerate(chunks)
+        )
+
+        self._storage_dir.mkdir(parents=True, exist_ok=True)
+        save_array(path=self._embeddings_path, array=self._embeddings)
+        self._save_quantized()
+        self._save_corpus(corpus=corpus)
+
+    async def add_embeddings(
+        self,
+        chunks: List[ChunkedText],
+        embeddings: Union[NDArray[np.float32], Sequence[NDArray[np.float32]]],
+    ) -> None:
+        """Append chunks that have already been embedded to the index.
+
+        Args:
+            chunks (List[ChunkedText]): The chunks to add.
+            embeddings (Union[NDArray[np.float32], Sequence[NDArray[np.float32]]]):
+                The embedding of every chunk, as a matrix or a sequence of rows.
+        """
+        if self._embeddings is None:
+            raise ValueError(
+                "The embedding index has not been loaded. Please create or load it first"
+            )
+        if len(chunks) != len(embeddings):
+            raise ValueError(
+                f"Got {len(embeddings)} embeddings for {len(chunks)} chunks"
+            )
+        if len(chunks) == 0:
+            return
+
+        new_items = [
+            CorpusItem(
+                index=len(self._corpus) + i,
+                chunk_id=chunk.id,
+                section_id=chunk.section_id,
+                text=chunk.text,
+            )
+            for i, chunk in enumerate(chunks)
+        ]
+
+        matrix = np.concatenate(
+            [self._embeddings, normalize_embeddings(embeddings=embeddings)]
+        )
+        save_array(path=self._embeddings_path, array=matrix)
+        self._embeddings = np.load(self._embeddings_path, mmap_mode="r")
+        self._save_quantized()
+
+        if isinstance(self._corpus, ColumnarCorpus):
+            corpus = self._corpus.extended(items=new_items)
+        else:
+            corpus = ColumnarCorpus.from_items(items=[*self._corpus, *new_items])
+        self._save_corpus(corpus=corpus)
+
+    async def load(self) -> None:
+        """Memory-map the embedding matrix and load the corpus."""
+        if not await self.exists():
+            raise FileNotFoundError("Embeddings or corpus file not found.")
+
+        self._embeddings = np.load(self._embeddings_path, mmap_mode="r")
+        await self.load_corpus()
+
+        self._quantized = None
+        if self._has_first_pass:
+            self._quantized = QuantizedEmbeddings.load(
+                storage_dir=self._storage_dir,
+                precision=self._precision,
+                dimensions=self._coarse_dimensions,
+            )
+            if self._quantized is None or len(self._quantized) != len(
+                self._embeddings
+            ):
+                # Don't write them here, the index may be loaded by many read-only
+                # workers at once
+                logger.warning(
+                    "The embeddings of the first pass are missing or outdated, "
+                    "computing them in memory. Recreate the index to store them"
+                )
+                self._quantized = self._quantize()
+
+    async def load_corpus(self) -> None:
+        """Load only the corpus, e.g. for an index searched by another backend."""
+        if ColumnarCorpus.exists(directory=self._storage_dir):
+            self._corpus = ColumnarCorpus.load(directory=self._storage_dir)
+        else:
+            self._corpus = await read_corpus(corpus_path=self._corpus_path)
+
+    def corpus_exists(self) -> bool:
+        """Check if the corpus has been stored, in either format.
+
+        Returns:
+            bool: True if the corpus exists.
+        """
+        return ColumnarCorpus.exists(directory=self._storage_dir) or (
+            self._corpus_path.exists()
+        )
+
+    async def search(self, query: str, k: int) -> SearchResult:
+        """Search for the given query.
+
+        Args:
+            query (str): The query to search for.
+            k (int): The number of results to return.
+
+        Returns:
+            SearchResult: The search result.
+        """
+        results = await self.search_many(queries=[query], k=k)
+        return results[0]
+
+    async def search_many(self, queries: List[str], k: int) -> List[SearchResult]:
+        """Search for all the given queries with one embedding request.
+
+        Args:
+            queries (List[str]): The queries to search for.
+            k (int): The number of results to return for each query.
+
+        Returns:
+            List[SearchResult]: One search result per query, in the same order as
+                `queries`.
+        """
+        if len(queries) == 0:
+            return []
+
+        logger.debug(f"Searching for {len(queries)} queries")
+        query_embeddings = await self._embedder.embed_matrix(texts=queries)
+        indices, scores = self.search_embeddings(
+            query_embeddings=normalize_embeddings(embeddings=query_embeddings), k=k
+        )
+
+        return [
+            self.build_search_result(
+                query=query, indices=indices[i].tolist(), scores=scores[i].tolist()
+            )
+            for i, query in enumerate(queries)
+        ]
+
+    def search_embeddings(
+        self, query_embeddings: NDArray[np.float32], k: int
+    ) -> Tuple[NDArray[np.int64], NDArray[np.float32]]:
+        """Find the chunks most similar to each of the given query embeddings.
+
+        Args:
+            query_embeddings (NDArray[np.float32]): The L2-normalized query
+                embeddings, one per row.
+            k (int): The number of chunks to find per query.
+
+        Returns:
+            Tuple[NDArray[np.int64], NDArray[np.float32]]: The corpus indices and
+                cosine similarities of the found chunks, one row per query, sorted by
+                descending similarity.
+        """
+        if self._embeddings is None:
+            raise ValueError(
+                "The embedding index has not been loaded. Please create or load it first"
+            )
+
+        k = min(k, len(self._embeddings))
+        n_candidates = k * self._rescore_factor
+        all_indices: List[NDArray[np.int64]] = []
+        all_scores: List[NDArray[np.float32]] = []
+
+        for start in range(0, len(query_embeddings), self._query_batch_size):
+            batch = query_embeddings[start : start + self._query_batch_size]
+
+            if self._quantized is not None and n_candidates < len(self._embeddings):
+                candidates, _ = top_k(
+                    similarities=self._quantized.similarities(
+                        queries=self._coarse(embeddings=batch)
+                    ),
+                    k=n_candidates,
+                )
+                # Rescore the candidates with the full-precision embeddings
+                similarities = np.vstack(
+                    [
+                        self._embeddings[np.sort(rows)] @ query
+                        for query, rows in zip(batch, candidates)
+                    ]
+                )
+                top, scores = top_k(similarities=similarities, k=k)
+                candidates = np.sort(candidates, axis=1)
+                all_indices.append(np.take_along_axis(candidates, top, axis=1))
+                all_scores.append(scores)
+            else:
+                top, scores = top_k(similarities=batch @ self._embeddings.T, k=k)
+                all_indices.append(top)
+                all_scores.append(scores)
+
+        if len(all_indices) == 0:
+            return np.zeros((0, k), dtype=np.int64), np.zeros((0, k), dtype=np.float32)
+
+        return np.concatenate(all_indices), np.concatenate(all_scores)
+
+    def build_search_result(
+        self, query: str, indices: List[int], scores: List[float]
+    ) -> SearchResult:
+        """Build the search result of a query from the found corpus indices.
+
+        Args:
+            query (str): The query that was searched for.
+            indices (List[int]): The corpus indices of the found chunks, by rank.
+            scores (List[float]): The scores of the found chunks.
+
+        Returns:
+            SearchResult: The search result.
+        """
+        result: SearchResult = SearchResult(query=query)
+
+        for i, (index, score) in enumerate(zip(indices, scores)):
+            corpus_item = self._corpus[index]
+            matched_chunk = MatchedChunk(
+                chunk_id=corpus_item.chunk_id,
+                section_id=corpus_item.section_id,
+                chunk_text=corpus_item.text,
+                rank=i + 1,
+                score=float(score),
+            )
+            result.matches.append(matched_chunk)
+
+        return result
+
+    async def fingerprint(self) -> str:
+        """Get a fingerprint of the files of the index.
+
+        Returns:
+            str: The fingerprint.
+        """
+        return fingerprint_directory(directory=self._storage_dir)
+
+    async def exists(self) -> bool:
+        """Check if the flat vector index exists.
+
+        Returns:
+            bool: True if the index exists, False otherwise.
+        """
+        return self._embeddings_path.exists() and self.corpus_exists()
+
+    @property
+    def _has_first_pass(self) -> bool:
+        return (
+            self._precision != EmbeddingPrecision.FLOAT32
+            or self._coarse_dimensions is not None
+        )
+
+    def _coarse(self, embeddings: NDArray[np.float32]) -> NDArray[np.float32]:
+        if self._coarse_dimensions is None:
+            return embeddings
+        return normalize_embeddings(
+            embeddings=embeddings[:, : self._coarse_dimensions]
+        )
+
+    def _quantize(self) -> QuantizedEmbeddings:
+        assert self._embeddings is not None
+        return QuantizedEmbeddings.quantize(
+            embeddings=self._coarse(embeddings=np.asarray(self._embeddings)),
+            precision=self._precision,
+        )
+
+    def _save_quantized(self) -> None:
+        if not self._has_first_pass:
+            return
+
+        self._quantized = self._quantize()
+        self._quantized.save(
+            storage_dir=self._storage_dir, dimensions=self._coarse_dimensions
+        )
+
+    def _save_corpus(self, corpus: ColumnarCorpus) -> None:
+        corpus.save(directory=self._storage_dir)
+        self._corpus = ColumnarCorpus.load(directory=self._storage_dir)
+
+        # Don't let a stale legacy corpus be read by older code
+        if self._corpus_path.exists():
+            self._corpus_path.unlink()
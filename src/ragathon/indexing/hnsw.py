@@ -0,0 +1,493 @@
+import heapq
+import math
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ragathon.indexing import save_array
+
+HNSW_INDEX_FILE_NAME = "hnsw.index.npz"
+HNSW_LINKS_FILE_NAME = "hnsw.links.npy"
+HNSW_LINKS_FILE_PATTERN = "hnsw.links*.npy"
+
+
+class HNSWGraph:
+    """A Hierarchical Navigable Small World graph for cosine similarity search.
+
+    Every vector is a node on the bottom layer, and on each higher layer with a
+    probability that decreases exponentially. A search descends greedily through the
+    sparse upper layers and then explores the bottom layer with a beam of `ef_search`
+    candidates. Nodes can be inserted at any time.
+
+    The graph only stores the links between the nodes. The vectors are passed in on
+    construction, e.g. as the memory-mapped embedding matrix of a `FlatVectorIndex`,
+    and are only copied into memory when new vectors are inserted. Likewise, the
+    links of the bottom layer, which make up almost all of the graph, are saved as a
+    separate `.npy` file that is memory-mapped read-only when loaded, so that
+    processes serving the same graph share one copy of it. Every save writes a new
+    links file, named in the `.npz` file, so the two files always match.
+    """
+
+    def __init__(
+        self,
+        dimensions: int,
+        m: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 64,
+        seed: int = 42,
+        vectors: Optional[NDArray[np.float32]] = None,
+    ) -> None:
+        """Initialize an empty graph.
+
+        Args:
+            dimensions (int): The number of dimensions of the vectors.
+            m (int, optional): The number of links per node on the upper layers. The
+                bottom layer allows twice as many. Defaults to 16.
+            ef_construction (int, optional): The beam width used to find the
+                neighbors of an inserted node. Higher values give a better graph at
+                the cost of slower inserts. Defaults to 100.
+            ef_search (int, optional): The default beam width of searches. Higher
+                values give a better recall at the cost of latency. Defaults to 64.
+            seed (int, optional): The seed used to draw the layers of the nodes.
+                Defaults to 42.
+            vectors (Optional[NDArray[np.float32]], optional): The L2-normalized
+                vectors of the nodes already in the graph, one per row. Defaults to
+                None.
+        """
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+        self._dimensions = dimensions
+        self._max_links_0 = 2 * m
+        self._level_multiplier = 1.0 / math.log(max(m, 2))
+        self._rng = np.random.default_rng(seed)
+
+        self._vectors: NDArray[np.float32] = (
+            vectors
+            if vectors is not None
+            else np.zeros((0, dimensions), dtype=np.float32)
+        )
+        # Number of rows of the vectors that hold a vector, and number of linked nodes
+        self._n_vectors = len(self._vectors)
+        self._count = 0
+        self._levels: List[int] = []
+        self._links_0: NDArray[np.int32] = np.full(
+            (0, self._max_links_0), -1, dtype=np.int32
+        )
+        self._upper_links: List[Dict[int, NDArray[np.int32]]] = []
+        self._entry_point = -1
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def max_level(self) -> int:
+        """The highest layer of the graph, or -1 if it is empty."""
+        return len(self._upper_links) if self._count > 0 else -1
+
+    def insert(self, vector: NDArray[np.float32]) -> int:
+        """Insert a vector into the graph.
+
+        Args:
+            vector (NDArray[np.float32]): The vector to insert. It is L2-normalized.
+
+        Returns:
+            int: The node ID of the vector, which is the number of nodes before it.
+        """
+        self.index_vectors()
+
+        node = self._count
+        self._append_vector(node=node, vector=self._normalize(vector=vector))
+        self._count += 1
+        self._insert_node(node=node)
+        return node
+
+    def insert_many(self, vectors: NDArray[np.float32]) -> List[int]:
+        """Insert vectors into the graph.
+
+        Args:
+            vectors (NDArray[np.float32]): The vectors to insert, one per row.
+
+        Returns:
+            List[int]: The node IDs of the vectors.
+        """
+        return [self.insert(vector=vector) for vector in vectors]
+
+    def index_vectors(self, vectors: Optional[NDArray[np.float32]] = None) -> None:
+        """Link all stored vectors that are not part of the graph yet.
+
+        Args:
+            vectors (Optional[NDArray[np.float32]], optional): Replaces the stored
+                vectors, e.g. with a larger memory-mapped matrix whose first rows are
+                the vectors of the current nodes. Defaults to None.
+        """
+        if vectors is not None:
+            if len(vectors) < self._count:
+                raise ValueError(
+                    f"The graph has {self._count} nodes, but only {len(vectors)} "
+                    "vectors were given"
+                )
+            self._vectors = vectors
+            self._n_vectors = len(vectors)
+
+        # Allocate the bottom layer links of all new nodes at once
+        self._ensure_capacity(size=self._n_vectors)
+        while self._count < self._n_vectors:
+            node = self._count
+            self._count += 1
+            self._insert_node(node=node)
+
+    def search(
+        self, query: NDArray[np.float32], k: int, ef: Optional[int] = None
+    ) -> Tuple[NDArray[np.int64], NDArray[np.float32]]:
+        """Find the nodes most similar to the query.
+
+        Args:
+            query (NDArray[np.float32]): The query vector. It is L2-normalized.
+            k (int): The number of nodes to find.
+            ef (Optional[int], optional): The beam width, at least k. Defaults to
+                `ef_search`.
+
+        Returns:
+            Tuple[NDArray[np.int64], NDArray[np.float32]]: The node IDs and cosine
+                similarities of the found nodes, sorted by descending similarity.
+        """
+        if self._count == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query = self._normalize(vector=query)
+        entry_point = self._descend(query=query, target_level=1)
+        candidates = self._search_layer(
+            query=query,
+            entry_points=[entry_point],
+            ef=max(ef or self.ef_search, k),
+            level=0,
+        )[:k]
+
+        return (
+            np.asarray([node for _, node in candidates], dtype=np.int64),
+            np.asarray([similarity for similarity, _ in candidates], dtype=np.float32),
+        )
+
+    def save(self, path: Path) -> None:
+        """Save the links of the graph. The vectors must be saved separately.
+
+        The links of the bottom layer are saved to a new file in the same directory,
+        whose name is stored in the `.npz` file, so every graph needs a directory of
+        its own. The `.npz` file is replaced rather than overwritten, so a loader
+        reads either the previous links or the new ones, but never a mix. The links
+        file of the previous save is kept for processes still loading it, and older
+        ones are removed.
+
+        Args:
+            path (Path): The path of the `.npz` file.
+        """
+        links_path = path.parent / f"hnsw.links.{uuid.uuid4().hex}.npy"
+        save_array(path=links_path, array=self._links_0[: self._count])
+
+        arrays: Dict[str, NDArray] = {
+            "links_file": np.asarray(links_path.name),
+            "params": np.asarray(
+                [self.m, self.ef_construction, self.ef_search, self._entry_point],
+                dtype=np.int64,
+            ),
+            "levels": np.asarray(self._levels, dtype=np.int8),
+        }
+        for level, links in enumerate(self._upper_links, start=1):
+            nodes = np.asarray(sorted(links.keys()), dtype=np.int32)
+            arrays[f"nodes_{level}"] = nodes
+            arrays[f"links_{level}"] = (
+                np.vstack([links[node] for node in nodes.tolist()])
+                if len(nodes) > 0
+                else np.zeros((0, self.m), dtype=np.int32)
+            )
+
+        previous_links_path = _get_links_path(path=path) if path.exists() else None
+
+        temporary_path = path.with_name(f"{path.name}.tmp")
+        with open(temporary_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temporary_path, path)
+
+        for stale_path in path.parent.glob(HNSW_LINKS_FILE_PATTERN):
+            if stale_path not in [links_path, previous_links_path]:
+                stale_path.unlink()
+
+    @classmethod
+    def load(
+        cls, path: Path, vectors: NDArray[np.float32], ef_search: Optional[int] = None
+    ) -> "HNSWGraph":
+        """Load the links of a graph saved with `save()`.
+
+        Args:
+            path (Path): The path of the `.npz` file.
+            vectors (NDArray[np.float32]): The L2-normalized vectors of the nodes,
+                one per row. They may be memory-mapped.
+            ef_search (Optional[int], optional): Overrides the saved default beam
+                width of searches. Defaults to None.
+
+        Returns:
+            HNSWGraph: The graph.
+        """
+        with np.load(path) as arrays:
+            m, ef_construction, saved_ef_search, entry_point = arrays["params"].tolist()
+            graph = cls(
+                dimensions=vectors.shape[1],
+                m=m,
+                ef_construction=ef_construction,
+                ef_search=ef_search or saved_ef_search,
+                vectors=vectors,
+            )
+            graph._levels = arrays["levels"].tolist()
+            graph._count = len(graph._levels)
+            if "links_0" in arrays:
+                # Graphs saved before the bottom layer got a file of its own
+                graph._links_0 = np.array(arrays["links_0"], dtype=np.int32)
+            else:
+                graph._links_0 = np.load(
+                    path.parent / _get_links_file_name(arrays=arrays), mmap_mode="r"
+                )
+            graph._entry_point = entry_point
+
+            max_level = max(graph._levels, default=0)
+            for level in range(1, max_level + 1):
+                nodes = arrays[f"nodes_{level}"].tolist()
+                links = arrays[f"links_{level}"]
+                graph._upper_links.append(
+                    {node: np.array(links[i]) for i, node in enumerate(nodes)}
+                )
+
+        if graph._count > len(vectors):
+            raise ValueError(
+                f"The graph has {graph._count} nodes, but only {len(vectors)} "
+                "vectors were given"
+            )
+
+        return graph
+
+    def _insert_node(self, node: int) -> None:
+        """Link a node whose vector has been stored into the graph."""
+        vector = self._vectors[node]
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_multiplier)
+        self._levels.append(level)
+
+        if self._entry_point == -1:
+            self._entry_point = node
+            self._add_levels(level=level)
+            for current_level in range(1, level + 1):
+                self._set_links(level=current_level, node=node, neighbors=[])
+            return
+
+        top_level = self.max_level
+        entry_point = self._descend(query=vector, target_level=level + 1)
+        entry_points = [entry_point]
+
+        for current_level in range(min(level, top_level), -1, -1):
+            candidates = self._search_layer(
+                query=vector,
+                entry_points=entry_points,
+                ef=self.ef_construction,
+                level=current_level,
+            )
+            neighbors = self._select_neighbors(candidates=candidates, m=self.m)
+            self._set_links(level=current_level, node=node, neighbors=neighbors)
+
+            for neighbor in neighbors:
+                self._link(level=current_level, node=neighbor, new_neighbor=node)
+
+            entry_points = [candidate for _, candidate in candidates]
+
+        if level > top_level:
+            self._add_levels(level=level)
+            for current_level in range(top_level + 1, level + 1):
+                self._set_links(level=current_level, node=node, neighbors=[])
+            self._entry_point = node
+
+    def _descend(self, query: NDArray[np.float32], target_level: int) -> int:
+        """Greedily walk from the entry point down to the given layer."""
+        entry_point = self._entry_point
+        similarity = float(self._vectors[entry_point] @ query)
+
+        for level in range(self.max_level, target_level - 1, -1):
+            changed = True
+            while changed:
+                changed = False
+                neighbors = self._get_links(level=level, node=entry_point)
+                if len(neighbors) == 0:
+                    continue
+                similarities = self._vectors[neighbors] @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] > similarity:
+                    similarity = float(similarities[best])
+                    entry_point = int(neighbors[best])
+                    changed = True
+
+        return entry_point
+
+    def _search_layer(
+        self,
+        query: NDArray[np.float32],
+        entry_points: List[int],
+        ef: int,
+        level: int,
+    ) -> List[Tuple[float, int]]:
+        """Beam search on a single layer.
+
+        Returns:
+            List[Tuple[float, int]]: The similarity and node ID of up to `ef` nodes,
+                sorted by descending similarity.
+        """
+        visited: Set[int] = set(entry_points)
+        similarities = self._vectors[entry_points] @ query
+
+        # Max-heap of the nodes to expand and min-heap of the best nodes found
+        candidates = [(-float(s), node) for s, node in zip(similarities, entry_points)]
+        heapq.heapify(candidates)
+        found = [(float(s), node) for s, node in zip(similarities, entry_points)]
+        heapq.heapify(found)
+        while len(found) > ef:
+            heapq.heappop(found)
+
+        while len(candidates) > 0:
+            negative_similarity, node = heapq.heappop(candidates)
+            if -negative_similarity < found[0][0] and len(found) >= ef:
+                break
+
+            neighbors = [
+                neighbor
+                for neighbor in self._get_links(level=level, node=node).tolist()
+                if neighbor not in visited
+            ]
+            if len(neighbors) == 0:
+                continue
+            visited.update(neighbors)
+
+            neighbor_similarities = (self._vectors[neighbors] @ query).tolist()
+            for neighbor, similarity in zip(neighbors, neighbor_similarities):
+                if len(found) < ef or similarity > found[0][0]:
+                    heapq.heappush(candidates, (-similarity, neighbor))
+                    heapq.heappush(found, (similarity, neighbor))
+                    if len(found) > ef:
+                        heapq.heappop(found)
+
+        return sorted(found, reverse=True)
+
+    def _select_neighbors(
+        self, candidates: List[Tuple[float, int]], m: int
+    ) -> List[int]:
+        """Select up to m diverse neighbors from candidates sorted by similarity.
+
+        A candidate is skipped when it is more similar to an already selected
+        neighbor than to the node itself, which keeps links to different regions of
+        the graph. Skipped candidates fill up the remaining links.
+        """
+        selected: List[int] = []
+        skipped: List[int] = []
+
+        for similarity, candidate in candidates:
+            if len(selected) >= m:
+                break
+            if len(selected) > 0:
+                similarities = self._vectors[selected] @ self._vectors[candidate]
+                if float(similarities.max()) > similarity:
+                    skipped.append(candidate)
+                    continue
+            selected.append(candidate)
+
+        return selected + skipped[: m - len(selected)]
+
+    def _link(self, level: int, node: int, new_neighbor: int) -> None:
+        """Add a link from a node, pruning its links if it has too many."""
+        neighbors = self._get_links(level=level, node=node).tolist() + [new_neighbor]
+        max_links = self._max_links_0 if level == 0 else self.m
+
+        if len(neighbors) > max_links:
+            similarities = (self._vectors[neighbors] @ self._vectors[node]).tolist()
+            candidates = sorted(zip(similarities, neighbors), reverse=True)
+            neighbors = self._select_neighbors(candidates=candidates, m=max_links)
+
+        self._set_links(level=level, node=node, neighbors=neighbors)
+
+    def _get_links(self, level: int, node: int) -> NDArray[np.int32]:
+        if level == 0:
+            links = self._links_0[node]
+        else:
+            links = self._upper_links[level - 1][node]
+        return links[links >= 0]
+
+    def _set_links(self, level: int, node: int, neighbors: List[int]) -> None:
+        max_links = self._max_links_0 if level == 0 else self.m
+        links = np.full(max_links, -1, dtype=np.int32)
+        links[: len(neighbors)] = neighbors
+
+        if level == 0:
+            if not self._links_0.flags.writeable:
+                # Memory-mapped links are copied into memory on the first insert
+                self._links_0 = np.array(self._links_0)
+            self._links_0[node] = links
+        else:
+            self._upper_links[level - 1][node] = links
+
+    def _add_levels(self, level: int) -> None:
+        while len(self._upper_links) < level:
+            self._upper_links.append({})
+
+    def _append_vector(self, node: int, vector: NDArray[np.float32]) -> None:
+        """Store the vector of a new node, growing the arrays when needed."""
+        if len(self._vectors) <= node or not self._vectors.flags.writeable:
+            # Grow geometrically to keep inserts cheap. Memory-mapped vectors are
+            # copied into memory on the first insert.
+            capacity = max(node + 1, int(len(self._vectors) * 1.5), 16)
+            vectors = np.zeros((capacity, self._dimensions), dtype=np.float32)
+            vectors[:node] = self._vectors[:node]
+            self._vectors = vectors
+        self._vectors[node] = vector
+        self._n_vectors = node + 1
+        self._ensure_capacity(size=len(self._vectors))
+
+    def _ensure_capacity(self, size: int) -> None:
+        if len(self._links_0) < size:
+            links_0 = np.full((size, self._max_links_0), -1, dtype=np.int32)
+            links_0[: len(self._links_0)] = self._links_0
+            self._links_0 = links_0
+
+    @staticmethod
+    def _normalize(vector: NDArray[np.float32]) -> NDArray[np.float32]:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+def _get_links_file_name(arrays: Mapping[str, NDArray]) -> str:
+    """Get the name of the links file of the bottom layer of a saved graph.
+
+    Args:
+        arrays (Mapping[str, NDArray]): The arrays of the `.npz` file.
+
+    Returns:
+        str: The file name.
+    """
+    if "links_file" in arrays:
+        return str(arrays["links_file"])
+    # Graphs saved before the links file was named in the `.npz` file
+    return HNSW_LINKS_FILE_NAME
+
+
+def _get_links_path(path: Path) -> Optional[Path]:
+    """Get the path of the links file of the bottom layer of a saved graph.
+
+    Args:
+        path (Path): The path of the `.npz` file.
+
+    Returns:
+        Optional[Path]: The path, or None if the bottom layer is in the `.npz` file.
+    """
+    with np.load(path) as arrays:
+        if "links_0" in arrays:
+            return None
+        return path.parent / _get_links_file_name(arrays=arrays)
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+from enum import StrEnum
+from typing import Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from ragathon.data.models import ChunkedTextSet, MatchedChunk, SearchResult
+from ragathon.indexing import Indexer
+
+
+class FusionMethod(StrEnum):
+    """How the results of the sparse and the dense index are combined."""
+
+    RRF = "rrf"
+    """Reciprocal rank fusion, which only uses the ranks of the matches."""
+
+    WEIGHTED = "weighted"
+    """A weighted sum of the min-max normalized scores of the matches."""
+
+
+def reciprocal_rank_fusion(
+    query: str, results: Sequence[SearchResult], k: int, rrf_k: int = 60
+) -> SearchResult:
+    """Fuse search results by summing the reciprocal ranks of every chunk.
+
+    A chunk at rank `r` of a result contributes `1 / (rrf_k + r)` to its score, so
+    chunks found by several indices rise to the top, whatever the scale of the
+    scores of the indices.
+
+    Args:
+        query (str): The query of the results.
+        results (Sequence[SearchResult]): The results to fuse.
+        k (int): The number of matches of the fused result.
+        rrf_k (int, optional): Dampens the advantage of the top ranks. Defaults to
+            60.
+
+    Returns:
+        SearchResult: The fused result, sorted by descending fused score.
+    """
+    scores: Dict[str, float] = {}
+    matches: Dict[str, MatchedChunk] = {}
+    for result in results:
+        for match in result.matches:
+            scores[match.chunk_id] = scores.get(match.chunk_id, 0.0) + 1.0 / (
+                rrf_k + match.rank
+            )
+            matches.setdefault(match.chunk_id, match)
+
+    return _build_fused_result(query=query, scores=scores, matches=matches, k=k)
+
+
+def weighted_score_fusion(
+    query: str, results: Sequence[SearchResult], weights: Sequence[float], k: int
+) -> SearchResult:
+    """Fuse search results by a weighted sum of their normalized scores.
+
+    The scores of every result are min-max normalized to [0, 1] first, so that e.g.
+    unbounded BM25 scores and cosine similarities can be combined. A chunk that is
+    missing from a result gets 0 from it.
+
+    Args:
+        query (str): The query of the results.
+        results (Sequence[SearchResult]): The results to fuse.
+        weights (Sequence[float]): The weight of every result.
+        k (int): The number of matches of the fused result.
+
+    Returns:
+        SearchResult: The fused result, sorted by descending fused score.
+    """
+    if len(weights) != len(results):
+        raise ValueError(f"Got {len(weights)} weights for {len(results)} results")
+
+    scores: Dict[str, float] = {}
+    matches: Dict[str, MatchedChunk] = {}
+    for result, weight in zip(results, weights):
+        if len(result.matches) == 0:
+            continue
+
+        min_score = min(match.score for match in result.matches)
+        max_score = max(match.score for match in result.matches)
+        for match in result.matches:
+            normalized = (
+                (match.score - min_score) / (max_score - min_score)
+                if max_score > min_score
+                else 1.0
+            )
+            scores[match.chunk_id] = scores.get(match.chunk_id, 0.0) + (
+                weight * normalized
+            )
+            matches.setdefault(match.chunk_id, match)
+
+    return _build_fused_result(query=query, scores=scores, matches=matches, k=k)
+
+
+def _build_fused_result(
+    query: str, scores: Dict[str, float], matches: Dict[str, MatchedChunk], k: int
+) -> SearchResult:
+    # Sort by score, and by order of appearance among equal scores
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    result = SearchResult(query=query)
+    for rank, (chunk_id, score) in enumerate(ranked, start=1):
+        result.matches.append(
+            matches[chunk_id].model_copy(update={"rank": rank, "score": score})
+        )
+    return result
+
+
+class HybridIndex(Indexer):
+    """Combines a sparse and a dense index, e.g. a `BM25Index` and a `VectorIndex`.
+
+    Both indices are searched concurrently for `candidate_factor * k` candidates
+    each, and the candidates are fused into a single result with reciprocal rank
+    fusion or a weighted sum of normalized scores.
+
+    The dense search has to embed the queries, which takes a request to the
+    embedding model. With a `latency_budget`, the results of the sparse index alone
+    are returned when the dense search has not finished within the budget, so slow
+    embedding requests degrade the quality of the results rather than the latency.
+    Such degraded results should not be cached, so don't wrap an index with a
+    latency budget in a `CachedIndexer`.
+    """
+
+    def __init__(
+        self,
+        sparse: Indexer,
+        dense: Indexer,
+        fusion: FusionMethod = FusionMethod.RRF,
+        candidate_factor: int = 3,
+        rrf_k: int = 60,
+        sparse_weight: float = 0.5,
+        latency_budget: Optional[float] = None,
+    ) -> None:
+        """Initialize the hybrid index.
+
+        Args:
+            sparse (Indexer): The sparse index, e.g. a `BM25Index`.
+            dense (Indexer): The dense index, e.g. a `VectorIndex`.
+            fusion (FusionMethod, optional): How the results are combined. Defaults
+                to FusionMethod.RRF.
+            candidate_factor (int, optional): The number of candidates fetched from
+                each index per result. Defaults to 3.
+            rrf_k (int, optional): The rank constant of reciprocal rank fusion.
+                Defaults to 60.
+            sparse_weight (float, optional): The weight of the sparse scores in
+                weighted fusion. The dense scores get `1 - sparse_weight`. Defaults
+                to 0.5.
+            latency_budget (Optional[float], optional): The number of seconds to wait
+                for the dense search before returning the sparse results alone, or
+                None to always wait. Defaults to None.
+        """
+        self._sparse: Indexer = sparse
+        self._dense: Indexer = dense
+        self._fusion: FusionMethod = fusion
+        self._candidate_factor: int = candidate_factor
+        self._rrf_k: int = rrf_k
+        self._sparse_weight: float = sparse_weight
+        self._latency_budget: Optional[float] = latency_budget
+
+    @property
+    def sparse(self) -> Indexer:
+        """The sparse index."""
+        return self._sparse
+
+    @property
+    def dense(self) -> Indexer:
+        """The dense index."""
+        return self._dense
+
+    async def create(self, data_set: ChunkedTextSet) -> None:
+        """Create both indices from the given data set.
+
+        Args:
+            data_set (ChunkedTextSet): The data set to create the indices from.
+        """
+        await asyncio.gather(
+            self._sparse.create(data_set=data_set),
+            self._dense.create(data_set=data_set),
+        )
+
+    async def load(self) -> None:
+        """Load both indices."""
+        await asyncio.gather(self._sparse.load(), self._dense.load())
+
+    async def search(self, query: str, k: int) -> SearchResult:
+        """Search for the given query.
+
+        Args:
+            query (str): The query to search for.
+            k (int): The number of results to return.
+
+        Returns:
+            SearchResult: The search result.
+        """
+        results = await self.search_many(queries=[query], k=k)
+        return results[0]
+
+    async def search_many(self, queries: List[str], k: int) -> List[SearchResult]:
+        """Search both indices concurrently and fuse their results.
+
+        Args:
+            queries (List[str]): The queries to search for.
+            k (int): The number of results to return for each query.
+
+        Returns:
+            List[SearchResult]: One search result per query, in the same order as
+                `queries`.
+        """
+        if len(queries) == 0:
+            return []
+
+        n_candidates = k * self._candidate_factor
+        # Start the dense search first, so that its embedding request is on its way
+        # while the sparse index is searched
+        dense_task = asyncio.create_task(
+            self._dense.search_many(queries=queries, k=n_candidates)
+        )
+        sparse_task = asyncio.create_task(
+            self._sparse.search_many(queries=queries, k=n_candidates)
+        )
+
+        if self._latency_budget is None:
+            dense_results, sparse_results = await asyncio.gather(
+                dense_task, sparse_task
+            )
+        else:
+            done, _ = await asyncio.wait(
+                [dense_task, sparse_task], timeout=self._latency_budget
+            )
+            if dense_task not in done:
+                logger.warning(
+                    f"The dense search did not finish within {self._latency_budget}s, "
+                    "returning the sparse results only"
+                )
+                dense_task.cancel()
+                sparse_results = await sparse_task
+                return [
+                    self._fuse(query=query, results=[sparse_result], k=k)
+                    for query, sparse_result in zip(queries, sparse_results)
+                ]
+
+            dense_results, sparse_results = await asyncio.gather(
+                dense_task, sparse_task
+            )
+
+        return [
+            self._fuse(query=query, results=[sparse_results[i], dense_results[i]], k=k)
+            for i, query in enumerate(queries)
+        ]
+
+    async def fingerprint(self) -> str:
+        """Get a fingerprint of both indices.
+
+        Returns:
+            str: The fingerprint.
+        """
+        sparse, dense = await asyncio.gather(
+            self._sparse.fingerprint(), self._dense.fingerprint()
+        )
+        return hashlib.sha256(f"{sparse}\0{dense}".encode("utf-8")).hexdigest()
+
+    async def exists(self) -> bool:
+        """Check if both indices exist.
+
+        Returns:
+            bool: True if both indices exist, False otherwise.
+        """
+        return await self._sparse.exists() and await self._dense.exists()
+
+    def _fuse(self, query: str, results: List[SearchResult], k: int) -> SearchResult:
+        """Fuse the sparse result and, if available, the dense result of a query.
+
+        Args:
+            query (str): The query of the results.
+            results (List[SearchResult]): The sparse result, optionally followed by
+                the dense result.
+            k (int): The number of matches of the fused result.
+
+        Returns:
+            SearchResult: The fused result.
+        """
+        if self._fusion == FusionMethod.RRF:
+            return reciprocal_rank_fusion(
+                query=query, results=results, k=k, rrf_k=self._rrf_k
+            )
+
+        weights = [self._sparse_weight, 1.0 - self._sparse_weight][: len(results)]
+        return weighted_score_fusion(query=query, results=results, weights=weights, k=k)
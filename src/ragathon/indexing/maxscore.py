@@ -0,0 +1,187 @@
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+MAX_IMPACTS_FILE_NAME = "max_impacts.index.npy"
+
+
+def compute_max_impacts(scores: Dict[str, Any]) -> NDArray[np.float32]:
+    """Compute the maximum score that every term of a BM25 index contributes.
+
+    Args:
+        scores (Dict[str, Any]): The precomputed scores of a `bm25s` model, stored as
+            a CSC matrix with one column per term.
+
+    Returns:
+        NDArray[np.float32]: The maximum score of every term. Terms without postings
+            have a maximum of zero.
+    """
+    data = np.asarray(scores["data"], dtype=np.float32)
+    indptr = np.asarray(scores["indptr"], dtype=np.int64)
+
+    max_impacts = np.zeros(len(indptr) - 1, dtype=np.float32)
+    has_postings = np.diff(indptr) > 0
+    if has_postings.any():
+        max_impacts[has_postings] = np.maximum.reduceat(
+            data, indptr[:-1][has_postings]
+        )
+
+    return max_impacts
+
+
+def save_max_impacts(storage_dir: Path, max_impacts: NDArray[np.float32]) -> None:
+    """Save the maximum impacts next to the arrays of the BM25 model.
+
+    Args:
+        storage_dir (Path): The directory of the BM25 index.
+        max_impacts (NDArray[np.float32]): The maximum score of every term.
+    """
+    np.save(storage_dir / MAX_IMPACTS_FILE_NAME, max_impacts)
+
+
+def load_max_impacts(
+    storage_dir: Path, mmap: bool = False
+) -> Optional[NDArray[np.float32]]:
+    """Load the maximum impacts of a BM25 index, if they have been saved.
+
+    Args:
+        storage_dir (Path): The directory of the BM25 index.
+        mmap (bool, optional): Whether to memory-map the array. Defaults to False.
+
+    Returns:
+        Optional[NDArray[np.float32]]: The maximum score of every term, or None if
+            they have not been saved.
+    """
+    path = storage_dir / MAX_IMPACTS_FILE_NAME
+    if not path.exists():
+        return None
+
+    mmap_mode: Optional[Literal["r"]] = "r" if mmap else None
+    return np.load(path, mmap_mode=mmap_mode)
+
+
+class MaxScoreScorer:
+    """Top-k BM25 retrieval with MaxScore dynamic pruning.
+
+    The query terms are processed from the highest to the lowest maximum impact,
+    while keeping the partial scores of the candidate documents. The k-th best partial
+    score is a lower bound of the final top-k threshold, so once the maximum impacts
+    of the remaining terms add up to no more than that threshold, documents that have
+    not been seen yet can no longer make it into the top k. From then on, the
+    remaining posting lists, typically the long ones of frequent terms, are only
+    probed for the candidates, and candidates that cannot beat the threshold are
+    dropped. The result is the same as scoring every matching document.
+
+    The scorer reads the postings of the CSC matrix of a `bm25s` model, whose
+    document indices are sorted within every column.
+    """
+
+    def __init__(
+        self, scores: Dict[str, Any], max_impacts: NDArray[np.float32]
+    ) -> None:
+        """Initialize the scorer.
+
+        Args:
+            scores (Dict[str, Any]): The precomputed scores of a `bm25s` model.
+            max_impacts (NDArray[np.float32]): The maximum score of every term, as
+                computed by `compute_max_impacts()`.
+        """
+        self._data = scores["data"]
+        self._indices = scores["indices"]
+        self._indptr = scores["indptr"]
+        self._max_impacts = max_impacts
+
+    def top_k(self, token_ids: Sequence[int], k: int) -> Tuple[List[int], List[float]]:
+        """Retrieve the k documents with the highest scores for a query.
+
+        Args:
+            token_ids (Sequence[int]): The vocabulary IDs of the query terms. Repeated
+                terms count as many times as they occur, like in `bm25s`.
+            k (int): The number of documents to retrieve.
+
+        Returns:
+            Tuple[List[int], List[float]]: The indices and scores of the retrieved
+                documents, sorted by descending score. Documents that match none of
+                the query terms are not retrieved.
+        """
+        terms = self._get_query_terms(token_ids=token_ids)
+        if len(terms) == 0 or k <= 0:
+            return [], []
+
+        # Upper bound of the score that the terms from position i onwards add
+        upper_bounds = np.cumsum([bound for bound, _ in reversed(terms)])[::-1]
+        remaining_bounds = list(upper_bounds[1:]) + [0.0]
+
+        docs = np.zeros(0, dtype=np.int64)
+        doc_scores = np.zeros(0, dtype=np.float32)
+
+        for (bound, (token_id, weight)), remaining_bound in zip(
+            terms, remaining_bounds
+        ):
+            start, end = int(self._indptr[token_id]), int(self._indptr[token_id + 1])
+            term_docs = self._indices[start:end]
+            term_impacts = self._data[start:end] * np.float32(weight)
+
+            threshold = self._get_threshold(doc_scores=doc_scores, k=k)
+            if bound + remaining_bound > threshold:
+                # Documents that have not been seen yet can still make it into the
+                # top k, so the whole posting list is merged into the candidates
+                docs, inverse = np.unique(
+                    np.concatenate([docs, term_docs]), return_inverse=True
+                )
+                doc_scores = np.bincount(
+                    inverse,
+                    weights=np.concatenate([doc_scores, term_impacts]),
+                    minlength=len(docs),
+                ).astype(np.float32)
+            else:
+                # Only the candidates can still make it, so they are looked up in the
+                # posting list instead of reading all of it
+                positions = np.searchsorted(term_docs, docs)
+                positions[positions == len(term_docs)] = 0
+                found = term_docs[positions] == docs
+                doc_scores[found] += term_impacts[positions[found]]
+
+            # Drop the candidates that cannot beat the k-th best partial score even
+            # if they contain all remaining terms
+            threshold = self._get_threshold(doc_scores=doc_scores, k=k)
+            keep = doc_scores + np.float32(remaining_bound) >= threshold
+            docs, doc_scores = docs[keep], doc_scores[keep]
+
+        # Sort by descending score, and by document index on ties
+        order = np.lexsort((docs, -doc_scores))[:k]
+        return docs[order].tolist(), doc_scores[order].tolist()
+
+    def _get_query_terms(
+        self, token_ids: Sequence[int]
+    ) -> List[Tuple[float, Tuple[int, int]]]:
+        """Get the terms of a query sorted by descending maximum impact.
+
+        Args:
+            token_ids (Sequence[int]): The vocabulary IDs of the query terms.
+
+        Returns:
+            List[Tuple[float, Tuple[int, int]]]: The maximum impact, vocabulary ID and
+                number of occurrences of every distinct query term with postings.
+        """
+        weights: Dict[int, int] = {}
+        for token_id in token_ids:
+            weights[token_id] = weights.get(token_id, 0) + 1
+
+        terms = [
+            (weight * float(self._max_impacts[token_id]), (token_id, weight))
+            for token_id, weight in weights.items()
+            # The vocabulary may contain placeholder tokens without any postings
+            if token_id < len(self._indptr) - 1
+            and self._indptr[token_id + 1] > self._indptr[token_id]
+        ]
+        return sorted(terms, key=lambda term: term[0], reverse=True)
+
+    @staticmethod
+    def _get_threshold(doc_scores: NDArray[np.float32], k: int) -> float:
+        """Get the k-th best partial score, or -inf for fewer than k candidates."""
+        if len(doc_scores) < k:
+            return -np.inf
+        return float(np.partition(doc_scores, len(doc_scores) - k)[len(doc_scores) - k])
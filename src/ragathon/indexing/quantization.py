@@ -0,0 +1,211 @@
+from enum import StrEnum
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ragathon.indexing import save_array
+
+
+class EmbeddingPrecision(StrEnum):
+    """The precision of the embeddings searched in the first pass."""
+
+    FLOAT32 = "float32"
+    """Full precision."""
+
+    FLOAT16 = "float16"
+    """Half precision, half the memory of float32."""
+
+    INT8 = "int8"
+    """Scalar quantization to int8 with one scale per dimension, a quarter of the
+    memory of float32."""
+
+
+def quantized_file_name(
+    precision: EmbeddingPrecision, dimensions: Optional[int] = None
+) -> str:
+    """The name of the file of embeddings stored with the given precision.
+
+    Args:
+        precision (EmbeddingPrecision): The precision.
+        dimensions (Optional[int], optional): The number of leading dimensions that
+            are kept, or None if all are. Defaults to None.
+
+    Returns:
+        str: The file name.
+    """
+    prefix = "" if dimensions is None else f".d{dimensions}"
+    return f"embeddings{prefix}.{precision}.npy"
+
+
+def scales_file_name(
+    precision: EmbeddingPrecision, dimensions: Optional[int] = None
+) -> str:
+    """The name of the file of the per-dimension scales of quantized embeddings.
+
+    Args:
+        precision (EmbeddingPrecision): The precision.
+        dimensions (Optional[int], optional): The number of leading dimensions that
+            are kept, or None if all are. Defaults to None.
+
+    Returns:
+        str: The file name.
+    """
+    prefix = "" if dimensions is None else f".d{dimensions}"
+    return f"embeddings{prefix}.{precision}.scales.npy"
+
+
+class QuantizedEmbeddings:
+    """A compact copy of an embedding matrix for a fast, approximate first pass.
+
+    With int8 precision, every dimension is scaled symmetrically so that its largest
+    absolute value maps to 127. The approximate similarity of a query with all rows
+    is then the product of the scaled query with the int8 codes, which are converted
+    to float32 block by block for the matrix multiplication.
+    """
+
+    def __init__(
+        self,
+        codes: NDArray,
+        precision: EmbeddingPrecision,
+        scales: Optional[NDArray[np.float32]] = None,
+        block_size: int = 4096,
+    ) -> None:
+        """Wrap quantized embeddings.
+
+        Args:
+            codes (NDArray): The quantized embeddings, one per row.
+            precision (EmbeddingPrecision): The precision of `codes`.
+            scales (Optional[NDArray[np.float32]], optional): The scale of every
+                dimension, for int8 precision. Defaults to None.
+            block_size (int, optional): The number of rows converted to float32 at
+                once when searching. Defaults to 4096.
+        """
+        self._codes: NDArray = codes
+        self._precision: EmbeddingPrecision = precision
+        self._scales: Optional[NDArray[np.float32]] = scales
+        self._block_size: int = block_size
+
+    @classmethod
+    def quantize(
+        cls, embeddings: NDArray[np.float32], precision: EmbeddingPrecision
+    ) -> "QuantizedEmbeddings":
+        """Quantize an embedding matrix.
+
+        Args:
+            embeddings (NDArray[np.float32]): The embeddings, one per row.
+            precision (EmbeddingPrecision): The precision to quantize to. FLOAT32
+                keeps an in-memory copy.
+
+        Returns:
+            QuantizedEmbeddings: The quantized embeddings.
+        """
+        if precision == EmbeddingPrecision.FLOAT32:
+            codes = np.array(embeddings, dtype=np.float32)
+            return cls(codes=codes, precision=precision)
+
+        if precision == EmbeddingPrecision.FLOAT16:
+            return cls(codes=embeddings.astype(np.float16), precision=precision)
+
+        if precision == EmbeddingPrecision.INT8:
+            if len(embeddings) > 0:
+                scales = np.abs(embeddings).max(axis=0).astype(np.float32) / 127.0
+            else:
+                scales = np.ones(embeddings.shape[1], dtype=np.float32)
+            # Dimensions that are zero everywhere quantize to zero with any scale
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8)
+            return cls(codes=codes, precision=precision, scales=scales)
+
+        raise ValueError(f"Embeddings cannot be quantized to {precision}")
+
+    @classmethod
+    def load(
+        cls,
+        storage_dir: Path,
+        precision: EmbeddingPrecision,
+        dimensions: Optional[int] = None,
+    ) -> Optional["QuantizedEmbeddings"]:
+        """Memory-map quantized embeddings read-only, if they have been saved.
+
+        Args:
+            storage_dir (Path): The directory of the index.
+            precision (EmbeddingPrecision): The precision of the embeddings.
+            dimensions (Optional[int], optional): The number of leading dimensions
+                that were kept, or None if all were. Defaults to None.
+
+        Returns:
+            Optional[QuantizedEmbeddings]: The quantized embeddings, or None if they
+                have not been saved.
+        """
+        codes_path = storage_dir / quantized_file_name(
+            precision=precision, dimensions=dimensions
+        )
+        if not codes_path.exists():
+            return None
+
+        scales: Optional[NDArray[np.float32]] = None
+        if precision == EmbeddingPrecision.INT8:
+            scales_path = storage_dir / scales_file_name(
+                precision=precision, dimensions=dimensions
+            )
+            if not scales_path.exists():
+                return None
+            scales = np.load(scales_path, mmap_mode="r")
+
+        return cls(
+            codes=np.load(codes_path, mmap_mode="r"), precision=precision, scales=scales
+        )
+
+    @property
+    def precision(self) -> EmbeddingPrecision:
+        """The precision of the embeddings."""
+        return self._precision
+
+    @property
+    def dimensions(self) -> int:
+        """The number of dimensions of the embeddings."""
+        return self._codes.shape[1]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def save(self, storage_dir: Path, dimensions: Optional[int] = None) -> None:
+        """Save the quantized embeddings next to the full-precision ones.
+
+        Args:
+            storage_dir (Path): The directory of the index.
+            dimensions (Optional[int], optional): The number of leading dimensions
+                that were kept, or None if all were. Defaults to None.
+        """
+        if self._scales is not None:
+            scales_path = storage_dir / scales_file_name(
+                precision=self._precision, dimensions=dimensions
+            )
+            save_array(path=scales_path, array=self._scales)
+
+        codes_path = storage_dir / quantized_file_name(
+            precision=self._precision, dimensions=dimensions
+        )
+        save_array(path=codes_path, array=self._codes)
+
+    def similarities(self, queries: NDArray[np.float32]) -> NDArray[np.float32]:
+        """Approximate the similarities of queries with every row.
+
+        Args:
+            queries (NDArray[np.float32]): The query embeddings, one per row.
+
+        Returns:
+            NDArray[np.float32]: The approximate similarities, one row per query and
+                one column per embedding.
+        """
+        if self._scales is not None:
+            queries = queries * self._scales
+
+        similarities = np.empty((len(queries), len(self._codes)), dtype=np.float32)
+        for start in range(0, len(self._codes), self._block_size):
+            block = self._codes[start : start + self._block_size].astype(np.float32)
+            similarities[:, start : start + len(block)] = queries @ block.T
+
+        return similarities
@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import heapq
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from aiofiles import open as aio_open
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from ragathon.data.models import ChunkedText, ChunkedTextSet, SearchResult
+from ragathon.indexing import Indexer, fingerprint_directory
+from ragathon.indexing.analyzer import BM25Analyzer
+from ragathon.indexing.bm25 import BM25Engine, BM25Index, BM25TermStatistics
+
+SHARDS_FILE_NAME = "shards.json"
+
+
+class ShardManifest(BaseModel):
+    """Describes how a sharded BM25 index is partitioned."""
+
+    n_shards: int = Field(..., description="Number of partitions of the data set.")
+    """Number of partitions of the data set."""
+
+    shard_names: List[str] = Field(
+        default_factory=list, description="Directory names of the non-empty shards."
+    )
+    """Directory names of the non-empty shards."""
+
+    num_docs: int = Field(..., description="Total number of indexed chunks.")
+    """Total number of indexed chunks."""
+
+
+# The shard owned by the current worker process, see `_init_shard_worker()`
+_worker_shard: Optional[BM25Index] = None
+
+
+def _init_shard_worker(
+    storage_dir: Path,
+    language: str,
+    mmap: bool,
+    engine: BM25Engine,
+    stem_table_dir: Path,
+) -> None:
+    """Load a shard in a worker process."""
+    global _worker_shard
+    _worker_shard = BM25Index(
+        storage_dir=storage_dir,
+        language=language,
+        n_threads=0,
+        mmap=mmap,
+        engine=engine,
+        stem_table_dir=stem_table_dir,
+    )
+    asyncio.run(_worker_shard.load())
+
+
+def _search_shard_worker(queries: List[str], k: int) -> List[SearchResult]:
+    """Search the shard owned by the current worker process."""
+    assert _worker_shard is not None
+    return _worker_shard.search_many_sync(queries=queries, k=k)
+
+
+def shard_for_section(section_id: str, n_shards: int) -> int:
+    """Get the shard that a section belongs to.
+
+    A stable hash is used, so that a section always ends up in the same shard.
+
+    Args:
+        section_id (str): The ID of the section.
+        n_shards (int): The number of shards.
+
+    Returns:
+        int: The number of the shard.
+    """
+    digest = hashlib.md5(section_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % n_shards
+
+
+class ShardedBM25Index(Indexer):
+    """A BM25 index partitioned into several `BM25Index` shards by section.
+
+    The shards are searched in parallel and their results are combined with a heap
+    merge. All shards compute the IDF of terms from the statistics of the entire data
+    set, so their scores are comparable. Every shard keeps these statistics up to date
+    with its own changes when it is rebuilt. The shards share one stem table, stored
+    next to the manifest.
+    """
+
+    def __init__(
+        self,
+        storage_dir: Path,
+        language: str,
+        n_shards: Optional[int] = None,
+        use_processes: bool = False,
+        mmap: bool = False,
+        engine: BM25Engine = BM25Engine.EXHAUSTIVE,
+    ) -> None:
+        """Initialize the sharded index.
+
+        Args:
+            storage_dir (Path): The directory where the shards are stored.
+            language (str): The language used for stemming and stop words.
+            n_shards (Optional[int], optional): The number of shards to create. When
+                loading, the shards of the stored index are used. Defaults to the
+                number of CPUs.
+            use_processes (bool, optional): Whether each shard is searched in its
+                own worker process instead of a thread. Processes avoid contention
+                on the GIL, at the cost of loading every shard in its process.
+                Defaults to False.
+            mmap (bool, optional): Whether the shards are memory-mapped when loaded.
+                Defaults to False.
+            engine (BM25Engine, optional): The retrieval algorithm of the shards.
+                Defaults to BM25Engine.EXHAUSTIVE.
+        """
+        self._storage_dir: Path = storage_dir
+        self._language: str = language
+        self._n_shards: int = n_shards or os.cpu_count() or 1
+        self._use_processes: bool = use_processes
+        self._mmap: bool = mmap
+        self._engine: BM25Engine = engine
+        self._analyzer: BM25Analyzer = BM25Analyzer.for_language(language=language)
+        self._shards: List[BM25Index] = []
+        self._executors: List[Executor] = []
+
+    async def create(self, data_set: ChunkedTextSet) -> None:
+        """Partition the data set by section and create one BM25 index per shard.
+
+        The shards are loaded afterwards, so the index can be searched right away.
+
+        Args:
+            data_set (ChunkedTextSet): The data set to create the index from.
+        """
+        partitions: Dict[int, List[ChunkedText]] = {
+            shard: [] for shard in range(self._n_shards)
+        }
+        for chunk in data_set.chunks:
+            shard = shard_for_section(
+                section_id=chunk.section_id, n_shards=self._n_shards
+            )
+            partitions[shard].append(chunk)
+
+        # Analyze the entire data set once to get the global term statistics. The
+        # shards share the analyzer, so they reuse the stems computed here.
+        texts_tokens = self._analyzer.analyze_many(
+            texts=[chunk.text for chunk in data_set.chunks], learn=True
+        )
+        term_statistics = BM25TermStatistics.from_tokens(texts_tokens=texts_tokens)
+
+        manifest = ShardManifest(n_shards=self._n_shards, num_docs=len(data_set.chunks))
+        await self._close_shards()
+        self._storage_dir.mkdir(parents=True, exist_ok=True)
+
+        for shard, chunks in partitions.items():
+            if len(chunks) == 0:
+                logger.warning(f"Shard {shard} is empty and will not be created.")
+                continue
+
+            shard_name = f"shard-{shard}"
+            logger.info(f"Creating {shard_name} with {len(chunks)} chunks...")
+
+            index = self._create_shard(shard_name=shard_name)
+            await index.create(
+                data_set=ChunkedTextSet(
+                    chunking_method=data_set.chunking_method, chunks=chunks
+                ),
+                term_statistics=term_statistics,
+            )
+            manifest.shard_names.append(shard_name)
+
+        async with aio_open(self._storage_dir / SHARDS_FILE_NAME, mode="w") as f:
+            await f.write(manifest.model_dump_json(indent=2))
+
+        await self.load()
+
+    async def load(self) -> None:
+        """Load all shards from the storage directory."""
+        manifest = await self._load_manifest()
+        await self._close_shards()
+
+        for shard_name in manifest.shard_names:
+            index = self._create_shard(shard_name=shard_name)
+
+            if self._use_processes:
+                executor: Executor = ProcessPoolExecutor(
+                    max_workers=1,
+                    initializer=_init_shard_worker,
+                    initargs=(
+                        self._storage_dir / shard_name,
+                        self._language,
+                        self._mmap,
+                        self._engine,
+                        self._storage_dir,
+                    ),
+                )
+            else:
+                await index.load()
+                executor = ThreadPoolExecutor(max_workers=1)
+
+            self._shards.append(index)
+            self._executors.append(executor)
+
+    async def search(self, query: str, k: int) -> SearchResult:
+        """Search for the given query.
+
+        Args:
+            query (str): The query to search for.
+            k (int): The number of results to return.
+
+        Returns:
+            SearchResult: The search result.
+        """
+        results = await self.search_many(queries=[query], k=k)
+        return results[0]
+
+    async def search_many(self, queries: List[str], k: int) -> List[SearchResult]:
+        """Search all shards in parallel and merge their results.
+
+        Args:
+            queries (List[str]): The queries to search for.
+            k (int): The number of results to return for each query.
+
+        Returns:
+            List[SearchResult]: One search result per query, in the same order as
+                `queries`.
+        """
+        if len(self._shards) == 0:
+            raise ValueError(
+                "The sharded BM25 index has not been loaded. Please load it first"
+            )
+
+        loop = asyncio.get_running_loop()
+        shard_results: List[List[SearchResult]] = await asyncio.gather(
+            *[
+                loop.run_in_executor(executor, _search_shard_worker, queries, k)
+                if self._use_processes
+                else loop.run_in_executor(executor, shard.search_many_sync, queries, k)
+                for shard, executor in zip(self._shards, self._executors)
+            ]
+        )
+
+        results: List[SearchResult] = []
+        for i, query in enumerate(queries):
+            # Every shard returns its matches sorted by descending score
+            merged = heapq.merge(
+                *[results_of_shard[i].matches for results_of_shard in shard_results],
+                key=lambda match: match.score,
+                reverse=True,
+            )
+
+            result = SearchResult(query=query)
+            for rank, match in enumerate(islice(merged, k), start=1):
+                result.matches.append(match.model_copy(update={"rank": rank}))
+            results.append(result)
+
+        return results
+
+    async def fingerprint(self) -> str:
+        """Get a fingerprint of the files of the manifest and all shards.
+
+        Returns:
+            str: The fingerprint.
+        """
+        return fingerprint_directory(directory=self._storage_dir)
+
+    async def exists(self) -> bool:
+        """Check if the sharded index and all of its shards exist.
+
+        Returns:
+            bool: True if the index exists, False otherwise.
+        """
+        if not (self._storage_dir / SHARDS_FILE_NAME).exists():
+            return False
+
+        manifest = await self._load_manifest()
+        for shard_name in manifest.shard_names:
+            if not await self._create_shard(shard_name=shard_name).exists():
+                return False
+
+        return True
+
+    async def close(self) -> None:
+        """Shut down the workers that search the shards."""
+        await self._close_shards()
+
+    def _create_shard(self, shard_name: str) -> BM25Index:
+        # Every shard is searched by a single worker, so bm25s itself does not need
+        # to spawn threads
+        return BM25Index(
+            storage_dir=self._storage_dir / shard_name,
+            language=self._language,
+            n_threads=0,
+            mmap=self._mmap,
+            analyzer=self._analyzer,
+            engine=self._engine,
+            stem_table_dir=self._storage_dir,
+        )
+
+    async def _load_manifest(self) -> ShardManifest:
+        async with aio_open(self._storage_dir / SHARDS_FILE_NAME, mode="r") as f:
+            return ShardManifest.model_validate_json(await f.read())
+
+    async def _close_shards(self) -> None:
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors = []
+        self._shards = []
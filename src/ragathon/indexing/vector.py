@@ -1,28 +1,401 @@
+import asyncio
+import os
+import shutil
+import time
+from enum import StrEnum
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Sequence, Set, Tuple, Union
 
-from aiofiles import open as aio_open
+import anyio
+import numpy as np
 from annoy import AnnoyIndex
 from loguru import logger
-
-from ragathon.data.models import ChunkedTextSet, MatchedChunk, SearchResult
-from ragathon.indexing import CorpusItem, Indexer
+from numpy.typing import NDArray
+from pydantic import BaseModel, Field
+
+from ragathon.data.models import ChunkedText, ChunkedTextSet, MatchedChunk, SearchResult
+from ragathon.indexing import CorpusItem, Indexer, fingerprint_directory
+from ragathon.indexing.corpus import ColumnarCorpus
+from ragathon.indexing.delta import VectorDeltaSegment
+from ragathon.indexing.flat import (
+    EMBEDDINGS_FILE_NAME,
+    FlatVectorIndex,
+    normalize_embeddings,
+)
+from ragathon.indexing.hnsw import HNSW_INDEX_FILE_NAME, HNSWGraph
+from ragathon.indexing.quantization import EmbeddingPrecision
 from ragathon.llms.common import Embedder
 
 VECTOR_INDEX_FILE_NAME = "annoy.ann"
+ANN_PARAMETERS_FILE_NAME = "ann_parameters.json"
+VERSION_FILE_NAME = "version.txt"
+VERSION_DIR_PREFIX = "version-"
+
+
+class VectorIndexBackend(StrEnum):
+    """The data structure used to search the embeddings."""
+
+    AUTO = "auto"
+    """Exact search for small corpora, Annoy from `ann_threshold` chunks."""
+
+    FLAT = "flat"
+    """Exact search by comparing the query with every chunk."""
+
+    ANNOY = "annoy"
+    """Approximate search with an Annoy random projection forest."""
+
+    HNSW = "hnsw"
+    """Approximate search with an HNSW graph."""
+
+
+class HNSWParameters(BaseModel):
+    """Parameters of an HNSW graph."""
+
+    m: int = Field(default=16, description="Number of links per node.")
+    """Number of links per node."""
+
+    ef_construction: int = Field(
+        default=100, description="Beam width used when inserting nodes."
+    )
+    """Beam width used when inserting nodes."""
+
+    ef_search: int = Field(default=64, description="Beam width used when searching.")
+    """Beam width used when searching."""
+
+
+class AnnoyParameters(BaseModel):
+    """Parameters of an Annoy index."""
+
+    n_trees: int = Field(default=10, description="Number of random projection trees.")
+    """Number of random projection trees."""
+
+    search_k: int = Field(
+        default=1000, description="Number of tree nodes inspected when searching."
+    )
+    """Number of tree nodes inspected when searching."""
+
+
+class ANNParameters(BaseModel):
+    """Parameters of the approximate indices, stored in the index directory."""
+
+    annoy: AnnoyParameters = Field(
+        default_factory=AnnoyParameters, description="Parameters of the Annoy index."
+    )
+    """Parameters of the Annoy index."""
+
+    hnsw: HNSWParameters = Field(
+        default_factory=HNSWParameters, description="Parameters of the HNSW graph."
+    )
+    """Parameters of the HNSW graph."""
+
+
+def read_ann_parameters(storage_dir: Path) -> Optional[ANNParameters]:
+    """Read the parameters stored in the directory of a vector index.
+
+    Args:
+        storage_dir (Path): The directory of the index.
+
+    Returns:
+        Optional[ANNParameters]: The parameters, or None if none are stored.
+    """
+    path = storage_dir / ANN_PARAMETERS_FILE_NAME
+    if not path.exists():
+        return None
+
+    return ANNParameters.model_validate_json(path.read_text(encoding="utf-8"))
+
+
+def write_ann_parameters(storage_dir: Path, parameters: ANNParameters) -> None:
+    """Store parameters in the directory of a vector index, to be used on load.
+
+    Args:
+        storage_dir (Path): The directory of the index.
+        parameters (ANNParameters): The parameters.
+    """
+    path = storage_dir / ANN_PARAMETERS_FILE_NAME
+    path.write_text(parameters.model_dump_json(indent=2), encoding="utf-8")
+
+
+def current_version_dir(storage_dir: Path) -> Path:
+    """Get the directory holding the files of the current version of a vector index.
+
+    Indices created before their files were versioned hold them in the storage
+    directory itself.
+
+    Args:
+        storage_dir (Path): The directory of the index.
+
+    Returns:
+        Path: The directory of the current version.
+    """
+    path = storage_dir / VERSION_FILE_NAME
+    if not path.exists():
+        return storage_dir
+
+    return storage_dir / path.read_text(encoding="utf-8").strip()
+
+
+def create_version_dir(storage_dir: Path) -> Path:
+    """Create the directory of a new version of a vector index.
+
+    The files of the version are written to the directory, which becomes the
+    current version with `switch_version()` once it is complete.
+
+    Args:
+        storage_dir (Path): The directory of the index.
+
+    Returns:
+        Path: The directory of the new version.
+    """
+    # The names sort by creation time, so that pruning spares newer versions
+    version_dir = storage_dir / f"{VERSION_DIR_PREFIX}{time.time_ns()}"
+    version_dir.mkdir(parents=True)
+    return version_dir
+
+
+def switch_version(storage_dir: Path, version_dir: Path) -> None:
+    """Make a complete version directory the current version of a vector index.
+
+    The version file naming the current directory is replaced in one step, so a
+    loader sees either all files of the previous version or all files of the new
+    one. The previous version is kept for the processes that are still loading it,
+    and the older ones are removed, except those created after the new version.
+
+    Args:
+        storage_dir (Path): The directory of the index.
+        version_dir (Path): The directory of the new version.
+    """
+    previous_dir = current_version_dir(storage_dir=storage_dir)
+
+    path = storage_dir / VERSION_FILE_NAME
+    temporary_path = path.with_name(f"{path.name}.tmp")
+    temporary_path.write_text(version_dir.name, encoding="utf-8")
+    os.replace(temporary_path, path)
+
+    for stale_dir in storage_dir.glob(f"{VERSION_DIR_PREFIX}*"):
+        if stale_dir.name < version_dir.name and stale_dir != previous_dir:
+            shutil.rmtree(stale_dir)
+
+    if previous_dir != storage_dir:
+        # Remove the files of an index created before its files were versioned
+        for stale_path in storage_dir.iterdir():
+            if stale_path.is_file() and stale_path != path:
+                stale_path.unlink()
+
+
+def build_annoy_index(
+    embeddings: NDArray[np.float32], parameters: AnnoyParameters
+) -> AnnoyIndex:
+    """Build an Annoy index of embeddings.
+
+    Args:
+        embeddings (NDArray[np.float32]): The embeddings, one per row.
+        parameters (AnnoyParameters): The parameters of the index.
+
+    Returns:
+        AnnoyIndex: The index, where item `i` is row `i` of the embeddings.
+    """
+    index = AnnoyIndex(embeddings.shape[1], "angular")
+    for i, embedding in enumerate(embeddings):
+        index.add_item(i, embedding)
+    index.build(n_trees=parameters.n_trees, n_jobs=-1)
+    return index
+
+
+def search_annoy_index(
+    index: AnnoyIndex, query_embedding: NDArray[np.float32], k: int, search_k: int
+) -> Tuple[List[int], List[float]]:
+    """Search an Annoy index for the embeddings most similar to a query.
+
+    Args:
+        index (AnnoyIndex): The index.
+        query_embedding (NDArray[np.float32]): The L2-normalized query embedding.
+        k (int): The number of embeddings to find.
+        search_k (int): The number of tree nodes to inspect.
+
+    Returns:
+        Tuple[List[int], List[float]]: The items and cosine similarities of the found
+            embeddings, sorted by descending similarity.
+    """
+    indices, distances = index.get_nns_by_vector(
+        vector=query_embedding, n=k, search_k=search_k, include_distances=True
+    )
+    # Annoy's angular distance is the Euclidean distance between the normalized
+    # vectors, sqrt(2 - 2 * cos)
+    return indices, [1.0 - distance**2 / 2.0 for distance in distances]
+
+
+def build_hnsw_graph(
+    embeddings: NDArray[np.float32], parameters: HNSWParameters
+) -> HNSWGraph:
+    """Build an HNSW graph of embeddings.
+
+    Args:
+        embeddings (NDArray[np.float32]): The L2-normalized embeddings, one per row.
+        parameters (HNSWParameters): The parameters of the graph.
+
+    Returns:
+        HNSWGraph: The graph, where node `i` is row `i` of the embeddings.
+    """
+    graph = HNSWGraph(
+        dimensions=embeddings.shape[1],
+        m=parameters.m,
+        ef_construction=parameters.ef_construction,
+        ef_search=parameters.ef_search,
+    )
+    graph.index_vectors(vectors=embeddings)
+    return graph
+
+
+def is_vector_index(storage_dir: Path) -> bool:
+    """Check whether a directory holds a vector index rather than a BM25 index.
+
+    Args:
+        storage_dir (Path): The directory to check.
+
+    Returns:
+        bool: True if the directory holds a vector index.
+    """
+    data_dir = current_version_dir(storage_dir=storage_dir)
+    return any(
+        (data_dir / file_name).exists()
+        for file_name in [
+            EMBEDDINGS_FILE_NAME,
+            VECTOR_INDEX_FILE_NAME,
+            HNSW_INDEX_FILE_NAME,
+        ]
+    )
+
+
+def _log_merge_failure(task: asyncio.Task) -> None:
+    """Log the exception of a background merge, which nothing else may await.
+
+    Args:
+        task (asyncio.Task): The finished merge task.
+    """
+    if task.cancelled():
+        return
+    exception = task.exception()
+    if exception is not None:
+        logger.opt(exception=exception).error("The background merge failed")
 
 
 class VectorIndex(Indexer):
-    def __init__(self, storage_dir: Path, embedder: Embedder) -> None:
+    """A vector index with exact or approximate search.
+
+    The embeddings of all chunks are always stored as a `FlatVectorIndex`. Depending
+    on the backend, an Annoy index or an HNSW graph is built on top of them, and used
+    for searching when it exists. By default, corpora with at least `ann_threshold`
+    chunks get an Annoy index, and smaller corpora are searched exactly, which is
+    both faster and more accurate at that size.
+
+    The files of the index are stored in a version directory, named by a version
+    file in the storage directory. A new version is written in full to a new
+    directory before the version file is replaced, so a loader never mixes the files
+    of two versions.
+
+    The parameters of the approximate indices are stored with the index when it is
+    created, and can be replaced by tuned ones with `tools/tune_vector_index.py`.
+    `load()` uses the stored parameters, unless others are given explicitly.
+
+    Chunks added or deleted after the index was built are kept in a small delta
+    segment that is searched exactly together with the base index, so every backend
+    supports updates. Once the segment holds `merge_threshold` changes, a background
+    task rebuilds the base index from the remaining base chunks and the delta in a
+    new version, and swaps it in. Searches and further changes continue against the
+    old base index while the merge runs.
+    """
+
+    def __init__(
+        self,
+        storage_dir: Path,
+        embedder: Embedder,
+        ann_threshold: int = 100_000,
+        backend: VectorIndexBackend = VectorIndexBackend.AUTO,
+        hnsw_parameters: Optional[HNSWParameters] = None,
+        annoy_parameters: Optional[AnnoyParameters] = None,
+        precision: EmbeddingPrecision = EmbeddingPrecision.FLOAT32,
+        rescore_factor: int = 10,
+        coarse_dimensions: Optional[int] = None,
+        merge_threshold: int = 1000,
+    ) -> None:
+        """Initialize the vector index.
+
+        Args:
+            storage_dir (Path): The directory where the index is stored.
+            embedder (Embedder): The embedder used for the chunks and the queries.
+            ann_threshold (int, optional): The number of chunks from which the AUTO
+                backend builds an approximate Annoy index. Defaults to 100,000.
+            backend (VectorIndexBackend, optional): The backend built by `create()`.
+                `load()` uses whichever backend was built. Defaults to
+                VectorIndexBackend.AUTO.
+            hnsw_parameters (Optional[HNSWParameters], optional): The parameters of
+                the HNSW graph. The beam width used when searching also applies to
+                loaded graphs. Defaults to the stored parameters, or the defaults of
+                `HNSWParameters`.
+            annoy_parameters (Optional[AnnoyParameters], optional): The parameters
+                of the Annoy index. `search_k` also applies to loaded indices.
+                Defaults to the stored parameters, or the defaults of
+                `AnnoyParameters`.
+            precision (EmbeddingPrecision, optional): The precision of the first
+                pass of exact search, see `FlatVectorIndex`. Defaults to
+                EmbeddingPrecision.FLOAT32.
+            rescore_factor (int, optional): The number of candidates per result that
+                are rescored with full precision. Defaults to 10.
+            coarse_dimensions (Optional[int], optional): The number of leading
+                dimensions compared in the first pass of exact search, see
+                `FlatVectorIndex`. Defaults to None.
+            merge_threshold (int, optional): The number of added and deleted chunks
+                after which the delta segment is merged into the base index in the
+                background. Defaults to 1000.
+        """
         self._storage_dir: Path = storage_dir
-        self._corpus: List[CorpusItem] = []
+        # The directory of the version that is loaded
+        self._data_dir: Path = storage_dir
         self._embedder: Embedder = embedder
+        self._ann_threshold: int = ann_threshold
+        self._backend: VectorIndexBackend = backend
+        self._hnsw_parameters: Optional[HNSWParameters] = hnsw_parameters
+        self._annoy_parameters: Optional[AnnoyParameters] = annoy_parameters
+        self._parameters: ANNParameters = self._resolve_parameters(stored=None)
 
         self._embedding_size: int = self._embedder.get_embedding_size()
-        self._index: AnnoyIndex = AnnoyIndex(self._embedding_size, "angular")
+        self._index: Optional[AnnoyIndex] = None
+        self._graph: Optional[HNSWGraph] = None
+        self._precision: EmbeddingPrecision = precision
+        self._rescore_factor: int = rescore_factor
+        self._coarse_dimensions: Optional[int] = coarse_dimensions
+        self._flat: FlatVectorIndex = self._create_flat(storage_dir=storage_dir)
+
+        self._merge_threshold: int = merge_threshold
+        self._delta: VectorDeltaSegment = VectorDeltaSegment(
+            embedding_size=self._embedding_size
+        )
+        self._base_chunk_ids: Optional[Set[str]] = None
+        self._delta_lock: asyncio.Lock = asyncio.Lock()
+        self._merge_lock: asyncio.Lock = asyncio.Lock()
+        self._merge_task: Optional[asyncio.Task] = None
+        # The changes made while a merge is running, replayed onto the merged index
+        self._merge_log: Optional[List[Tuple[CorpusItem, Optional[NDArray]]]] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the index has been created or loaded."""
+        return (
+            self._index is not None
+            or self._graph is not None
+            or self._flat.embeddings is not None
+        )
+
+    @property
+    def parameters(self) -> ANNParameters:
+        """The parameters of the approximate indices."""
+        return self._parameters
 
-        self._index_path: Path = self._storage_dir / VECTOR_INDEX_FILE_NAME
-        self._corpus_path: Path = self._storage_dir / "corpus.jsonl"
+    @property
+    def uses_ann(self) -> bool:
+        """Whether searches are answered by an approximate index."""
+        return self._index is not None or self._graph is not None
 
     async def create(self, data_set: ChunkedTextSet) -> None:
         """Create an embedding index from the given data set.
@@ -33,40 +406,53 @@ class VectorIndex(Indexer):
         texts = [chunk.text for chunk in data_set.chunks]
         logger.debug(f"Embedding {len(texts)} chunks...")
 
-        list_of_embeddings = await self._embedder.embed(texts=texts)
+        embeddings = await self._embedder.embed_matrix(texts=texts)
+        await self.create_from_embeddings(chunks=data_set.chunks, embeddings=embeddings)
 
-        for i, embedding in enumerate(list_of_embeddings):
-            self._index.add_item(i, embedding)
+    async def create_from_embeddings(
+        self,
+        chunks: List[ChunkedText],
+        embeddings: Union[NDArray[np.float32], Sequence[NDArray[np.float32]]],
+    ) -> None:
+        """Create the index from chunks that have already been embedded.
 
-        self._index.build(n_trees=10, n_jobs=-1)
+        The index is written to a new version directory, which becomes the current
+        version once all its files are written.
 
-        self._corpus = [
-            CorpusItem(
-                index=index,
-                chunk_id=chunk.id,
-                section_id=chunk.section_id,
-                text=chunk.text,
-            )
-            for index, chunk in enumerate(data_set.chunks)
-        ]
+        Args:
+            chunks (List[ChunkedText]): The chunks to index.
+            embeddings (Union[NDArray[np.float32], Sequence[NDArray[np.float32]]]):
+                The embedding of every chunk, as a matrix or a sequence of rows.
+        """
+        self._parameters = self._resolve_parameters(stored=None)
+        version_dir = create_version_dir(storage_dir=self._storage_dir)
+        self._flat, self._index, self._graph = await self._build_base(
+            data_dir=version_dir,
+            chunks=chunks,
+            embeddings=embeddings,
+            backend=self._backend,
+        )
 
-        await self._save()
+        self._data_dir = version_dir
+        self._delta.clear()
+        self._base_chunk_ids = None
+        switch_version(storage_dir=self._storage_dir, version_dir=version_dir)
 
     async def load(self) -> None:
         """Load the embedding index from the storage directory."""
-
-        if not self._index_path.exists() or not self._corpus_path.exists():
+        if not await self.exists():
             raise FileNotFoundError("Index or corpus file not found.")
 
-        self._index.load(str(self._index_path))
-
-        async with aio_open(self._corpus_path, "r") as f:
-            while True:
-                line = await f.readline()
-                if not line:
-                    break
-                item = CorpusItem.model_validate_json(json_data=line)
-                self._corpus.append(item)
+        data_dir = current_version_dir(storage_dir=self._storage_dir)
+        self._parameters = self._resolve_parameters(
+            stored=read_ann_parameters(storage_dir=data_dir)
+        )
+        self._flat, self._index, self._graph = await self._load_base(
+            data_dir=data_dir
+        )
+        self._data_dir = data_dir
+        self._base_chunk_ids = None
+        await self._delta.load(storage_dir=data_dir)
 
     async def search(self, query: str, k: int) -> SearchResult:
         """Search for the given query.
@@ -78,59 +464,431 @@ class VectorIndex(Indexer):
         Returns:
             SearchResult: The search result.
         """
+        results = await self.search_many(queries=[query], k=k)
+        return results[0]
 
-        if self._index is None:
+    async def search_many(self, queries: List[str], k: int) -> List[SearchResult]:
+        """Search for all the given queries with one embedding request.
+
+        The score of a match is the cosine similarity between the query and the
+        chunk, for both exact and approximate search.
+
+        Args:
+            queries (List[str]): The queries to search for.
+            k (int): The number of results to return for each query.
+
+        Returns:
+            List[SearchResult]: One search result per query, in the same order as
+                `queries`.
+        """
+        if not self.is_loaded:
             raise ValueError(
                 "The embedding index has not been loaded. Please create or load it first"
             )
 
-        logger.debug(f"Searching for query: {query}")
-        query_embeddings = await self._embedder.embed(texts=[query])
-        query_embedding = query_embeddings[0]
+        if len(queries) == 0:
+            return []
 
-        indices, distances = self._index.get_nns_by_vector(
-            vector=query_embedding, n=k, search_k=1000, include_distances=True
+        logger.debug(f"Searching for {len(queries)} queries")
+        query_embeddings = normalize_embeddings(
+            embeddings=await self._embedder.embed_matrix(texts=queries)
         )
 
-        result: SearchResult = SearchResult(query=query)
+        # Fetch enough results from the base index to still have k results after
+        # dropping the deleted chunks
+        tombstones = self._delta.tombstones
+        k_base = min(k + len(tombstones), len(self._flat.corpus))
+
+        all_indices: List[List[int]] = []
+        all_scores: List[List[float]] = []
+
+        if k_base == 0:
+            all_indices = [[] for _ in queries]
+            all_scores = [[] for _ in queries]
+        elif self._graph is not None:
+            for query_embedding in query_embeddings:
+                indices, scores = self._graph.search(query=query_embedding, k=k_base)
+                all_indices.append(indices.tolist())
+                all_scores.append(scores.tolist())
+        elif self._index is not None:
+            for query_embedding in query_embeddings:
+                indices, scores = search_annoy_index(
+                    index=self._index,
+                    query_embedding=query_embedding,
+                    k=k_base,
+                    search_k=self._parameters.annoy.search_k,
+                )
+                all_indices.append(indices)
+                all_scores.append(scores)
+        else:
+            indices, scores = self._flat.search_embeddings(
+                query_embeddings=query_embeddings, k=k_base
+            )
+            all_indices = indices.tolist()
+            all_scores = scores.tolist()
+
+        if self._delta.is_empty:
+            return [
+                self._flat.build_search_result(
+                    query=query, indices=all_indices[i][:k], scores=all_scores[i][:k]
+                )
+                for i, query in enumerate(queries)
+            ]
+
+        delta_hits = self._delta.search(query_embeddings=query_embeddings, k=k)
 
-        for i, (idx, distance) in enumerate(zip(indices, distances)):
-            corpus_item = self._corpus[idx]
-            # Convert distance to similarity score (Annoy uses angular distance)
-            score = 1.0 / (1.0 + distance)
-            matched_chunk = MatchedChunk(
-                chunk_id=corpus_item.chunk_id,
-                section_id=corpus_item.section_id,
-                chunk_text=corpus_item.text,
-                rank=i + 1,
-                score=float(score),
+        results: List[SearchResult] = []
+        for i, query in enumerate(queries):
+            hits = [
+                (score, self._flat.corpus[index])
+                for index, score in zip(all_indices[i], all_scores[i])
+            ]
+            hits = [hit for hit in hits if hit[1].chunk_id not in tombstones]
+            hits = sorted(hits + delta_hits[i], key=lambda hit: hit[0], reverse=True)
+            results.append(self._build_search_result(query=query, hits=hits[:k]))
+
+        return results
+
+    async def add(self, chunks: List[ChunkedText]) -> None:
+        """Add chunks to the index without rebuilding it.
+
+        The chunks are stored in a delta segment that is searched together with the
+        base index. Chunks with the ID of an existing chunk replace that chunk.
+
+        Args:
+            chunks (List[ChunkedText]): The chunks to add.
+        """
+        if not self.is_loaded:
+            raise ValueError(
+                "The embedding index has not been loaded. Please create or load it first"
             )
-            result.matches.append(matched_chunk)
 
-        return result
+        embeddings = normalize_embeddings(
+            embeddings=await self._embedder.embed_matrix(
+                texts=[chunk.text for chunk in chunks]
+            )
+        )
 
-    async def exists(self) -> bool:
-        """Check if the BM25 index exists.
+        for chunk, embedding in zip(chunks, embeddings):
+            item = CorpusItem(
+                index=len(self._delta),
+                chunk_id=chunk.id,
+                section_id=chunk.section_id,
+                text=chunk.text,
+            )
+            self._apply_change(item=item, embedding=embedding)
 
-        Returns:
-            bool: True if the index exists, False otherwise.
+        await self._save_delta_or_merge()
+
+    async def delete(self, chunk_ids: List[str]) -> None:
+        """Delete chunks from the index without rebuilding it.
+
+        Args:
+            chunk_ids (List[str]): The IDs of the chunks to delete.
         """
-        file_names = [
-            "corpus.jsonl",
-            VECTOR_INDEX_FILE_NAME,
+        if not self.is_loaded:
+            raise ValueError(
+                "The embedding index has not been loaded. Please create or load it first"
+            )
+
+        for chunk_id in chunk_ids:
+            item = CorpusItem(index=-1, chunk_id=chunk_id, section_id="", text="")
+            self._apply_change(item=item, embedding=None)
+
+        await self._save_delta_or_merge()
+
+    async def merge(self) -> None:
+        """Merge the delta segment into the base index by rebuilding it.
+
+        The merged index is built in a new version directory while searches and
+        changes continue against the current one. The changes made in the meantime
+        are replayed onto it, and the new version replaces the current one once its
+        delta segment is saved.
+        """
+        async with self._merge_lock:
+            if self._delta.is_empty:
+                return
+            self._merge_log = []
+            try:
+                await self._merge()
+            finally:
+                self._merge_log = None
+
+    async def wait_for_merge(self) -> None:
+        """Wait until the merges running in the background have finished."""
+        while self._merge_task is not None:
+            task = self._merge_task
+            await task
+            # Changes made during the merge may have started another one
+            if self._merge_task is task:
+                break
+
+    async def _merge(self) -> None:
+        tombstones = set(self._delta.tombstones)
+        delta_items = self._delta.items
+        delta_embeddings = self._delta.embeddings
+
+        base_chunk_ids = self._get_base_chunk_id_list()
+        rows = [
+            row
+            for row, chunk_id in enumerate(base_chunk_ids)
+            if chunk_id not in tombstones
         ]
+        chunks = [
+            ChunkedText(
+                id=item.chunk_id, section_id=item.section_id, text=item.text
+            )
+            for item in [self._flat.corpus[row] for row in rows] + delta_items
+        ]
+
+        logger.info(
+            f"Merging {len(delta_items)} added and {len(tombstones)} deleted chunks "
+            f"into the vector index at {self._storage_dir}"
+        )
+
+        embeddings = await anyio.to_thread.run_sync(
+            self._stack_embeddings, rows, delta_embeddings
+        )
+
+        version_dir = create_version_dir(storage_dir=self._storage_dir)
+        await self._build_base(
+            data_dir=version_dir,
+            chunks=chunks,
+            embeddings=embeddings,
+            backend=self._merged_backend(),
+        )
+        flat, index, graph = await self._load_base(data_dir=version_dir)
+
+        # Swap in the merged index and replay the changes made during the merge,
+        # without yielding to other tasks in between
+        merge_log = self._merge_log or []
+        self._merge_log = None
+        self._flat, self._index, self._graph = flat, index, graph
+        self._data_dir = version_dir
+        self._base_chunk_ids = None
+        self._delta = VectorDeltaSegment(embedding_size=self._embedding_size)
+        for item, embedding in merge_log:
+            self._apply_change(item=item, embedding=embedding)
+
+        # Only switch to the new version once it holds the replayed delta segment,
+        # so that a loader never pairs the merged base with the old delta
+        async with self._delta_lock:
+            await self._delta.save(storage_dir=version_dir)
+            switch_version(storage_dir=self._storage_dir, version_dir=version_dir)
+
+    def _apply_change(self, item: CorpusItem, embedding: Optional[NDArray]) -> None:
+        """Add an item to the delta segment, or delete it if it has no embedding.
+
+        Args:
+            item (CorpusItem): The item to add, or an item with the ID to delete.
+            embedding (Optional[NDArray]): The normalized embedding of the item, or
+                None to delete it.
+        """
+        self._delta.remove(chunk_id=item.chunk_id)
+        if item.chunk_id in self._get_base_chunk_ids():
+            self._delta.tombstone(chunk_id=item.chunk_id)
+        if embedding is not None:
+            self._delta.add(item=item, embedding=embedding)
+
+        if self._merge_log is not None:
+            self._merge_log.append((item, embedding))
+
+    async def _save_delta_or_merge(self) -> None:
+        """Persist the delta segment, and start a merge once it has grown too large."""
+        await self._save_delta()
+
+        if len(self._delta) + len(self._delta.tombstones) < self._merge_threshold:
+            return
+        if self._merge_task is None or self._merge_task.done():
+            self._merge_task = asyncio.create_task(self.merge())
+            self._merge_task.add_done_callback(_log_merge_failure)
+
+    async def _save_delta(self) -> None:
+        # Always save the current segment, which may have been swapped by a merge
+        async with self._delta_lock:
+            await self._delta.save(storage_dir=self._data_dir)
+
+    def _get_base_chunk_id_list(self) -> List[str]:
+        corpus = self._flat.corpus
+        if isinstance(corpus, ColumnarCorpus):
+            return corpus.column(name="chunk_id")
+        return [item.chunk_id for item in corpus]
+
+    def _get_base_chunk_ids(self) -> Set[str]:
+        """Get the IDs of all chunks in the base index.
+
+        Returns:
+            Set[str]: The chunk IDs.
+        """
+        if self._base_chunk_ids is None:
+            self._base_chunk_ids = set(self._get_base_chunk_id_list())
+        return self._base_chunk_ids
+
+    def _stack_embeddings(
+        self, rows: List[int], delta_embeddings: NDArray[np.float32]
+    ) -> NDArray[np.float32]:
+        if self._flat.embeddings is not None:
+            base = np.asarray(self._flat.embeddings[rows], dtype=np.float32)
+        elif self._index is not None:
+            # Indices created before the embeddings were stored only have Annoy
+            base = np.array(
+                [self._index.get_item_vector(row) for row in rows], dtype=np.float32
+            ).reshape(len(rows), self._embedding_size)
+        else:
+            raise ValueError(
+                "The embedding index has not been loaded. Please create or load it first"
+            )
+        return np.concatenate([base, delta_embeddings])
+
+    def _merged_backend(self) -> VectorIndexBackend:
+        if self._graph is not None:
+            return VectorIndexBackend.HNSW
+        if self._index is not None:
+            return VectorIndexBackend.ANNOY
+        return self._backend
+
+    async def _build_base(
+        self,
+        data_dir: Path,
+        chunks: List[ChunkedText],
+        embeddings: Union[NDArray[np.float32], Sequence[NDArray[np.float32]]],
+        backend: VectorIndexBackend,
+    ) -> Tuple[FlatVectorIndex, Optional[AnnoyIndex], Optional[HNSWGraph]]:
+        """Build a base index in the directory of a new version.
+
+        The approximate index is built in a worker thread, so that other tasks, e.g.
+        searches of the index being merged, keep running.
+
+        Args:
+            data_dir (Path): The directory of the new version.
+            chunks (List[ChunkedText]): The chunks to index.
+            embeddings (Union[NDArray[np.float32], Sequence[NDArray[np.float32]]]):
+                The embedding of every chunk, as a matrix or a sequence of rows.
+            backend (VectorIndexBackend): The backend to build.
+
+        Returns:
+            Tuple[FlatVectorIndex, Optional[AnnoyIndex], Optional[HNSWGraph]]: The
+                embeddings and corpus, and the approximate index, if any.
+        """
+        flat = self._create_flat(storage_dir=data_dir)
+        await flat.create_from_embeddings(chunks=chunks, embeddings=embeddings)
+        write_ann_parameters(storage_dir=data_dir, parameters=self._parameters)
+
+        use_annoy = backend == VectorIndexBackend.ANNOY or (
+            backend == VectorIndexBackend.AUTO and len(chunks) >= self._ann_threshold
+        )
+
+        index: Optional[AnnoyIndex] = None
+        graph: Optional[HNSWGraph] = None
+        assert flat.embeddings is not None
+        if use_annoy:
+            logger.debug(f"Building an Annoy index for {len(chunks)} chunks...")
+            index = await anyio.to_thread.run_sync(
+                build_annoy_index, flat.embeddings, self._parameters.annoy
+            )
+            index.save(str(data_dir / VECTOR_INDEX_FILE_NAME))
+        elif backend == VectorIndexBackend.HNSW:
+            logger.debug(f"Building an HNSW graph for {len(chunks)} chunks...")
+            graph = await anyio.to_thread.run_sync(
+                build_hnsw_graph, flat.embeddings, self._parameters.hnsw
+            )
+            graph.save(path=data_dir / HNSW_INDEX_FILE_NAME)
+
+        return flat, index, graph
+
+    async def _load_base(
+        self, data_dir: Path
+    ) -> Tuple[FlatVectorIndex, Optional[AnnoyIndex], Optional[HNSWGraph]]:
+        """Load the base index from the directory of a version.
+
+        Args:
+            data_dir (Path): The directory of the version.
+
+        Returns:
+            Tuple[FlatVectorIndex, Optional[AnnoyIndex], Optional[HNSWGraph]]: The
+                embeddings and corpus, and the approximate index, if any.
+        """
+        flat = self._create_flat(storage_dir=data_dir)
+        if (data_dir / EMBEDDINGS_FILE_NAME).exists():
+            await flat.load()
+        else:
+            # Indices created before the embeddings were stored only have Annoy
+            await flat.load_corpus()
+
+        index: Optional[AnnoyIndex] = None
+        graph: Optional[HNSWGraph] = None
+        graph_path = data_dir / HNSW_INDEX_FILE_NAME
+        index_path = data_dir / VECTOR_INDEX_FILE_NAME
+        if graph_path.exists():
+            assert flat.embeddings is not None
+            graph = HNSWGraph.load(
+                path=graph_path,
+                vectors=flat.embeddings,
+                ef_search=self._parameters.hnsw.ef_search,
+            )
+        elif index_path.exists():
+            index = AnnoyIndex(self._embedding_size, "angular")
+            index.load(str(index_path))
+
+        return flat, index, graph
+
+    def _create_flat(self, storage_dir: Path) -> FlatVectorIndex:
+        return FlatVectorIndex(
+            storage_dir=storage_dir,
+            embedder=self._embedder,
+            precision=self._precision,
+            rescore_factor=self._rescore_factor,
+            coarse_dimensions=self._coarse_dimensions,
+        )
+
+    def _build_search_result(
+        self, query: str, hits: List[Tuple[float, CorpusItem]]
+    ) -> SearchResult:
+        """Build the search result of a query from the found corpus items.
+
+        Args:
+            query (str): The query that was searched for.
+            hits (List[Tuple[float, CorpusItem]]): The score and item of every found
+                chunk, by rank.
+
+        Returns:
+            SearchResult: The search result.
+        """
+        result: SearchResult = SearchResult(query=query)
+        for i, (score, item) in enumerate(hits):
+            result.matches.append(
+                MatchedChunk(
+                    chunk_id=item.chunk_id,
+                    section_id=item.section_id,
+                    chunk_text=item.text,
+                    rank=i + 1,
+                    score=float(score),
+                )
+            )
+        return result
+
+    def _resolve_parameters(self, stored: Optional[ANNParameters]) -> ANNParameters:
+        stored = stored or ANNParameters()
+        return ANNParameters(
+            annoy=self._annoy_parameters or stored.annoy,
+            hnsw=self._hnsw_parameters or stored.hnsw,
+        )
 
-        return all((self._storage_dir / file_name).exists() for file_name in file_names)
+    async def fingerprint(self) -> str:
+        """Get a fingerprint of the files of the index.
 
-    async def _save(self) -> None:
-        """Save the index and corpus to the storage directory."""
-        self._index_path.parent.mkdir(parents=True, exist_ok=True)
+        Returns:
+            str: The fingerprint.
+        """
+        return fingerprint_directory(directory=self._storage_dir)
 
-        # Save the index
-        self._index.save(str(self._index_path))
+    async def exists(self) -> bool:
+        """Check if the vector index exists.
 
-        # Save the corpus
-        async with aio_open(self._corpus_path, "w") as f:
-            for item in self._corpus:
-                line = item.model_dump_json()
-                await f.write(line + "\n")
+        Returns:
+            bool: True if the index exists, False otherwise.
+        """
+        data_dir = current_version_dir(storage_dir=self._storage_dir)
+        return self._create_flat(storage_dir=data_dir).corpus_exists() and (
+            is_vector_index(storage_dir=self._storage_dir)
+        )
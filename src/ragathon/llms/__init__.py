@@ -1 +1 @@
-from ragathon.llms.common import LLM, ChatMessage, MessageRole  # noqa
+from ragathon.llms.common import LLM, ChatMessage, MessageRole, TokenUsage  # noqa
@@ -1,4 +1,7 @@
+import asyncio
+import base64
 from datetime import datetime
+from pathlib import Path
 from typing import AsyncGenerator, List, Optional, Sequence, Type, TypeVar, cast
 
 import instructor
@@ -11,9 +14,18 @@ from openai import AsyncAzureOpenAI, AsyncStream
 from openai.lib.azure import AsyncAzureADTokenProvider
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from openai.types.create_embedding_response import CreateEmbeddingResponse
+from openai.types.embedding import Embedding
 
 from ragathon.config import Settings
-from ragathon.llms.common import LLM, ChatMessage, Embedder
+from ragathon.llms.batching import MicroBatchingEmbedder
+from ragathon.llms.cache import CachedEmbedder
+from ragathon.llms.common import (
+    LLM,
+    ChatMessage,
+    Embedder,
+    TokenUsage,
+    split_into_batches,
+)
 
 T = TypeVar("T")
 
@@ -109,7 +121,10 @@ class AzureOpenAIBasedLLM(LLM):
         )
 
     async def chat_stream(  # pyre-fixme[15]
-        self, messages: Sequence[ChatMessage], temperature: Optional[float] = None
+        self,
+        messages: Sequence[ChatMessage],
+        temperature: Optional[float] = None,
+        usage: Optional[TokenUsage] = None,
     ) -> AsyncGenerator[str, None]:
         transformed_messages = [
             {"role": msg.role.value, "content": msg.content} for msg in messages
@@ -128,9 +143,14 @@ class AzureOpenAIBasedLLM(LLM):
             messages=transformed_messages,
             temperature=current_temperature,
             stream=True,
+            # The last chunk then holds the token counts, and no choices
+            stream_options={"include_usage": True},
         )
 
         async for chunk in chunk_stream:
+            if chunk.usage is not None and usage is not None:
+                usage.prompt_tokens = chunk.usage.prompt_tokens
+                usage.completion_tokens = chunk.usage.completion_tokens
             chunk_text = await self._get_chunk_text_from_openai_api(chunk=chunk)
             if chunk_text is not None:
                 yield chunk_text
@@ -204,6 +224,37 @@ class AzureOpenAIBasedLLM(LLM):
         return None
 
 
+def decode_embeddings(data: Sequence[Embedding]) -> NDArray[np.float32]:
+    """Decode the embeddings of an embeddings response into one matrix.
+
+    Args:
+        data (Sequence[Embedding]): The embeddings of the response, requested with
+            `encoding_format="base64"`. Embeddings sent as lists of floats are
+            accepted too.
+
+    Returns:
+        NDArray[np.float32]: The embeddings, one per row, ordered by their index in
+            the request.
+    """
+    rows: List[NDArray[np.float32]] = []
+    for embedding in data:
+        value = cast(object, embedding.embedding)
+        if isinstance(value, str):
+            rows.append(np.frombuffer(base64.b64decode(value), dtype=np.float32))
+        else:
+            rows.append(np.asarray(value, dtype=np.float32))
+
+    if len(rows) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    matrix = np.empty((len(rows), len(rows[0])), dtype=np.float32)
+    # The API may return the embeddings out of order
+    for embedding, row in zip(data, rows):
+        matrix[embedding.index] = row
+
+    return matrix
+
+
 class AzureOpenAIBasedEmbedder(Embedder):
     """An Embedder that uses Azure OpenAI."""
 
@@ -215,7 +266,27 @@ class AzureOpenAIBasedEmbedder(Embedder):
         deployment_id: str,
         model_name: str,
         embedding_size: int,
+        max_batch_size: int = 2048,
+        max_batch_tokens: int = 250_000,
+        max_concurrency: int = 8,
     ) -> None:
+        """Initialize the embedder.
+
+        Args:
+            api_base_endpoint (str): The Azure OpenAI endpoint.
+            api_version (str): The Azure OpenAI API version.
+            token_generator (AsyncAzureADTokenProvider): The provider of access
+                tokens.
+            deployment_id (str): The deployment of the embedding model.
+            model_name (str): The name of the embedding model.
+            embedding_size (int): The number of dimensions of the embeddings.
+            max_batch_size (int, optional): The maximum number of texts per request.
+                Defaults to 2048, the limit of the API.
+            max_batch_tokens (int, optional): The maximum estimated number of tokens
+                per request. Defaults to 250000, below the limit of the API.
+            max_concurrency (int, optional): The maximum number of requests in
+                flight. Defaults to 8.
+        """
         self._model_name = model_name
         self._client = AsyncAzureOpenAI(
             azure_deployment=deployment_id,
@@ -224,20 +295,73 @@ class AzureOpenAIBasedEmbedder(Embedder):
             azure_ad_token_provider=token_generator,
         )
         self._embedding_size = embedding_size
+        self._max_batch_size = max_batch_size
+        self._max_batch_tokens = max_batch_tokens
+        self._semaphore = asyncio.Semaphore(max_concurrency)
 
     async def embed(self, texts: List[str]) -> List[NDArray[np.float32]]:
-        model_result: CreateEmbeddingResponse = await self._client.embeddings.create(
-            model=self._model_name, input=texts, dimensions=self._embedding_size
+        """Computes the embeddings of the given texts.
+
+        The texts are split into batches that respect the request limits of the API,
+        and the batches are embedded concurrently.
+
+        Args:
+            texts: A list of texts to embed.
+
+        Returns:
+            A list of embeddings, in the same order as `texts`.
+        """
+        return list(await self.embed_matrix(texts=texts))
+
+    async def embed_matrix(self, texts: List[str]) -> NDArray[np.float32]:
+        """Computes the embeddings of the given texts as one contiguous matrix.
+
+        Args:
+            texts: A list of texts to embed.
+
+        Returns:
+            The embeddings, one per row, in the same order as `texts`.
+        """
+        if len(texts) == 0:
+            return np.zeros((0, self._embedding_size), dtype=np.float32)
+
+        batches = split_into_batches(
+            texts=texts,
+            max_items=self._max_batch_size,
+            max_tokens=self._max_batch_tokens,
         )
+        if len(batches) > 1:
+            logger.debug(f"Embedding {len(texts)} texts in {len(batches)} batches")
 
-        return [
-            np.array(embedding.embedding, dtype=np.float32)
-            for embedding in model_result.data
-        ]
+        # gather keeps the order of the batches
+        batch_embeddings: List[NDArray[np.float32]] = await asyncio.gather(
+            *[self._embed_batch(texts=batch) for batch in batches]
+        )
+        if len(batch_embeddings) == 1:
+            return batch_embeddings[0]
+
+        return np.concatenate(batch_embeddings)
+
+    async def _embed_batch(self, texts: List[str]) -> NDArray[np.float32]:
+        async with self._semaphore:
+            # Raw float32 bytes are far cheaper to decode than JSON floats
+            model_result: CreateEmbeddingResponse = (
+                await self._client.embeddings.create(
+                    model=self._model_name,
+                    input=texts,
+                    dimensions=self._embedding_size,
+                    encoding_format="base64",
+                )
+            )
+
+        return decode_embeddings(data=model_result.data)
 
     def get_embedding_size(self) -> int:
         return self._embedding_size
 
+    def get_model_name(self) -> str:
+        return self._model_name
+
 
 def create_token_generator(
     settings: Settings,
@@ -273,7 +397,24 @@ def instantiate_llm_for_rag(settings: Settings) -> LLM:
     return llm_rag
 
 
-def instantiate_embedder(settings: Settings) -> Embedder:
+def instantiate_embedder(
+    settings: Settings,
+    cache_path: Optional[Path] = None,
+    micro_batching: bool = False,
+) -> Embedder:
+    """Instantiate the embedder used for the chunks and the queries.
+
+    Args:
+        settings (Settings): The application settings.
+        cache_path (Optional[Path], optional): The path of an SQLite database where
+            embeddings are stored, so that each text is only embedded once. Defaults
+            to None, which uses `EMBEDDING_CACHE_PATH` if it is set.
+        micro_batching (bool, optional): Whether to coalesce concurrent requests,
+            e.g. of concurrent searches, into batched requests. Defaults to False.
+
+    Returns:
+        Embedder: The embedder.
+    """
     token_generator = create_token_generator(settings=settings)
 
     embedder = AzureOpenAIBasedEmbedder(
@@ -285,4 +426,12 @@ def instantiate_embedder(settings: Settings) -> Embedder:
         embedding_size=3072,  # TODO: Make this configurable?
     )
 
+    if micro_batching:
+        embedder = MicroBatchingEmbedder(embedder=embedder)
+
+    if cache_path is None and settings.EMBEDDING_CACHE_PATH:
+        cache_path = Path(settings.EMBEDDING_CACHE_PATH)
+    if cache_path is not None:
+        return CachedEmbedder(embedder=embedder, database_path=cache_path)
+
     return embedder
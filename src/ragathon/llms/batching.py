@@ -0,0 +1,131 @@
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from loguru import logger
+from numpy.typing import NDArray
+
+from ragathon.llms.common import Embedder
+
+
+class MicroBatchingEmbedder(Embedder):
+    """An Embedder that coalesces concurrent requests into batched requests.
+
+    Requests are collected until `max_batch_size` texts are waiting, or until
+    `max_wait` seconds have passed since the first one arrived. The texts are then
+    embedded with a single request to the wrapped embedder, and every caller gets
+    the embeddings of its own texts back. Under concurrent load, e.g. many searches
+    embedding one query each, this turns many small HTTP requests into a few large
+    ones.
+    """
+
+    def __init__(
+        self, embedder: Embedder, max_batch_size: int = 64, max_wait: float = 0.005
+    ) -> None:
+        """Initialize the micro-batching embedder.
+
+        Args:
+            embedder (Embedder): The embedder that embeds the batches.
+            max_batch_size (int, optional): The number of waiting texts that triggers
+                a batch. Larger requests are passed through as they are. Defaults to
+                64.
+            max_wait (float, optional): The maximum number of seconds a request waits
+                for others to join its batch. Defaults to 0.005.
+        """
+        self._embedder = embedder
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_count = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Keep references to the running batches, so they are not garbage collected
+        self._batches: Set[asyncio.Task] = set()
+
+    async def embed(self, texts: List[str]) -> List[NDArray[np.float32]]:
+        """Computes the embeddings of the given texts, batched with other requests.
+
+        Args:
+            texts: A list of texts to embed.
+
+        Returns:
+            A list of embeddings.
+        """
+        return list(await self.embed_matrix(texts=texts))
+
+    async def embed_matrix(self, texts: List[str]) -> NDArray[np.float32]:
+        """Computes the embeddings of the given texts, batched with other requests.
+
+        Args:
+            texts: A list of texts to embed.
+
+        Returns:
+            The embeddings, one per row.
+        """
+        if len(texts) == 0:
+            return np.zeros((0, self.get_embedding_size()), dtype=np.float32)
+        if len(texts) >= self._max_batch_size:
+            return await self._embedder.embed_matrix(texts=texts)
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_count += len(texts)
+
+        if self._pending_count >= self._max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_wait, self._flush)
+
+        return await future
+
+    def get_embedding_size(self) -> int:
+        """The size of the embeddings produced by this embedder."""
+        return self._embedder.get_embedding_size()
+
+    def get_model_name(self) -> str:
+        """The name of the model producing the embeddings."""
+        return self._embedder.get_model_name()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        requests = self._pending
+        self._pending = []
+        self._pending_count = 0
+
+        task = asyncio.create_task(self._embed_batch(requests=requests))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _embed_batch(
+        self, requests: List[Tuple[List[str], asyncio.Future]]
+    ) -> None:
+        # Skip the requests of callers that stopped waiting
+        requests = [(texts, future) for texts, future in requests if not future.done()]
+        if len(requests) == 0:
+            return
+
+        # Concurrent searches often embed the same query, so embed every text once
+        positions: Dict[str, int] = {}
+        for texts, _ in requests:
+            for text in texts:
+                positions.setdefault(text, len(positions))
+
+        logger.debug(
+            f"Embedding {len(positions)} texts of {len(requests)} requests in one batch"
+        )
+
+        try:
+            embeddings = await self._embedder.embed_matrix(texts=list(positions))
+        except Exception as e:
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for texts, future in requests:
+            if not future.done():
+                future.set_result(embeddings[[positions[text] for text in texts]])
@@ -0,0 +1,217 @@
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from loguru import logger
+from numpy.typing import NDArray
+
+from ragathon.llms.common import Embedder
+from ragathon.utils.sqlite import SqliteDatabase, select_many
+
+
+def embedding_key(model_name: str, dimensions: int, text: str) -> str:
+    """Compute the content address of the embedding of a text.
+
+    Args:
+        model_name (str): The name of the embedding model.
+        dimensions (int): The number of dimensions of the embedding.
+        text (str): The embedded text.
+
+    Returns:
+        str: The key, as a hexadecimal SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    for part in [model_name, str(dimensions), text]:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """A persistent, content-addressed store of embeddings in an SQLite database."""
+
+    def __init__(self, database_path: Path) -> None:
+        """Initialize the store.
+
+        Args:
+            database_path (Path): The path of the SQLite database. It is created if it
+                does not exist.
+        """
+        self._database = SqliteDatabase(
+            database_path=database_path,
+            schema="CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL)",
+        )
+
+    async def get_many(self, keys: List[str]) -> Dict[str, NDArray[np.float32]]:
+        """Get the stored embeddings with the given keys.
+
+        Args:
+            keys (List[str]): The keys of the embeddings.
+
+        Returns:
+            Dict[str, NDArray[np.float32]]: The embeddings that were found, by key.
+        """
+        if len(keys) == 0:
+            return {}
+        return await self._database.run(self._get_many, keys)
+
+    async def put_many(self, embeddings: Dict[str, NDArray[np.float32]]) -> None:
+        """Store embeddings.
+
+        Args:
+            embeddings (Dict[str, NDArray[np.float32]]): The embeddings, by key.
+        """
+        if len(embeddings) == 0:
+            return
+        await self._database.run(self._put_many, embeddings)
+
+    async def close(self) -> None:
+        """Close the database connection."""
+        await self._database.close()
+
+    @staticmethod
+    def _get_many(
+        connection: sqlite3.Connection, keys: List[str]
+    ) -> Dict[str, NDArray[np.float32]]:
+        rows = select_many(
+            connection=connection,
+            query="SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})",
+            keys=keys,
+        )
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+    @staticmethod
+    def _put_many(
+        connection: sqlite3.Connection, embeddings: Dict[str, NDArray[np.float32]]
+    ) -> None:
+        connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+            [
+                (key, np.asarray(embedding, dtype=np.float32).tobytes())
+                for key, embedding in embeddings.items()
+            ],
+        )
+        connection.commit()
+
+
+class CachedEmbedder(Embedder):
+    """An Embedder that only sends the texts it has not embedded before.
+
+    Embeddings are stored by a hash of the model name, the number of dimensions and
+    the text, so rebuilding an index after a few chunks have changed only embeds the
+    changed chunks.
+    """
+
+    def __init__(self, embedder: Embedder, database_path: Path) -> None:
+        """Initialize the cached embedder.
+
+        Args:
+            embedder (Embedder): The embedder used for the texts that are not stored.
+            database_path (Path): The path of the SQLite database of the embeddings.
+        """
+        self._embedder = embedder
+        self._store = EmbeddingStore(database_path=database_path)
+
+    async def embed(self, texts: List[str]) -> List[NDArray[np.float32]]:
+        """Computes the embeddings of the given texts, reusing stored embeddings.
+
+        Args:
+            texts: A list of texts to embed.
+
+        Returns:
+            A list of embeddings.
+        """
+        return list(await self.embed_matrix(texts=texts))
+
+    async def embed_matrix(self, texts: List[str]) -> NDArray[np.float32]:
+        """Computes the embeddings as one matrix, reusing stored embeddings.
+
+        Args:
+            texts: A list of texts to embed.
+
+        Returns:
+            The embeddings, one per row.
+        """
+        model_name = self._embedder.get_model_name()
+        dimensions = self._embedder.get_embedding_size()
+        keys = [
+            embedding_key(model_name=model_name, dimensions=dimensions, text=text)
+            for text in texts
+        ]
+
+        embeddings = await self._store.get_many(keys=list(set(keys)))
+
+        # Embed every missing text once, even if it occurs several times
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in embeddings:
+                missing[key] = text
+
+        logger.debug(
+            f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses"
+        )
+
+        if len(missing) > 0:
+            new_embeddings = await self._embedder.embed_matrix(
+                texts=list(missing.values())
+            )
+            computed = dict(zip(missing.keys(), new_embeddings))
+            await self._store.put_many(embeddings=computed)
+            embeddings.update(computed)
+
+        matrix = np.empty((len(keys), dimensions), dtype=np.float32)
+        for row, key in enumerate(keys):
+            matrix[row] = embeddings[key]
+
+        return matrix
+
+    async def precompute(self, texts: List[str], batch_size: int = 1000) -> int:
+        """Embed and store the given texts up front, e.g. a set of evaluation questions.
+
+        Texts that are already stored are skipped, so running this again is cheap.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            batch_size (int, optional): The number of texts embedded and stored at
+                once. Defaults to 1000.
+
+        Returns:
+            int: The number of texts that had to be embedded.
+        """
+        model_name = self._embedder.get_model_name()
+        dimensions = self._embedder.get_embedding_size()
+        keyed_texts = {
+            embedding_key(model_name=model_name, dimensions=dimensions, text=text): text
+            for text in texts
+        }
+
+        stored = await self._store.get_many(keys=list(keyed_texts))
+        missing = {
+            key: text for key, text in keyed_texts.items() if key not in stored
+        }
+        logger.info(f"Precomputing {len(missing)} of {len(keyed_texts)} embeddings")
+
+        keys = list(missing)
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start : start + batch_size]
+            embeddings = await self._embedder.embed_matrix(
+                texts=[missing[key] for key in batch]
+            )
+            await self._store.put_many(embeddings=dict(zip(batch, embeddings)))
+
+        return len(missing)
+
+    def get_embedding_size(self) -> int:
+        """The size of the embeddings produced by this embedder."""
+        return self._embedder.get_embedding_size()
+
+    def get_model_name(self) -> str:
+        """The name of the model producing the embeddings."""
+        return self._embedder.get_model_name()
+
+    async def close(self) -> None:
+        """Close the embedding store."""
+        await self._store.close()
@@ -32,6 +32,20 @@ class ChatMessage(BaseModel):
     )
 
 
+class TokenUsage(BaseModel):
+    """The number of tokens of a chat completion, as counted by the LLM."""
+
+    prompt_tokens: Optional[int] = Field(
+        default=None,
+        description="The number of tokens in the prompt.",
+    )
+
+    completion_tokens: Optional[int] = Field(
+        default=None,
+        description="The number of tokens in the completion.",
+    )
+
+
 class LLM(ABC):
     """Represents an interface to a Large Language Model (LLM)."""
 
@@ -40,12 +54,15 @@ class LLM(ABC):
         self,
         messages: Sequence[ChatMessage],
         temperature: Optional[float] = None,
+        usage: Optional[TokenUsage] = None,
     ) -> AsyncGenerator[str, None]:
         """Sends a sequences of messages to the LLM and yields text fragment generator.
 
         Args:
             messages: A sequence of chat messages.
             temperature: The temperature to use when generating the response. Defaults to None.
+            usage: Filled in with the token counts reported by the LLM when the stream
+                ends. The counts stay None if the LLM reports none. Defaults to None.
 
         Yields:
             A generator of text fragments returned by the LLM.
@@ -105,3 +122,82 @@ class Embedder(ABC):
     def get_embedding_size(self) -> int:
         """The size of the embeddings produced by this embedder."""
         raise NotImplementedError
+
+    async def embed_matrix(self, texts: List[str]) -> NDArray[np.float32]:
+        """Computes the embeddings of the given texts as one contiguous matrix.
+
+        Embedders that receive the embeddings of a batch at once should override
+        this to avoid stacking the rows.
+
+        Args:
+            texts: A list of texts to embed.
+
+        Returns:
+            The embeddings, one per row.
+        """
+        if len(texts) == 0:
+            return np.zeros((0, self.get_embedding_size()), dtype=np.float32)
+        return np.ascontiguousarray(
+            np.vstack(await self.embed(texts=texts)), dtype=np.float32
+        )
+
+    def get_model_name(self) -> str:
+        """The name of the model producing the embeddings.
+
+        Embeddings of different models must not be mixed, e.g. in a cache, so
+        embedders should return the name of their model.
+        """
+        return type(self).__name__
+
+
+def estimate_token_count(text: str) -> int:
+    """Estimate the number of tokens of a text without a tokenizer.
+
+    OpenAI tokenizers produce about one token per four characters of English text.
+    Danish words are split into more tokens, so this errs on the high side by
+    counting three characters per token.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return len(text) // 3 + 1
+
+
+def split_into_batches(
+    texts: Sequence[str], max_items: int, max_tokens: int
+) -> List[List[str]]:
+    """Split texts into consecutive batches that respect request limits.
+
+    A batch holds at most `max_items` texts with at most `max_tokens` estimated
+    tokens in total. A single text that exceeds `max_tokens` gets a batch of its own.
+
+    Args:
+        texts (Sequence[str]): The texts to split.
+        max_items (int): The maximum number of texts in a batch.
+        max_tokens (int): The maximum estimated number of tokens in a batch.
+
+    Returns:
+        List[List[str]]: The batches, which concatenated are `texts`.
+    """
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    batch_tokens = 0
+
+    for text in texts:
+        tokens = estimate_token_count(text)
+        if len(batch) > 0 and (
+            len(batch) >= max_items or batch_tokens + tokens > max_tokens
+        ):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(text)
+        batch_tokens += tokens
+
+    if len(batch) > 0:
+        batches.append(batch)
+
+    return batches
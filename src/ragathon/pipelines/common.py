@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncGenerator, List, Optional, Union
 
 from pydantic import AwareDatetime, BaseModel, Field
 from ragathon.utils.date import utcnow
@@ -61,14 +61,29 @@ class GenerationMetrics(BaseModel):
     llm_name: str = Field(..., description="The name of the language model used ")
 
     input_token_count: int = Field(
-        ..., description="The number of tokens in the input question"
+        ...,
+        description="The number of tokens in the prompt, as counted by the LLM, or "
+        "estimated with `estimate_token_count()` if it reports none",
     )
     output_token_count: int = Field(
-        ..., description="The number of tokens in the generated answer"
+        ...,
+        description="The number of tokens in the generated answer, as counted by the "
+        "LLM, or estimated with `estimate_token_count()` if it reports none",
     )
     generation_time_ms: int = Field(
         ..., description="The time taken for generation in milliseconds"
     )
+    time_to_first_token_ms: Optional[int] = Field(
+        None,
+        description="The time until the first non-empty answer fragment arrived in "
+        "milliseconds, if the answer was streamed",
+    )
+    tokens_per_second: Optional[float] = Field(
+        None,
+        description="The number of answer tokens generated per second from the first "
+        "non-empty fragment on, if the answer was streamed. It is based on the output "
+        "token count",
+    )
 
 
 class RAGPipelineConfig(BaseModel):
@@ -130,6 +145,36 @@ class RAGPipelineOutput(BaseModel):
     )
 
 
+class RetrievalStreamEvent(BaseModel):
+    """The retrieved chunks of a streamed pipeline run, sent before the answer."""
+
+    retrieved_chunks: List[RetrievedChunk] = Field(
+        ..., description="List of retrieved text chunks with metadata"
+    )
+    retrieval_metrics: RetrievalMetrics = Field(
+        ..., description="Metrics related to the retrieval process"
+    )
+
+
+class AnswerFragmentStreamEvent(BaseModel):
+    """A fragment of the answer of a streamed pipeline run."""
+
+    text: str = Field(..., description="The next fragment of the generated answer")
+
+
+class CompletedStreamEvent(BaseModel):
+    """The last event of a streamed pipeline run, with the complete output."""
+
+    output: RAGPipelineOutput = Field(
+        ..., description="The output of the pipeline, including all metrics"
+    )
+
+
+RAGPipelineStreamEvent = Union[
+    RetrievalStreamEvent, AnswerFragmentStreamEvent, CompletedStreamEvent
+]
+
+
 class RAGPipeline(ABC):
     """The base class for a Retrieval Augmented Generation (RAG) pipeline."""
 
@@ -150,3 +195,28 @@ class RAGPipeline(ABC):
             The output of the pipeline.
         """
         raise NotImplementedError
+
+    async def run_stream(
+        self, query: str, max_retrieved_docs: int
+    ) -> AsyncGenerator[RAGPipelineStreamEvent, None]:
+        """Run the pipeline with the given query, and yield its results as they come.
+
+        The retrieved chunks are yielded first, followed by the fragments of the
+        answer as the LLM generates them, and finally the complete output. Pipelines
+        that can't stream yield the whole answer as one fragment after `run()`.
+
+        Args:
+            query: The input query for the pipeline.
+            max_retrieved_docs: The maximum number of documents to retrieve.
+
+        Yields:
+            A `RetrievalStreamEvent`, then `AnswerFragmentStreamEvent`s, and finally
+            a `CompletedStreamEvent`.
+        """
+        output = await self.run(query=query, max_retrieved_docs=max_retrieved_docs)
+        yield RetrievalStreamEvent(
+            retrieved_chunks=output.retrieved_chunks,
+            retrieval_metrics=output.retrieval_metrics,
+        )
+        yield AnswerFragmentStreamEvent(text=output.generated_answer)
+        yield CompletedStreamEvent(output=output)
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import anyio
+import numpy as np
+from aiofiles import open as aio_open
+from aiofiles.threadpool.binary import AsyncBufferedIOBase
+from loguru import logger
+
+from ragathon.pipelines.common import RAGPipelineOutput
+from ragathon.utils.strings import generate_id
+
+JOURNAL_INDEX_SUFFIX = ".idx"
+JOURNAL_INDEX_DTYPE = np.dtype(
+    [("query_id", "V16"), ("offset", "<i8"), ("length", "<i8")]
+)
+
+
+def get_query_id(query: str) -> str:
+    """Get the ID of a query, the same one `PipelineEvaluator` uses.
+
+    Args:
+        query (str): The query.
+
+    Returns:
+        str: The ID.
+    """
+    return generate_id(parts=[query])
+
+
+class RunJournal:
+    """A crash-safe, append-only log of the outputs of a pipeline run.
+
+    The outputs are appended to a JSON Lines file, which stays readable by tools
+    that read the whole run. Next to it, an index file holds one fixed-size record
+    per output with the query ID and the byte range of its line. Opening a journal
+    therefore only reads the index, checking whether a query has been answered is a
+    dictionary lookup, and a single output is read with one seek.
+
+    Writes are flushed to disk with `fsync` once every `sync_interval` outputs and
+    when the journal is closed. When opened, the journal recovers from a crash: index
+    records pointing past the end of the log are dropped, complete lines that were
+    not indexed yet are indexed, and an incomplete last line is removed. A JSON
+    Lines file without an index, e.g. of an older run, is indexed the same way.
+
+    A read-only journal, e.g. of a run that may still be in progress, is loaded the
+    same way, but neither file is changed and nothing can be appended.
+    """
+
+    def __init__(
+        self, log_path: Path, sync_interval: int = 64, read_only: bool = False
+    ) -> None:
+        """Initialize the journal.
+
+        Args:
+            log_path (Path): The JSON Lines file of the outputs. The index is stored
+                next to it, with the suffix `JOURNAL_INDEX_SUFFIX`.
+            sync_interval (int, optional): The number of appended outputs after which
+                the files are flushed to disk. Defaults to 64.
+            read_only (bool, optional): Whether to only read the journal, without
+                repairing or appending to it. Defaults to False.
+        """
+        self._log_path: Path = log_path
+        self._index_path: Path = log_path.with_suffix(JOURNAL_INDEX_SUFFIX)
+        self._sync_interval: int = sync_interval
+        self._read_only: bool = read_only
+
+        self._entries: Dict[str, Tuple[int, int]] = {}
+        self._log_size: int = 0
+        self._log_file: Optional[AsyncBufferedIOBase] = None
+        self._index_file: Optional[AsyncBufferedIOBase] = None
+        self._unsynced: int = 0
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, query_id: object) -> bool:
+        return query_id in self._entries
+
+    @property
+    def query_ids(self) -> List[str]:
+        """The IDs of the answered queries, in order of completion."""
+        return list(self._entries.keys())
+
+    async def open(self) -> None:
+        """Recover the journal from a previous run, and open it for appending.
+
+        A read-only journal is only loaded.
+        """
+        if self._read_only:
+            await anyio.to_thread.run_sync(self._recover, False)
+            return
+
+        self._log_path.parent.mkdir(parents=True, exist_ok=True)
+        await anyio.to_thread.run_sync(self._recover, True)
+
+        self._log_file = await aio_open(self._log_path, mode="ab")
+        self._index_file = await aio_open(self._index_path, mode="ab")
+
+    async def append(self, output: RAGPipelineOutput) -> None:
+        """Append the output of a query.
+
+        Args:
+            output (RAGPipelineOutput): The output.
+        """
+        if self._read_only:
+            raise ValueError(f"The run journal {self._log_path} is read-only")
+        if self._log_file is None or self._index_file is None:
+            raise ValueError("The run journal is not open. Please open it first")
+
+        query_id = get_query_id(query=output.query_info.original_query)
+        line = (output.model_dump_json() + "\n").encode("utf-8")
+
+        async with self._lock:
+            offset = self._log_size
+            await self._log_file.write(line)
+            await self._index_file.write(
+                self._encode_entry(query_id=query_id, offset=offset, length=len(line))
+            )
+            self._log_size += len(line)
+            self._entries[query_id] = (offset, len(line))
+
+            self._unsynced += 1
+            if self._unsynced >= self._sync_interval:
+                await self._sync()
+
+    async def read(self, query_id: str) -> Optional[RAGPipelineOutput]:
+        """Read the output of a query without reading the rest of the run.
+
+        Args:
+            query_id (str): The ID of the query, see `get_query_id()`.
+
+        Returns:
+            Optional[RAGPipelineOutput]: The output, or None if the query has not
+                been answered.
+        """
+        entry = self._entries.get(query_id)
+        if entry is None:
+            return None
+
+        if self._log_file is not None:
+            # Make appended outputs visible to the reader below
+            async with self._lock:
+                await self._log_file.flush()
+
+        offset, length = entry
+        async with aio_open(self._log_path, mode="rb") as f:
+            await f.seek(offset)
+            return RAGPipelineOutput.model_validate_json(json_data=await f.read(length))
+
+    async def close(self) -> None:
+        """Flush the journal to disk and close it."""
+        async with self._lock:
+            if self._log_file is None or self._index_file is None:
+                return
+            await self._sync()
+            await self._log_file.close()
+            await self._index_file.close()
+            self._log_file = None
+            self._index_file = None
+
+    async def _sync(self) -> None:
+        assert self._log_file is not None and self._index_file is not None
+        # The log goes first, so that the index never points at unwritten lines
+        for f in [self._log_file, self._index_file]:
+            await f.flush()
+            await anyio.to_thread.run_sync(os.fsync, f.fileno())
+        self._unsynced = 0
+
+    def _recover(self, repair: bool) -> None:
+        """Load the index, and repair both files after a crash.
+
+        Args:
+            repair (bool): Whether to repair the files. If not, the complete lines
+                that were not indexed yet are only indexed in memory.
+        """
+        self._entries = {}
+        self._log_size = (
+            self._log_path.stat().st_size if self._log_path.exists() else 0
+        )
+
+        # Keep the index records of complete lines. They are written in order, so
+        # the valid records form a prefix of the index.
+        entries = np.zeros(0, dtype=JOURNAL_INDEX_DTYPE)
+        if self._index_path.exists():
+            data = self._index_path.read_bytes()
+            usable = len(data) - len(data) % JOURNAL_INDEX_DTYPE.itemsize
+            entries = np.frombuffer(data[:usable], dtype=JOURNAL_INDEX_DTYPE)
+            valid = entries["offset"] + entries["length"] <= self._log_size
+            n_valid = len(entries) if valid.all() else int(np.argmin(valid))
+            entries = entries[:n_valid]
+            if repair and n_valid * JOURNAL_INDEX_DTYPE.itemsize < len(data):
+                logger.warning(f"Dropping incomplete records from {self._index_path}")
+                os.truncate(self._index_path, n_valid * JOURNAL_INDEX_DTYPE.itemsize)
+
+        for entry in entries:
+            self._entries[str(uuid.UUID(bytes=entry["query_id"].tobytes()))] = (
+                int(entry["offset"]),
+                int(entry["length"]),
+            )
+        indexed_size = (
+            int(entries["offset"][-1] + entries["length"][-1]) if len(entries) else 0
+        )
+
+        if indexed_size == self._log_size:
+            return
+
+        # Index the lines written after the last index record
+        new_records: List[bytes] = []
+        offset = indexed_size
+        with open(self._log_path, mode="rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                query = json.loads(line)["query_info"]["original_query"]
+                query_id = get_query_id(query=query)
+                new_records.append(
+                    self._encode_entry(query_id=query_id, offset=offset, length=len(line))
+                )
+                self._entries[query_id] = (offset, len(line))
+                offset += len(line)
+
+        if not repair:
+            return
+
+        if len(new_records) > 0:
+            logger.info(f"Indexing {len(new_records)} outputs of {self._log_path}")
+            with open(self._index_path, mode="ab") as f:
+                f.write(b"".join(new_records))
+
+        if offset < self._log_size:
+            logger.warning(f"Removing an incomplete line from {self._log_path}")
+            os.truncate(self._log_path, offset)
+            self._log_size = offset
+
+    @staticmethod
+    def _encode_entry(query_id: str, offset: int, length: int) -> bytes:
+        entry = np.array(
+            [(uuid.UUID(query_id).bytes, offset, length)], dtype=JOURNAL_INDEX_DTYPE
+        )
+        return entry.tobytes()
@@ -0,0 +1,126 @@
+import asyncio
+from pathlib import Path
+from typing import List, Set
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from ragathon.pipelines.common import RAGPipeline
+from ragathon.pipelines.journal import RunJournal, get_query_id
+
+
+class BatchRunSummary(BaseModel):
+    """Counts of the queries of a batch run."""
+
+    completed: int = Field(default=0, description="Number of queries answered now.")
+    """Number of queries answered now."""
+
+    skipped: int = Field(
+        default=0, description="Number of queries answered by a previous run."
+    )
+    """Number of queries answered by a previous run."""
+
+    failed: int = Field(default=0, description="Number of queries that failed.")
+    """Number of queries that failed."""
+
+
+class PipelineBatchRunner:
+    """Runs a `RAGPipeline` for many queries concurrently, and appends the results.
+
+    Up to `max_concurrency` queries run at the same time. The output of every query
+    is appended to a `RunJournal` as soon as it is complete, so the cost of writing
+    a result does not depend on the number of results before it. Queries whose
+    output is already in the journal are skipped, so an interrupted run resumes
+    where it stopped. Failed queries are logged and left out of the journal, so they
+    are retried by the next run.
+    """
+
+    def __init__(
+        self,
+        pipeline: RAGPipeline,
+        output_path: Path,
+        max_concurrency: int = 8,
+        max_retrieved_docs: int = 5,
+        sync_interval: int = 64,
+    ) -> None:
+        """Initialize the runner.
+
+        Args:
+            pipeline (RAGPipeline): The pipeline to run. It must have been built or
+                loaded.
+            output_path (Path): The JSON Lines file the outputs are appended to.
+            max_concurrency (int, optional): The maximum number of queries that run
+                at the same time. Defaults to 8.
+            max_retrieved_docs (int, optional): The maximum number of documents to
+                retrieve per query. Defaults to 5.
+            sync_interval (int, optional): The number of outputs after which the
+                journal is flushed to disk. Defaults to 64.
+        """
+        self._pipeline: RAGPipeline = pipeline
+        self._output_path: Path = output_path
+        self._max_concurrency: int = max_concurrency
+        self._max_retrieved_docs: int = max_retrieved_docs
+        self._sync_interval: int = sync_interval
+
+    async def run(self, queries: List[str]) -> BatchRunSummary:
+        """Run the pipeline for all queries that have not been answered yet.
+
+        Args:
+            queries (List[str]): The queries to run.
+
+        Returns:
+            BatchRunSummary: The number of completed, skipped and failed queries.
+        """
+        journal = RunJournal(
+            log_path=self._output_path, sync_interval=self._sync_interval
+        )
+        await journal.open()
+        try:
+            return await self._run(queries=queries, journal=journal)
+        finally:
+            await journal.close()
+
+    async def _run(self, queries: List[str], journal: RunJournal) -> BatchRunSummary:
+        summary = BatchRunSummary()
+
+        pending: List[str] = []
+        pending_ids: Set[str] = set()
+        for query in queries:
+            query_id = get_query_id(query=query)
+            if query_id in journal:
+                summary.skipped += 1
+            elif query_id not in pending_ids:
+                # Run duplicate queries once
+                pending_ids.add(query_id)
+                pending.append(query)
+
+        logger.info(
+            f"Running {len(pending)} queries, {summary.skipped} were already answered"
+        )
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def run_query(query: str) -> None:
+            async with semaphore:
+                try:
+                    output = await self._pipeline.run(
+                        query=query, max_retrieved_docs=self._max_retrieved_docs
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to run query {query!r}: {e}")
+                    summary.failed += 1
+                    return
+
+            await journal.append(output=output)
+            summary.completed += 1
+
+            if summary.completed % 100 == 0:
+                logger.info(f"Completed {summary.completed}/{len(pending)} queries")
+
+        await asyncio.gather(*[run_query(query=query) for query in pending])
+
+        logger.info(
+            f"Completed {summary.completed} queries, {summary.failed} failed, "
+            f"{summary.skipped} skipped"
+        )
+        return summary
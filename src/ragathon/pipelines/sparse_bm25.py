@@ -1,6 +1,7 @@
 import asyncio
+from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import AsyncGenerator, List, Optional
 
 from aiofiles import open as aio_open
 from aiofiles.os import makedirs as aio_makedirs
@@ -18,16 +19,26 @@ from ragathon.data.models import (
 from ragathon.indexing.bm25 import BM25Index
 from ragathon.llms import LLM
 from ragathon.llms.azure import instantiate_llm_for_rag
-from ragathon.llms.common import ChatMessage, MessageRole
+from ragathon.llms.common import (
+    ChatMessage,
+    MessageRole,
+    TokenUsage,
+    estimate_token_count,
+)
 from ragathon.pipelines.common import (
+    AnswerFragmentStreamEvent,
+    CompletedStreamEvent,
     GenerationMetrics,
     QueryInfo,
     RAGPipeline,
     RAGPipelineConfig,
     RAGPipelineOutput,
+    RAGPipelineStreamEvent,
     RetrievalMetrics,
+    RetrievalStreamEvent,
     RetrievedChunk,
 )
+from ragathon.pipelines.runner import PipelineBatchRunner
 from ragathon.utils.date import utcnow
 
 
@@ -49,7 +60,10 @@ class NaiveChunkingBM25Pipeline(RAGPipeline):
         self._index_storage_dir = self._output_dir / "indices" / markdown_file_path.stem
         app_settings: Settings = init_settings()
 
-        self._index = BM25Index(storage_dir=self._index_storage_dir, language=language)
+        # Memory-map the index, so that worker processes share one copy of it
+        self._index = BM25Index(
+            storage_dir=self._index_storage_dir, language=language, mmap=True
+        )
 
         chunked_file_name = (
             f"{markdown_file_path.stem}-chunked-{self._config.chunking_method}.json"
@@ -72,7 +86,18 @@ class NaiveChunkingBM25Pipeline(RAGPipeline):
 
         await self._index.load()
 
-    async def run(self, query: str, max_retrieve_docs: int) -> RAGPipelineOutput:
+    async def run(self, query: str, max_retrieved_docs: int) -> RAGPipelineOutput:
+        async for event in self.run_stream(
+            query=query, max_retrieved_docs=max_retrieved_docs
+        ):
+            if isinstance(event, CompletedStreamEvent):
+                return event.output
+
+        raise RuntimeError("The pipeline stream ended without an output")
+
+    async def run_stream(
+        self, query: str, max_retrieved_docs: int
+    ) -> AsyncGenerator[RAGPipelineStreamEvent, None]:
         output = RAGPipelineOutput(
             config=self._config,
             query_info=QueryInfo(original_query=query),
@@ -80,7 +105,7 @@ class NaiveChunkingBM25Pipeline(RAGPipeline):
             generated_answer="",
             retrieval_metrics=RetrievalMetrics(
                 retrieval_method=self._config.retrieval_method,
-                max_retrieve_docs=max_retrieve_docs,
+                max_retrieve_docs=max_retrieved_docs,
                 total_chunks_retrieved=0,
                 retrieval_time_ms=0,
             ),
@@ -94,17 +119,22 @@ class NaiveChunkingBM25Pipeline(RAGPipeline):
             completed_at=None,
         )
 
-        # Run retrieval part
+        # Run retrieval part, and send its results before the answer is generated
         await self._run_retrieval_part(
-            query=query, max_retrieve_docs=max_retrieve_docs, output=output
+            query=query, max_retrieve_docs=max_retrieved_docs, output=output
+        )
+        yield RetrievalStreamEvent(
+            retrieved_chunks=output.retrieved_chunks,
+            retrieval_metrics=output.retrieval_metrics,
         )
 
         # Run generation part
-        await self._run_generation_part(query=query, output=output)
+        async for fragment in self._run_generation_part(query=query, output=output):
+            yield AnswerFragmentStreamEvent(text=fragment)
 
         output.completed_at = utcnow()
 
-        return output
+        yield CompletedStreamEvent(output=output)
 
     async def _run_retrieval_part(
         self, query: str, max_retrieve_docs: int, output: RAGPipelineOutput
@@ -134,29 +164,63 @@ class NaiveChunkingBM25Pipeline(RAGPipeline):
             for match in search_result.matches
         ]
 
-    async def _run_generation_part(self, query: str, output: RAGPipelineOutput) -> str:
+    async def _run_generation_part(
+        self, query: str, output: RAGPipelineOutput
+    ) -> AsyncGenerator[str, None]:
         if len(output.retrieved_chunks) == 0:
             raise ValueError("No retrieved chunks available for generation")
 
-        generation_start = utcnow()
-        output.generated_answer = await self._generate_answer(
+        messages = self._build_messages(
             query=query, retrieved_chunks=output.retrieved_chunks
         )
+        fragments: List[str] = []
+
+        generation_start = utcnow()
+        first_token_at: Optional[datetime] = None
+        usage = TokenUsage()
+        async for fragment in self._llm.chat_stream(messages=messages, usage=usage):
+            # The first chunk of a stream only holds the role, with empty content
+            if len(fragment) == 0:
+                continue
+            if first_token_at is None:
+                first_token_at = utcnow()
+            fragments.append(fragment)
+            yield fragment
         generation_end = utcnow()
 
+        output.generated_answer = "".join(fragments)
+
         # Update generation metrics
-        output.generation_metrics.input_token_count = 0
-        output.generation_metrics.output_token_count = 0
-        output.generation_metrics.generation_time_ms = int(
+        # Use the token counts of the LLM, and only estimate them if it sent none
+        metrics = output.generation_metrics
+        if usage.prompt_tokens is not None:
+            metrics.input_token_count = usage.prompt_tokens
+        else:
+            metrics.input_token_count = sum(
+                estimate_token_count(message.content) for message in messages
+            )
+        if usage.completion_tokens is not None:
+            metrics.output_token_count = usage.completion_tokens
+        else:
+            metrics.output_token_count = estimate_token_count(output.generated_answer)
+        metrics.generation_time_ms = int(
             (generation_end - generation_start).total_seconds() * 1000
         )
+        if first_token_at is not None:
+            metrics.time_to_first_token_ms = int(
+                (first_token_at - generation_start).total_seconds() * 1000
+            )
+            decoding_seconds = (generation_end - first_token_at).total_seconds()
+            if decoding_seconds > 0:
+                metrics.tokens_per_second = (
+                    metrics.output_token_count / decoding_seconds
+                )
 
-    async def _generate_answer(
+    def _build_messages(
         self, query: str, retrieved_chunks: List[RetrievedChunk]
-    ) -> str:
-        # Generate answer using LLM
+    ) -> List[ChatMessage]:
         context = "\n---\n".join([chunk.text for chunk in retrieved_chunks])
-        messages = [
+        return [
             ChatMessage(
                 role=MessageRole.SYSTEM,
                 content="You are a helpful assistant. Answer the question based on the provided context. You will answer questions about GPDR",
@@ -167,8 +231,6 @@ class NaiveChunkingBM25Pipeline(RAGPipeline):
             ),
         ]
 
-        return await self._llm.chat(messages=messages)
-
     async def _load_document(self) -> MarkdownDocument:
         async with aio_open(self._markdown_file_path, mode="r") as file:
             content = await file.read()
@@ -231,34 +293,13 @@ async def main():
         content = await file.read()
         q_set = SyntheticQuestionSet.model_validate_json(json_data=content)
 
-    pipeline_output_file = pipeline._output_dir / "result.jsonl"
-    pipeline_result: List[RAGPipelineOutput] = []
-
-    if pipeline_output_file.exists():
-        async with aio_open(pipeline_output_file, mode="r") as file:
-            async for line in file:
-                pipeline_result.append(
-                    RAGPipelineOutput.model_validate_json(json_data=line)
-                )
-
-    async def save_pipeline_result():
-        async with aio_open(pipeline_output_file, mode="w") as file:
-            for result in pipeline_result:
-                await file.write(result.model_dump_json() + "\n")
-
-    for question in q_set.questions:
-        if any(
-            [
-                result.query_info.original_query == question.question
-                for result in pipeline_result
-            ]
-        ):
-            logger.info(f"Skipping question: {question.question}")
-            continue
-
-        result = await pipeline.run(query=question.question, max_retrieve_docs=5)
-        pipeline_result.append(result)
-        await save_pipeline_result()
+    runner = PipelineBatchRunner(
+        pipeline=pipeline,
+        output_path=pipeline._output_dir / "result.jsonl",
+        max_concurrency=8,
+        max_retrieved_docs=5,
+    )
+    await runner.run(queries=[question.question for question in q_set.questions])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+import anyio
+
+T = TypeVar("T")
+
+# Stay below the maximum number of parameters of an SQLite statement
+SQLITE_BATCH_SIZE = 500
+
+
+class SqliteDatabase:
+    """An SQLite database shared between processes, used from worker threads.
+
+    The connection is opened on first use, in WAL mode so that readers in other
+    processes proceed while one process writes. Statements run one at a time in a
+    worker thread, so they do not block the event loop.
+    """
+
+    def __init__(self, database_path: Path, schema: str) -> None:
+        """Initialize the database.
+
+        Args:
+            database_path (Path): The path of the SQLite database. It is created if it
+                does not exist.
+            schema (str): The statement creating the tables, if they do not exist.
+        """
+        self._database_path: Path = database_path
+        self._schema: str = schema
+        self._lock: threading.Lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    async def run(self, function: Callable[..., T], *args: Any) -> T:
+        """Run a function with the connection in a worker thread.
+
+        Args:
+            function (Callable[..., T]): The function, called with the connection
+                followed by `args`.
+            *args (Any): The other arguments of the function.
+
+        Returns:
+            T: The result of the function.
+        """
+        return await anyio.to_thread.run_sync(self._run, function, *args)
+
+    async def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _run(self, function: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            return function(self._connect(), *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._database_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self._database_path, timeout=30.0, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(self._schema)
+            connection.commit()
+            self._connection = connection
+
+        return self._connection
+
+
+def select_many(
+    connection: sqlite3.Connection,
+    query: str,
+    keys: List[str],
+    parameters: Sequence[Any] = (),
+) -> List[Tuple[Any, ...]]:
+    """Select the rows with the given keys, in batches of `SQLITE_BATCH_SIZE` keys.
+
+    Args:
+        connection (sqlite3.Connection): The database connection.
+        query (str): The query, with a `{placeholders}` field in its `IN` clause.
+        keys (List[str]): The keys of the rows.
+        parameters (Sequence[Any], optional): The parameters of the query that follow
+            the keys. Defaults to none.
+
+    Returns:
+        List[Tuple[Any, ...]]: The selected rows.
+    """
+    rows: List[Tuple[Any, ...]] = []
+    for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+        batch = keys[start : start + SQLITE_BATCH_SIZE]
+        placeholders = ",".join("?" * len(batch))
+        rows += connection.execute(
+            query.format(placeholders=placeholders), [*batch, *parameters]
+        ).fetchall()
+
+    return rows
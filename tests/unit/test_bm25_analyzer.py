@@ -0,0 +1,76 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+from nltk.stem import SnowballStemmer
+from nltk.stem.api import StemmerI
+from ragathon.indexing.analyzer import STEM_TABLE_FILE_NAME, BM25Analyzer
+
+
+class CountingStemmer(StemmerI):
+    """Stems by truncating to six characters and records what it was asked to stem."""
+
+    def __init__(self) -> None:
+        self.stemmed: List[str] = []
+
+    def stem(self, token: str) -> str:
+        self.stemmed.append(token)
+        return token[:6]
+
+
+class TestBM25Analyzer:
+    @pytest.fixture
+    def stemmer(self) -> CountingStemmer:
+        return CountingStemmer()
+
+    @pytest.fixture
+    def analyzer(self, stemmer: CountingStemmer) -> BM25Analyzer:
+        return BM25Analyzer(stemmer=stemmer, stop_words=["og", "er", "en"])
+
+    def test_removes_stop_words_and_stems(self, analyzer: BM25Analyzer) -> None:
+        """Test that stop words are removed and the remaining terms are stemmed."""
+        result = analyzer.analyze("Behandling og opbevaring er en pligt")
+        assert result == ["behand", "opbeva", "pligt"]
+
+    def test_ignores_single_character_tokens(self, analyzer: BM25Analyzer) -> None:
+        """Test that the default bm25s token pattern is used."""
+        assert analyzer.analyze("a b persondata") == ["person"]
+
+    def test_learn_fills_the_stem_table(
+        self, analyzer: BM25Analyzer, stemmer: CountingStemmer
+    ) -> None:
+        """Test that learned terms are only stemmed once."""
+        analyzer.analyze_many(["persondata persondata", "persondata"], learn=True)
+        assert analyzer.stem_table == {"persondata": "person"}
+        assert stemmer.stemmed == ["persondata"]
+
+    def test_unseen_terms_do_not_grow_the_stem_table(
+        self, analyzer: BM25Analyzer, stemmer: CountingStemmer
+    ) -> None:
+        """Test that unseen terms are stemmed through the LRU cache."""
+        analyzer.analyze_many(["samtykke", "samtykke"])
+        assert analyzer.stem_table == {}
+        assert stemmer.stemmed == ["samtykke"]
+
+    @pytest.mark.anyio
+    async def test_save_and_load(
+        self, analyzer: BM25Analyzer, stemmer: CountingStemmer, tmp_path: Path
+    ) -> None:
+        """Test that the stem table survives a save and load."""
+        analyzer.analyze("persondata og samtykke", learn=True)
+        await analyzer.save(storage_dir=tmp_path)
+        assert (tmp_path / STEM_TABLE_FILE_NAME).exists()
+
+        loaded = BM25Analyzer(stemmer=stemmer, stop_words=["og"])
+        await loaded.load(storage_dir=tmp_path)
+        stemmer.stemmed.clear()
+
+        assert loaded.analyze("samtykke og persondata") == ["samtyk", "person"]
+        assert stemmer.stemmed == []
+
+    @pytest.mark.anyio
+    async def test_load_without_stem_table(self, tmp_path: Path) -> None:
+        """Test that loading from a directory without a stem table is a no-op."""
+        analyzer = BM25Analyzer(stemmer=SnowballStemmer("danish"), stop_words=[])
+        await analyzer.load(storage_dir=tmp_path)
+        assert analyzer.stem_table == {}
@@ -0,0 +1,160 @@
+from pathlib import Path
+from typing import Any, Dict, List
+
+import bm25s
+import pytest
+from nltk.stem.api import StemmerI
+from ragathon.data.models import ChunkedText, ChunkedTextSet, ChunkingMethod
+from ragathon.indexing.analyzer import BM25Analyzer
+from ragathon.indexing.bm25 import BM25Index
+from ragathon.indexing.delta import (
+    DELTA_FILE_NAME,
+    STATS_FILE_NAME,
+    TOMBSTONES_FILE_NAME,
+    BM25CollectionStats,
+    BM25DeltaSegment,
+)
+
+BASE_DOCS = [
+    ["persondata", "behandling", "samtykke"],
+    ["sletning", "persondata", "persondata"],
+    ["klage", "tilsyn"],
+    ["sikkerhed", "brud", "underretning", "persondata"],
+]
+
+
+class IdentityStemmer(StemmerI):
+    def stem(self, token: str) -> str:
+        return token
+
+
+def make_item(chunk_id: str, text: str) -> Dict[str, Any]:
+    return {"index": 0, "chunk_id": chunk_id, "section_id": "s", "text": text}
+
+
+class TestBM25DeltaSegment:
+    @pytest.fixture
+    def model(self) -> bm25s.BM25:
+        model = bm25s.BM25()
+        model.index(BASE_DOCS, show_progress=False)
+        return model
+
+    @pytest.fixture
+    def stats(self, model: bm25s.BM25) -> BM25CollectionStats:
+        doc_lens = [len(doc) for doc in BASE_DOCS]
+        return BM25CollectionStats(
+            num_docs=len(BASE_DOCS),
+            avg_doc_len=sum(doc_lens) / len(doc_lens),
+            k1=model.k1,
+            b=model.b,
+        )
+
+    def base_document_frequency(self, term: str) -> int:
+        return sum(1 for doc in BASE_DOCS if term in doc)
+
+    def test_scores_match_the_base_index(
+        self, model: bm25s.BM25, stats: BM25CollectionStats
+    ) -> None:
+        """Test that a delta document scores like the same document in the base."""
+        segment = BM25DeltaSegment()
+        segment.add(item=make_item("copy", "sletning persondata"), terms=BASE_DOCS[1])
+
+        query: List[str] = ["persondata", "sletning"]
+        hits = segment.score(
+            query_terms=query,
+            stats=stats,
+            base_document_frequency=self.base_document_frequency,
+        )
+
+        expected = model.get_scores(query)[1]
+        assert len(hits) == 1
+        assert hits[0][0] == pytest.approx(expected, rel=1e-5)
+
+    def test_hits_are_sorted_by_score(self, stats: BM25CollectionStats) -> None:
+        """Test that hits are sorted and non-matching documents are left out."""
+        segment = BM25DeltaSegment()
+        segment.add(item=make_item("a", ""), terms=["klage"])
+        segment.add(item=make_item("b", ""), terms=["klage", "klage", "tilsyn"])
+        segment.add(item=make_item("c", ""), terms=["brud"])
+
+        hits = segment.score(
+            query_terms=["klage", "tilsyn"],
+            stats=stats,
+            base_document_frequency=self.base_document_frequency,
+        )
+
+        assert [item["chunk_id"] for _, item in hits] == ["b", "a"]
+
+    def test_add_replaces_and_remove_deletes(self, stats: BM25CollectionStats) -> None:
+        """Test that items can be replaced and removed."""
+        segment = BM25DeltaSegment()
+        segment.add(item=make_item("a", "old"), terms=["klage"])
+        segment.add(item=make_item("a", "new"), terms=["brud"])
+
+        assert len(segment) == 1
+        assert segment.items[0]["text"] == "new"
+        assert (
+            segment.score(
+                query_terms=["klage"],
+                stats=stats,
+                base_document_frequency=self.base_document_frequency,
+            )
+            == []
+        )
+
+        assert segment.remove(chunk_id="a")
+        assert not segment.remove(chunk_id="a")
+        assert segment.is_empty
+
+    @pytest.mark.anyio
+    async def test_save_and_load(self, tmp_path: Path) -> None:
+        """Test that added items and tombstones survive a save and load."""
+        analyzer = BM25Analyzer(stemmer=IdentityStemmer(), stop_words=[])
+
+        segment = BM25DeltaSegment()
+        segment.add(item=make_item("a", "klage tilsyn"), terms=["klage", "tilsyn"])
+        segment.tombstone(chunk_id="deleted")
+        await segment.save(storage_dir=tmp_path)
+
+        loaded = BM25DeltaSegment()
+        await loaded.load(storage_dir=tmp_path, analyzer=analyzer)
+        assert loaded.items == segment.items
+        assert loaded.tombstones == {"deleted"}
+
+        loaded.clear()
+        await loaded.save(storage_dir=tmp_path)
+        assert not (tmp_path / DELTA_FILE_NAME).exists()
+        assert not (tmp_path / TOMBSTONES_FILE_NAME).exists()
+
+
+@pytest.mark.anyio
+async def test_index_without_stats_scores_added_chunks_the_same(
+    tmp_path: Path,
+) -> None:
+    """Test that the statistics of an older index are computed from its corpus."""
+    analyzer = BM25Analyzer(stemmer=IdentityStemmer(), stop_words=["og"])
+    data_set = ChunkedTextSet(
+        chunking_method=ChunkingMethod.NAIVE,
+        chunks=[
+            ChunkedText(section_id="s", text=" og ".join(doc)) for doc in BASE_DOCS
+        ],
+    )
+    new_chunk = ChunkedText(section_id="new", text="klage og tilsyn og klage")
+
+    scores: List[float] = []
+    for keep_stats in [True, False]:
+        storage_dir = tmp_path / str(keep_stats)
+        await BM25Index(
+            storage_dir=storage_dir, language="danish", analyzer=analyzer
+        ).create(data_set=data_set)
+        if not keep_stats:
+            (storage_dir / STATS_FILE_NAME).unlink()
+
+        index = BM25Index(storage_dir=storage_dir, language="danish", analyzer=analyzer)
+        await index.load()
+        await index.add(chunks=[new_chunk])
+        result = await index.search(query="klage", k=1)
+        assert result.matches[0].chunk_id == new_chunk.id
+        scores.append(result.matches[0].score)
+
+    assert scores[1] == pytest.approx(scores[0], rel=1e-6)
@@ -0,0 +1,72 @@
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+from numpy.typing import NDArray
+from ragathon.llms.cache import CachedEmbedder
+from ragathon.llms.common import Embedder
+
+
+class CountingEmbedder(Embedder):
+    """Embeds a text as its length, and records the embedded texts."""
+
+    def __init__(self, model_name: str = "model") -> None:
+        self.embedded: List[str] = []
+        self._model_name = model_name
+
+    async def embed(self, texts: List[str]) -> List[NDArray[np.float32]]:
+        self.embedded.extend(texts)
+        return [np.array([len(text), 1.0], dtype=np.float32) for text in texts]
+
+    def get_embedding_size(self) -> int:
+        return 2
+
+    def get_model_name(self) -> str:
+        return self._model_name
+
+
+@pytest.mark.anyio
+async def test_only_misses_are_embedded(tmp_path: Path) -> None:
+    """Test that stored embeddings are reused, also by a new embedder instance."""
+    database_path = tmp_path / "embeddings.db"
+    inner = CountingEmbedder()
+    embedder = CachedEmbedder(embedder=inner, database_path=database_path)
+
+    first = await embedder.embed(texts=["a", "bb", "a"])
+    assert inner.embedded == ["a", "bb"]
+    assert [embedding[0] for embedding in first] == [1, 2, 1]
+    await embedder.close()
+
+    inner = CountingEmbedder()
+    embedder = CachedEmbedder(embedder=inner, database_path=database_path)
+    second = await embedder.embed(texts=["ccc", "bb", "a"])
+    assert inner.embedded == ["ccc"]
+    assert [embedding[0] for embedding in second] == [3, 2, 1]
+    assert second[1].dtype == np.float32
+
+    matrix = await embedder.embed_matrix(texts=["a", "dddd"])
+    assert matrix.shape == (2, 2)
+    assert matrix[:, 0].tolist() == [1, 4]
+    assert inner.embedded == ["ccc", "dddd"]
+
+    other_model = CountingEmbedder(model_name="other")
+    embedder = CachedEmbedder(embedder=other_model, database_path=database_path)
+    await embedder.embed(texts=["a"])
+    assert other_model.embedded == ["a"]
+
+
+@pytest.mark.anyio
+async def test_precompute_embeds_missing_texts_in_batches(tmp_path: Path) -> None:
+    """Test that precomputed embeddings make later lookups free."""
+    inner = CountingEmbedder()
+    embedder = CachedEmbedder(embedder=inner, database_path=tmp_path / "queries.db")
+    await embedder.embed(texts=["known"])
+
+    questions = [f"question {i}" for i in range(5)] + ["known", "question 0"]
+    assert await embedder.precompute(texts=questions, batch_size=2) == 5
+    assert len(inner.embedded) == 6
+
+    assert await embedder.precompute(texts=questions) == 0
+    await embedder.embed(texts=questions)
+    assert len(inner.embedded) == 6
@@ -0,0 +1,125 @@
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+from ragathon.data.models import ChunkedTextSet, MatchedChunk, SearchResult
+from ragathon.indexing import Indexer, fingerprint_directory
+from ragathon.indexing.cache import CachedIndexer, SearchResultCache
+
+
+class FakeIndexer(Indexer):
+    def __init__(self) -> None:
+        self.searched: List[str] = []
+        self.version = "v1"
+
+    async def create(self, data_set: ChunkedTextSet) -> None:
+        self.version = "v2"
+
+    async def load(self) -> None:
+        pass
+
+    async def search(self, query: str, k: int) -> SearchResult:
+        self.searched.append(query)
+        result = SearchResult(query=query)
+        for rank in range(1, k + 1):
+            result.matches.append(
+                MatchedChunk(
+                    chunk_id=f"{self.version}-{rank}",
+                    section_id="section",
+                    chunk_text=query,
+                    rank=rank,
+                    score=1.0 / rank,
+                )
+            )
+        return result
+
+    async def exists(self) -> bool:
+        return True
+
+    async def fingerprint(self) -> str:
+        return self.version
+
+
+@pytest.mark.anyio
+async def test_repeated_queries_are_served_from_the_cache() -> None:
+    """Test that normalized duplicates are searched once and keep their own text."""
+    index = FakeIndexer()
+    cached = CachedIndexer(index=index)
+    await cached.load()
+
+    results = await cached.search_many(
+        queries=["hvad er  persondata?", "hvad er persondata?", "klage"], k=2
+    )
+    assert index.searched == ["hvad er  persondata?", "klage"]
+    assert results[1].query == "hvad er persondata?"
+    assert results[0].matches == results[1].matches
+
+    await cached.search(query="klage ", k=2)
+    assert len(index.searched) == 2
+
+    # Another k is another entry
+    await cached.search(query="klage", k=3)
+    assert len(index.searched) == 3
+
+
+@pytest.mark.anyio
+async def test_results_are_invalidated_when_the_index_changes() -> None:
+    """Test that a new fingerprint drops the cached results."""
+    index = FakeIndexer()
+    cached = CachedIndexer(index=index, fingerprint_interval=0.0)
+    await cached.load()
+
+    await cached.search(query="klage", k=1)
+    index.version = "v2"
+    result = await cached.search(query="klage", k=1)
+
+    assert index.searched == ["klage", "klage"]
+    assert result.matches[0].chunk_id == "v2-1"
+
+
+@pytest.mark.anyio
+async def test_results_are_shared_through_sqlite(tmp_path: Path) -> None:
+    """Test that a second cache reuses the results stored by the first one."""
+    database_path = tmp_path / "cache.sqlite"
+
+    first = CachedIndexer(index=FakeIndexer(), database_path=database_path)
+    await first.load()
+    await first.search_many(queries=["klage", "tilsyn"], k=2)
+    await first.close()
+
+    index = FakeIndexer()
+    second = CachedIndexer(index=index, database_path=database_path)
+    await second.load()
+    results = await second.search_many(queries=["tilsyn", "klage", "brud"], k=2)
+    await second.close()
+
+    assert index.searched == ["brud"]
+    assert [result.matches[0].chunk_id for result in results] == ["v1-1"] * 3
+
+
+def test_lru_eviction_and_ttl() -> None:
+    """Test that the least recently used and the expired entries are dropped."""
+    cache = SearchResultCache(max_size=2, ttl=None)
+    for key in ["a", "b"]:
+        cache.put(key=key, result=SearchResult(query=key))
+    assert cache.get(key="a") is not None
+    cache.put(key="c", result=SearchResult(query="c"))
+
+    assert cache.get(key="b") is None
+    assert cache.get(key="a") is not None
+
+    expiring = SearchResultCache(ttl=0.01)
+    expiring.put(key="a", result=SearchResult(query="a"))
+    time.sleep(0.02)
+    assert expiring.get(key="a") is None
+
+
+def test_fingerprint_directory_changes_with_the_files(tmp_path: Path) -> None:
+    """Test that writing a file changes the fingerprint of its directory."""
+    before = fingerprint_directory(directory=tmp_path)
+    (tmp_path / "corpus.jsonl").write_text("{}\n")
+    after = fingerprint_directory(directory=tmp_path)
+
+    assert before != after
+    assert after == fingerprint_directory(directory=tmp_path)
@@ -0,0 +1,55 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+from ragathon.indexing import CorpusItem
+from ragathon.indexing.corpus import CORPUS_FILE_NAME, ColumnarCorpus
+
+
+def make_items(start: int, stop: int) -> List[CorpusItem]:
+    return [
+        CorpusItem(index=i, chunk_id=f"c{i}", section_id=f"s{i}", text=f"tekst {i} æøå")
+        for i in range(start, stop)
+    ]
+
+
+def test_save_load_and_extend(tmp_path: Path) -> None:
+    """Test that a saved corpus is memory-mapped and decodes the original items."""
+    items = make_items(0, 10)
+    ColumnarCorpus.from_items(items=items).save(directory=tmp_path)
+
+    corpus = ColumnarCorpus.load(directory=tmp_path)
+    assert len(corpus) == 10
+    assert list(corpus) == items
+    assert corpus[-1] == items[-1]
+    assert corpus.column("section_id") == [item.section_id for item in items]
+    with pytest.raises(IndexError):
+        corpus[10]
+
+    extended = corpus.extended(items=make_items(10, 12))
+    extended.save(directory=tmp_path)
+    assert list(ColumnarCorpus.load(directory=tmp_path)) == make_items(0, 12)
+    # Both arrays are stored in one file, which is replaced at once
+    assert [path.name for path in tmp_path.iterdir()] == [CORPUS_FILE_NAME]
+
+    ColumnarCorpus.from_items(items=[]).save(directory=tmp_path / "empty")
+    assert len(ColumnarCorpus.load(directory=tmp_path / "empty")) == 0
+
+
+def test_extending_does_not_decode_the_items(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that appending items copies the stored values without decoding them."""
+    ColumnarCorpus.from_items(items=make_items(0, 10)).save(directory=tmp_path)
+    corpus = ColumnarCorpus.load(directory=tmp_path)
+
+    def fail(self: ColumnarCorpus, column: int, index: int) -> str:
+        raise AssertionError("A value was decoded")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ColumnarCorpus, "_value", fail)
+        extended = corpus.extended(items=make_items(10, 11)).extended(
+            items=make_items(11, 13)
+        )
+
+    assert list(extended) == make_items(0, 13)
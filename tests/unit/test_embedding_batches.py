@@ -0,0 +1,110 @@
+import asyncio
+import base64
+from typing import Any, List
+
+import numpy as np
+import pytest
+from openai.types.create_embedding_response import CreateEmbeddingResponse, Usage
+from openai.types.embedding import Embedding
+from ragathon.llms.azure import AzureOpenAIBasedEmbedder, decode_embeddings
+from ragathon.llms.common import split_into_batches
+
+
+def test_split_into_batches_respects_limits() -> None:
+    """Test that batches are bounded by item count and estimated tokens."""
+    texts = ["a" * 30, "b" * 30, "c" * 30, "d" * 300, "e"]
+
+    assert split_into_batches(texts=texts, max_items=2, max_tokens=1000) == [
+        texts[0:2],
+        texts[2:4],
+        texts[4:5],
+    ]
+    # Each short text is 11 tokens, and the long text gets a batch of its own
+    assert split_into_batches(texts=texts, max_items=10, max_tokens=25) == [
+        texts[0:2],
+        texts[2:3],
+        texts[3:4],
+        texts[4:5],
+    ]
+    assert split_into_batches(texts=[], max_items=10, max_tokens=25) == []
+
+
+class FakeEmbeddings:
+    """Embeds a text as its length, answering slowly and out of order."""
+
+    def __init__(self) -> None:
+        self.batches: List[List[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, input: List[str], **kwargs: Any) -> CreateEmbeddingResponse:
+        self.batches.append(input)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Let later batches finish first
+        await asyncio.sleep(0.01 / len(self.batches))
+        self.in_flight -= 1
+
+        data = [
+            Embedding(embedding=[float(len(text))], index=i, object="embedding")
+            for i, text in enumerate(input)
+        ]
+        return CreateEmbeddingResponse(
+            data=list(reversed(data)),
+            model="fake",
+            object="list",
+            usage=Usage(prompt_tokens=0, total_tokens=0),
+        )
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.embeddings = FakeEmbeddings()
+
+
+@pytest.mark.anyio
+async def test_embed_batches_concurrently_in_order() -> None:
+    """Test that batched embeddings are reassembled in the order of the texts."""
+    embedder = AzureOpenAIBasedEmbedder(
+        api_base_endpoint="https://example.openai.azure.com",
+        api_version="2024-02-01",
+        token_generator=lambda: "token",
+        deployment_id="embedding",
+        model_name="fake",
+        embedding_size=1,
+        max_batch_size=3,
+        max_concurrency=2,
+    )
+    client = FakeClient()
+    embedder._client = client  # pyre-ignore[8]
+
+    texts = ["x" * length for length in range(1, 12)]
+    embeddings = await embedder.embed(texts=texts)
+
+    assert len(client.embeddings.batches) == 4
+    assert client.embeddings.max_in_flight == 2
+    assert np.concatenate(embeddings).tolist() == list(range(1, 12))
+
+    matrix = await embedder.embed_matrix(texts=texts)
+    assert matrix.shape == (11, 1)
+    assert matrix.flags.c_contiguous
+    assert matrix[:, 0].tolist() == list(range(1, 12))
+
+
+def test_decode_base64_embeddings_in_index_order() -> None:
+    """Test that base64 embeddings are decoded into rows ordered by index."""
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    data = [
+        # The SDK does not decode embeddings when a format is requested explicitly
+        Embedding.model_construct(
+            embedding=base64.b64encode(vectors[i].tobytes()).decode(),
+            index=i,
+            object="embedding",
+        )
+        for i in [2, 0, 1]
+    ]
+
+    matrix = decode_embeddings(data=data)
+    assert matrix.dtype == np.float32
+    assert matrix.flags.c_contiguous
+    assert matrix.tolist() == vectors.tolist()
@@ -0,0 +1,454 @@
+import asyncio
+import zlib
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pytest
+from loguru import logger
+from numpy.typing import NDArray
+from ragathon.data.models import ChunkedText, ChunkedTextSet, ChunkingMethod
+from ragathon.indexing import CorpusItem
+from ragathon.indexing.corpus import ColumnarCorpus
+from ragathon.indexing.delta import VECTOR_DELTA_FILE_NAME
+from ragathon.indexing.flat import VECTOR_CORPUS_FILE_NAME, FlatVectorIndex
+from ragathon.indexing.quantization import EmbeddingPrecision
+from ragathon.indexing.vector import (
+    AnnoyParameters,
+    ANNParameters,
+    HNSWParameters,
+    VectorIndex,
+    VectorIndexBackend,
+    current_version_dir,
+    read_ann_parameters,
+    write_ann_parameters,
+)
+from ragathon.llms.common import Embedder
+
+EMBEDDING_SIZE = 16
+
+
+class FakeEmbedder(Embedder):
+    """Deterministic random embeddings per text."""
+
+    def __init__(self) -> None:
+        self.calls: List[List[str]] = []
+        self._embeddings: Dict[str, NDArray[np.float32]] = {}
+
+    async def embed(self, texts: List[str]) -> List[NDArray[np.float32]]:
+        self.calls.append(texts)
+        return [self._embed(text) for text in texts]
+
+    def get_embedding_size(self) -> int:
+        return EMBEDDING_SIZE
+
+    def _embed(self, text: str) -> NDArray[np.float32]:
+        if text not in self._embeddings:
+            rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+            self._embeddings[text] = rng.normal(size=EMBEDDING_SIZE).astype(np.float32)
+        return self._embeddings[text]
+
+
+class MatryoshkaEmbedder(FakeEmbedder):
+    """Fake embeddings whose trailing dimensions carry little information."""
+
+    def _embed(self, text: str) -> NDArray[np.float32]:
+        weights = np.where(np.arange(EMBEDDING_SIZE) < EMBEDDING_SIZE // 2, 1.0, 0.2)
+        return (super()._embed(text) * weights).astype(np.float32)
+
+
+@pytest.fixture
+def data_set() -> ChunkedTextSet:
+    chunks = [ChunkedText(section_id=f"s{i}", text=f"chunk {i}") for i in range(50)]
+    return ChunkedTextSet(chunking_method=ChunkingMethod.NAIVE, chunks=chunks)
+
+
+@pytest.mark.anyio
+async def test_search_is_exact(data_set: ChunkedTextSet, tmp_path: Path) -> None:
+    """Test that the flat index returns the chunks with the highest similarity."""
+    embedder = FakeEmbedder()
+    await FlatVectorIndex(storage_dir=tmp_path, embedder=embedder).create(
+        data_set=data_set
+    )
+
+    index = FlatVectorIndex(storage_dir=tmp_path, embedder=embedder)
+    assert await index.exists()
+    await index.load()
+    assert isinstance(index.embeddings, np.memmap)
+
+    queries = ["chunk 7", "something else", "chunk 42"]
+    results = await index.search_many(queries=queries, k=5)
+    assert embedder.calls[-1] == queries
+
+    texts = [chunk.text for chunk in data_set.chunks]
+    chunk_embeddings = np.vstack(await embedder.embed(texts=texts))
+    chunk_embeddings /= np.linalg.norm(chunk_embeddings, axis=1, keepdims=True)
+    for query, result in zip(queries, results):
+        query_embedding = (await embedder.embed(texts=[query]))[0]
+        query_embedding = query_embedding / np.linalg.norm(query_embedding)
+        similarities = chunk_embeddings @ query_embedding
+        expected = np.argsort(-similarities)[:5]
+
+        assert [match.section_id for match in result.matches] == [
+            f"s{i}" for i in expected
+        ]
+        assert [match.score for match in result.matches] == pytest.approx(
+            similarities[expected].tolist(), abs=1e-5
+        )
+
+    assert results[0].matches[0].section_id == "s7"
+    assert results[0].matches[0].score == pytest.approx(1.0, abs=1e-5)
+
+
+@pytest.mark.anyio
+async def test_vector_index_chooses_backend_by_size(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that only large corpora get an approximate index."""
+    embedder = FakeEmbedder()
+
+    small = VectorIndex(storage_dir=tmp_path / "small", embedder=embedder)
+    await small.create(data_set=data_set)
+    await small.load()
+    assert not small.uses_ann
+
+    large = VectorIndex(
+        storage_dir=tmp_path / "large", embedder=embedder, ann_threshold=10
+    )
+    await large.create(data_set=data_set)
+    await large.load()
+    assert large.uses_ann
+
+    exact = await small.search(query="chunk 3", k=3)
+    approximate = await large.search(query="chunk 3", k=3)
+    assert exact.matches[0].chunk_id == approximate.matches[0].chunk_id
+    assert approximate.matches[0].score == pytest.approx(1.0, abs=1e-4)
+
+
+@pytest.mark.anyio
+async def test_hnsw_backend_supports_adding_chunks(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that chunks added to an HNSW-backed index can be found after a reload."""
+    embedder = FakeEmbedder()
+    index = VectorIndex(
+        storage_dir=tmp_path, embedder=embedder, backend=VectorIndexBackend.HNSW
+    )
+    await index.create(data_set=data_set)
+    assert index.uses_ann
+
+    await index.add(chunks=[ChunkedText(section_id="new", text="a new chunk")])
+
+    loaded = VectorIndex(storage_dir=tmp_path, embedder=embedder)
+    await loaded.load()
+    assert loaded.uses_ann
+
+    result = await loaded.search(query="a new chunk", k=2)
+    assert result.matches[0].section_id == "new"
+    assert (await loaded.search(query="chunk 9", k=1)).matches[0].section_id == "s9"
+
+
+@pytest.mark.anyio
+async def test_legacy_jsonl_corpus_is_converted(tmp_path: Path) -> None:
+    """Test that an index with a JSON Lines corpus loads, and is converted on add."""
+    items = [
+        CorpusItem(index=i, chunk_id=f"c{i}", section_id=f"s{i}", text=f"chunk {i}")
+        for i in range(3)
+    ]
+    np.save(tmp_path / "embeddings.npy", np.eye(3, EMBEDDING_SIZE, dtype=np.float32))
+    with open(tmp_path / VECTOR_CORPUS_FILE_NAME, mode="w") as f:
+        for item in items:
+            f.write(item.model_dump_json() + "\n")
+
+    embedder = FakeEmbedder()
+    index = FlatVectorIndex(storage_dir=tmp_path, embedder=embedder)
+    assert await index.exists()
+    await index.load()
+    assert list(index.corpus) == items
+
+    chunk = ChunkedText(section_id="s3", text="chunk 3")
+    await index.add_embeddings(
+        chunks=[chunk], embeddings=await embedder.embed(texts=[chunk.text])
+    )
+    assert not (tmp_path / VECTOR_CORPUS_FILE_NAME).exists()
+    assert isinstance(index.corpus, ColumnarCorpus)
+    assert index.corpus[3].section_id == "s3"
+
+    result = await index.search(query="chunk 3", k=1)
+    assert result.matches[0].chunk_id == chunk.id
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "precision", [EmbeddingPrecision.FLOAT16, EmbeddingPrecision.INT8]
+)
+async def test_quantized_search_rescores_with_full_precision(
+    data_set: ChunkedTextSet, tmp_path: Path, precision: EmbeddingPrecision
+) -> None:
+    """Test that a quantized first pass finds the exact matches and scores."""
+    embedder = FakeEmbedder()
+    exact = FlatVectorIndex(storage_dir=tmp_path / "exact", embedder=embedder)
+    await exact.create(data_set=data_set)
+
+    quantized = FlatVectorIndex(
+        storage_dir=tmp_path / "quantized",
+        embedder=embedder,
+        precision=precision,
+        rescore_factor=3,
+    )
+    await quantized.create(data_set=data_set)
+    await quantized.load()
+    assert quantized._quantized is not None
+    assert isinstance(quantized._quantized._codes, np.memmap)
+
+    queries = [f"chunk {i}" for i in range(0, 50, 5)] + ["something else"]
+    for expected, result in zip(
+        await exact.search_many(queries=queries, k=5),
+        await quantized.search_many(queries=queries, k=5),
+    ):
+        assert [match.chunk_id for match in result.matches] == [
+            match.chunk_id for match in expected.matches
+        ]
+        assert [match.score for match in result.matches] == pytest.approx(
+            [match.score for match in expected.matches], abs=1e-6
+        )
+
+
+@pytest.mark.anyio
+async def test_coarse_search_over_leading_dimensions(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that a first pass over an embedding prefix finds the exact matches."""
+    embedder = MatryoshkaEmbedder()
+    exact = FlatVectorIndex(storage_dir=tmp_path / "exact", embedder=embedder)
+    await exact.create(data_set=data_set)
+
+    await FlatVectorIndex(
+        storage_dir=tmp_path / "coarse", embedder=embedder, coarse_dimensions=8
+    ).create(data_set=data_set)
+    coarse = FlatVectorIndex(
+        storage_dir=tmp_path / "coarse",
+        embedder=embedder,
+        coarse_dimensions=8,
+        precision=EmbeddingPrecision.INT8,
+        rescore_factor=4,
+    )
+    # The int8 prefix did not exist yet, and is computed on load without writing it
+    await coarse.load()
+    assert not (tmp_path / "coarse" / "embeddings.d8.int8.npy").exists()
+
+    calls = len(embedder.calls)
+    result = await coarse.search(query="chunk 17", k=3)
+    assert len(embedder.calls) == calls + 1
+    expected = await exact.search(query="chunk 17", k=3)
+    assert result.matches[0].section_id == "s17"
+    assert [match.chunk_id for match in result.matches] == [
+        match.chunk_id for match in expected.matches
+    ]
+    assert [match.score for match in result.matches] == pytest.approx(
+        [match.score for match in expected.matches], abs=1e-6
+    )
+
+
+@pytest.mark.anyio
+async def test_stored_ann_parameters_are_used_on_load(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that tuned parameters in the index directory apply unless overridden."""
+    embedder = FakeEmbedder()
+    await VectorIndex(
+        storage_dir=tmp_path,
+        embedder=embedder,
+        backend=VectorIndexBackend.ANNOY,
+        annoy_parameters=AnnoyParameters(n_trees=3),
+    ).create(data_set=data_set)
+    stored = read_ann_parameters(storage_dir=current_version_dir(tmp_path))
+    assert stored is not None and stored.annoy.n_trees == 3
+
+    tuned = ANNParameters(
+        annoy=AnnoyParameters(n_trees=3, search_k=50),
+        hnsw=HNSWParameters(ef_search=20),
+    )
+    write_ann_parameters(storage_dir=current_version_dir(tmp_path), parameters=tuned)
+
+    index = VectorIndex(storage_dir=tmp_path, embedder=embedder)
+    await index.load()
+    assert index.parameters == tuned
+
+    overridden = VectorIndex(
+        storage_dir=tmp_path,
+        embedder=embedder,
+        annoy_parameters=AnnoyParameters(search_k=500),
+    )
+    await overridden.load()
+    assert overridden.parameters.annoy.search_k == 500
+    assert overridden.parameters.hnsw.ef_search == 20
+
+
+@pytest.mark.anyio
+async def test_annoy_index_supports_adding_and_deleting_chunks(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that changes are searched from the delta segment until they are merged."""
+    embedder = FakeEmbedder()
+    index = VectorIndex(
+        storage_dir=tmp_path, embedder=embedder, backend=VectorIndexBackend.ANNOY
+    )
+    await index.create(data_set=data_set)
+    chunk_3 = data_set.chunks[3]
+
+    await index.add(chunks=[ChunkedText(section_id="new", text="a new chunk")])
+    await index.add(
+        chunks=[ChunkedText(id=chunk_3.id, section_id="s3", text="chunk 3 edited")]
+    )
+    await index.delete(chunk_ids=[data_set.chunks[9].id])
+    # The delta segment is one file, replaced rather than written in place
+    assert (current_version_dir(tmp_path) / VECTOR_DELTA_FILE_NAME).exists()
+    assert not list(tmp_path.rglob("*.tmp.*"))
+
+    loaded = VectorIndex(storage_dir=tmp_path, embedder=embedder)
+    await loaded.load()
+    for searched in [index, loaded]:
+        result = await searched.search(query="a new chunk", k=3)
+        assert result.matches[0].section_id == "new"
+        assert result.matches[0].score == pytest.approx(1.0, abs=1e-4)
+
+        result = await searched.search(query="chunk 3 edited", k=60)
+        assert [match.chunk_id for match in result.matches].count(chunk_3.id) == 1
+        assert result.matches[0].chunk_text == "chunk 3 edited"
+        assert data_set.chunks[9].id not in {m.chunk_id for m in result.matches}
+        assert len(result.matches) == 50
+
+    await loaded.merge()
+    assert loaded.uses_ann
+
+    merged = VectorIndex(storage_dir=tmp_path, embedder=embedder)
+    await merged.load()
+    result = await merged.search(query="chunk 3 edited", k=60)
+    assert len(result.matches) == 50
+    assert result.matches[0].chunk_text == "chunk 3 edited"
+    assert not (current_version_dir(tmp_path) / VECTOR_DELTA_FILE_NAME).exists()
+    assert not list(tmp_path.rglob("*.tmp.*"))
+
+
+@pytest.mark.anyio
+async def test_interrupted_merge_keeps_the_previous_version(
+    data_set: ChunkedTextSet, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a merge failing before the switch leaves a consistent index."""
+    embedder = FakeEmbedder()
+    index = VectorIndex(storage_dir=tmp_path, embedder=embedder)
+    await index.create(data_set=data_set)
+    chunk_3 = data_set.chunks[3]
+    await index.add(
+        chunks=[ChunkedText(id=chunk_3.id, section_id="s3", text="chunk 3 edited")]
+    )
+
+    def crash(storage_dir: Path, version_dir: Path) -> None:
+        raise RuntimeError("crash")
+
+    monkeypatch.setattr("ragathon.indexing.vector.switch_version", crash)
+    with pytest.raises(RuntimeError, match="crash"):
+        await index.merge()
+
+    # The merged files were written, but the previous version is still current
+    loaded = VectorIndex(storage_dir=tmp_path, embedder=embedder)
+    await loaded.load()
+    result = await loaded.search(query="chunk 3 edited", k=60)
+    assert [match.chunk_id for match in result.matches].count(chunk_3.id) == 1
+    assert result.matches[0].chunk_text == "chunk 3 edited"
+    assert len(result.matches) == 50
+
+
+@pytest.mark.anyio
+async def test_unversioned_index_is_replaced_by_versions(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that an index with its files in the storage dir loads and merges."""
+    embedder = FakeEmbedder()
+    await VectorIndex(storage_dir=tmp_path / "created", embedder=embedder).create(
+        data_set=data_set
+    )
+    storage_dir = tmp_path / "index"
+    current_version_dir(tmp_path / "created").rename(storage_dir)
+
+    index = VectorIndex(storage_dir=storage_dir, embedder=embedder)
+    await index.load()
+    for text in ["first new chunk", "second new chunk"]:
+        await index.add(chunks=[ChunkedText(section_id="new", text=text)])
+        await index.merge()
+
+    loaded = VectorIndex(storage_dir=storage_dir, embedder=embedder)
+    await loaded.load()
+    result = await loaded.search(query="first new chunk", k=60)
+    assert len(result.matches) == 52
+    assert result.matches[0].section_id == "new"
+    # Only the version file, the current and the previous version remain
+    assert sorted(path.is_dir() for path in storage_dir.iterdir()) == [
+        False,
+        True,
+        True,
+    ]
+
+
+@pytest.mark.anyio
+async def test_background_merge_keeps_changes_made_meanwhile(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that a merge started by the threshold replays later changes."""
+    embedder = FakeEmbedder()
+    index = VectorIndex(storage_dir=tmp_path, embedder=embedder, merge_threshold=2)
+    await index.create(data_set=data_set)
+
+    await index.add(
+        chunks=[
+            ChunkedText(id="a", section_id="new", text="first new chunk"),
+            ChunkedText(id="b", section_id="new", text="second new chunk"),
+        ]
+    )
+    # Let the merge start, so that these changes are made while it runs
+    await asyncio.sleep(0)
+    assert index._merge_log is not None
+    await index.add(chunks=[ChunkedText(id="c", section_id="new", text="third")])
+    await index.delete(chunk_ids=["a"])
+    await index.wait_for_merge()
+    assert index._merge_log is None
+    assert "b" in {chunk.chunk_id for chunk in index._flat.corpus}
+
+    for searched in [index, VectorIndex(storage_dir=tmp_path, embedder=embedder)]:
+        if not searched.is_loaded:
+            await searched.load()
+        result = await searched.search(query="first new chunk", k=60)
+        found = [match.chunk_id for match in result.matches]
+        assert len(found) == 52
+        assert "a" not in found and {"b", "c"} <= set(found)
+
+
+@pytest.mark.anyio
+async def test_background_merge_failure_is_logged(
+    data_set: ChunkedTextSet, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a merge started by the threshold does not fail silently."""
+    embedder = FakeEmbedder()
+    index = VectorIndex(storage_dir=tmp_path, embedder=embedder, merge_threshold=1)
+    await index.create(data_set=data_set)
+
+    async def failing_merge() -> None:
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(index, "_merge", failing_merge)
+    messages: List[str] = []
+    sink_id = logger.add(messages.append, level="ERROR")
+    try:
+        await index.add(chunks=[ChunkedText(section_id="new", text="a new chunk")])
+        with pytest.raises(RuntimeError, match="disk full"):
+            await index.wait_for_merge()
+    finally:
+        logger.remove(sink_id)
+
+    assert len(messages) == 1
+    assert "The background merge failed" in messages[0]
+    assert "disk full" in messages[0]
+    # The changes are still in the delta segment
+    result = await index.search(query="a new chunk", k=1)
+    assert result.matches[0].section_id == "new"
@@ -0,0 +1,122 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from numpy.typing import NDArray
+from ragathon.indexing.hnsw import HNSW_LINKS_FILE_PATTERN, HNSWGraph
+
+
+@pytest.fixture
+def vectors() -> NDArray[np.float32]:
+    # Clustered vectors, like real embeddings
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 32))
+    vectors = centers[rng.integers(0, 20, size=1000)] + 0.3 * rng.normal(
+        size=(1000, 32)
+    )
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall(graph: HNSWGraph, vectors: NDArray[np.float32], k: int = 10) -> float:
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), size=50)] + 0.1 * rng.normal(
+        size=(50, vectors.shape[1])
+    ).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    found = 0
+    for query, expected in zip(queries, truth):
+        indices, _ = graph.search(query=query, k=k)
+        found += len(set(indices.tolist()) & set(expected.tolist()))
+
+    return found / truth.size
+
+
+def test_search_has_high_recall(vectors: NDArray[np.float32]) -> None:
+    """Test that the graph finds most of the exact nearest neighbors."""
+    graph = HNSWGraph(dimensions=32, m=8, ef_construction=64, ef_search=64)
+    graph.insert_many(vectors=vectors)
+
+    assert len(graph) == len(vectors)
+    assert recall(graph=graph, vectors=vectors) >= 0.9
+
+    indices, similarities = graph.search(query=vectors[123], k=3)
+    assert indices[0] == 123
+    assert similarities[0] == pytest.approx(1.0, abs=1e-5)
+    assert list(similarities) == sorted(similarities, reverse=True)
+
+
+def test_save_load_and_insert(vectors: NDArray[np.float32], tmp_path: Path) -> None:
+    """Test that a loaded graph searches like the saved one and accepts inserts."""
+    graph = HNSWGraph(dimensions=32, m=8, ef_construction=64)
+    graph.index_vectors(vectors=vectors[:900])
+    graph.save(path=tmp_path / "graph.npz")
+
+    np.save(tmp_path / "vectors.npy", vectors[:900])
+    mapped = np.load(tmp_path / "vectors.npy", mmap_mode="r")
+    loaded = HNSWGraph.load(path=tmp_path / "graph.npz", vectors=mapped)
+    # The bottom layer is shared through the page cache until the first insert
+    assert isinstance(loaded._links_0, np.memmap)
+    assert not loaded._links_0.flags.writeable
+
+    query = vectors[950]
+    assert loaded.search(query=query, k=5)[0].tolist() == (
+        graph.search(query=query, k=5)[0].tolist()
+    )
+
+    for vector in vectors[900:]:
+        loaded.insert(vector=vector)
+    assert len(loaded) == len(vectors)
+    assert loaded.search(query=vectors[950], k=1)[0].tolist() == [950]
+    assert recall(graph=loaded, vectors=vectors) >= 0.9
+
+
+def test_save_names_a_new_links_file(
+    vectors: NDArray[np.float32], tmp_path: Path
+) -> None:
+    """Test that every save writes a links file that only its `.npz` file names."""
+    path = tmp_path / "graph.npz"
+    for m in [4, 8, 12]:
+        graph = HNSWGraph(dimensions=32, m=m, ef_construction=32)
+        graph.index_vectors(vectors=vectors[:200])
+        graph.save(path=path)
+        if m == 4:
+            with np.load(path) as arrays:
+                first_links_file = str(arrays["links_file"])
+        elif m == 8:
+            # A process loading the previous graph still finds its links
+            assert (tmp_path / first_links_file).exists()
+
+    # Only the links of the current and the previous graph are kept
+    assert not (tmp_path / first_links_file).exists()
+    assert len(list(tmp_path.glob(HNSW_LINKS_FILE_PATTERN))) == 2
+    loaded = HNSWGraph.load(path=path, vectors=vectors[:200])
+    assert loaded.m == 12
+    assert loaded._links_0.shape == (200, 24)
+    assert loaded.search(query=vectors[17], k=1)[0].tolist() == [17]
+
+
+def test_bulk_indexing_allocates_the_links_once(
+    vectors: NDArray[np.float32], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that linking stored vectors does not copy the links once per node."""
+    graph = HNSWGraph(dimensions=32, m=8, ef_construction=32)
+    graph.index_vectors(vectors=vectors[:100])
+
+    ensure_capacity = graph._ensure_capacity
+    n_allocations = 0
+
+    def counting_ensure_capacity(size: int) -> None:
+        nonlocal n_allocations
+        links_0 = graph._links_0
+        ensure_capacity(size=size)
+        n_allocations += graph._links_0 is not links_0
+
+    monkeypatch.setattr(graph, "_ensure_capacity", counting_ensure_capacity)
+    graph.index_vectors(vectors=vectors[:300])
+
+    assert n_allocations == 1
+    assert len(graph) == 300
+    assert graph.search(query=vectors[250], k=1)[0].tolist() == [250]
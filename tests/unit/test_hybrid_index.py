@@ -0,0 +1,121 @@
+import asyncio
+from typing import List
+
+import pytest
+from ragathon.data.models import ChunkedTextSet, MatchedChunk, SearchResult
+from ragathon.indexing import Indexer
+from ragathon.indexing.hybrid import (
+    FusionMethod,
+    HybridIndex,
+    reciprocal_rank_fusion,
+    weighted_score_fusion,
+)
+
+
+def make_result(query: str, chunk_ids: List[str], scores: List[float]) -> SearchResult:
+    return SearchResult(
+        query=query,
+        matches=[
+            MatchedChunk(
+                chunk_id=chunk_id,
+                section_id="s",
+                chunk_text=chunk_id,
+                rank=rank,
+                score=score,
+            )
+            for rank, (chunk_id, score) in enumerate(zip(chunk_ids, scores), start=1)
+        ],
+    )
+
+
+class FakeIndex(Indexer):
+    """Returns fixed matches after a delay, and records the requested k."""
+
+    def __init__(self, chunk_ids: List[str], scores: List[float], delay: float):
+        self.chunk_ids = chunk_ids
+        self.scores = scores
+        self.delay = delay
+        self.requested_k: List[int] = []
+        self.started = asyncio.Event()
+
+    async def create(self, data_set: ChunkedTextSet) -> None:
+        pass
+
+    async def load(self) -> None:
+        pass
+
+    async def search(self, query: str, k: int) -> SearchResult:
+        self.started.set()
+        self.requested_k.append(k)
+        await asyncio.sleep(self.delay)
+        return make_result(query=query, chunk_ids=self.chunk_ids, scores=self.scores)
+
+    async def fingerprint(self) -> str:
+        return ",".join(self.chunk_ids)
+
+    async def exists(self) -> bool:
+        return True
+
+
+def test_reciprocal_rank_fusion_favors_chunks_found_by_both() -> None:
+    """Test that RRF ranks by summed reciprocal ranks, ignoring score scales."""
+    sparse = make_result(query="q", chunk_ids=["a", "b", "c"], scores=[30, 20, 10])
+    dense = make_result(query="q", chunk_ids=["c", "d", "b"], scores=[0.9, 0.8, 0.7])
+
+    fused = reciprocal_rank_fusion(query="q", results=[sparse, dense], k=3, rrf_k=1)
+
+    # b: 1/3 + 1/4, c: 1/4 + 1/2, a: 1/2, d: 1/3
+    assert [match.chunk_id for match in fused.matches] == ["c", "b", "a"]
+    assert [match.rank for match in fused.matches] == [1, 2, 3]
+    assert fused.matches[0].score == pytest.approx(0.75)
+
+
+def test_weighted_score_fusion_normalizes_scores() -> None:
+    """Test that the scores of every result are min-max normalized and weighted."""
+    sparse = make_result(query="q", chunk_ids=["a", "b", "c"], scores=[30, 20, 10])
+    dense = make_result(query="q", chunk_ids=["c", "b"], scores=[0.9, 0.5])
+
+    fused = weighted_score_fusion(
+        query="q", results=[sparse, dense], weights=[0.25, 0.75], k=10
+    )
+
+    assert {match.chunk_id: match.score for match in fused.matches} == pytest.approx(
+        {"c": 0.75, "a": 0.25, "b": 0.125}
+    )
+    assert [match.chunk_id for match in fused.matches] == ["c", "a", "b"]
+
+
+@pytest.mark.anyio
+async def test_searches_run_concurrently_and_are_fused() -> None:
+    """Test that both indices are searched at once for more candidates than k."""
+    sparse = FakeIndex(chunk_ids=["a", "b"], scores=[2.0, 1.0], delay=0.05)
+    dense = FakeIndex(chunk_ids=["b", "c"], scores=[0.9, 0.8], delay=0.05)
+    index = HybridIndex(sparse=sparse, dense=dense, candidate_factor=4)
+
+    start = asyncio.get_running_loop().time()
+    results = await index.search_many(queries=["q1", "q2"], k=2)
+    elapsed = asyncio.get_running_loop().time() - start
+
+    # Each index searches its queries one by one
+    assert elapsed < 0.18
+    assert sparse.requested_k == dense.requested_k == [8, 8]
+    assert [result.query for result in results] == ["q1", "q2"]
+    assert [match.chunk_id for match in results[0].matches] == ["b", "a"]
+
+
+@pytest.mark.anyio
+async def test_sparse_results_are_returned_when_over_the_latency_budget() -> None:
+    """Test that a slow dense search is abandoned after the latency budget."""
+    sparse = FakeIndex(chunk_ids=["a", "b"], scores=[2.0, 1.0], delay=0.0)
+    dense = FakeIndex(chunk_ids=["c"], scores=[0.9], delay=10.0)
+    index = HybridIndex(
+        sparse=sparse,
+        dense=dense,
+        fusion=FusionMethod.WEIGHTED,
+        latency_budget=0.05,
+    )
+
+    result = await asyncio.wait_for(index.search(query="q", k=2), timeout=1.0)
+
+    assert dense.started.is_set()
+    assert [match.chunk_id for match in result.matches] == ["a", "b"]
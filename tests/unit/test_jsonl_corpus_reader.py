@@ -0,0 +1,69 @@
+import json
+from pathlib import Path
+from typing import Generator
+
+import pytest
+from ragathon.indexing.corpus import JsonlCorpusReader
+
+ITEMS = [
+    {"chunk_id": "a", "text": "Behandling af persondata"},
+    {"chunk_id": "b", "text": "Æbler, østers og ål"},
+    {"chunk_id": "c", "text": ""},
+]
+
+
+class TestJsonlCorpusReader:
+    @pytest.fixture
+    def corpus_path(self, tmp_path: Path) -> Path:
+        corpus_path = tmp_path / "corpus.jsonl"
+        with open(corpus_path, mode="w", encoding="utf-8") as f:
+            for item in ITEMS:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        return corpus_path
+
+    @pytest.fixture
+    def reader(self, corpus_path: Path) -> Generator[JsonlCorpusReader, None, None]:
+        reader = JsonlCorpusReader(corpus_path=corpus_path)
+        yield reader
+        reader.close()
+
+    def test_random_access(self, reader: JsonlCorpusReader) -> None:
+        """Test that items can be read in any order."""
+        assert len(reader) == 3
+        assert reader[2] == ITEMS[2]
+        assert reader[1] == ITEMS[1]
+        assert reader[0] == ITEMS[0]
+
+    def test_out_of_range(self, reader: JsonlCorpusReader) -> None:
+        """Test that reading past the end raises an IndexError."""
+        with pytest.raises(IndexError):
+            reader[3]
+
+    def test_uses_saved_offsets(self, corpus_path: Path) -> None:
+        """Test that the offsets in the `.mmindex.json` file are used."""
+        content = corpus_path.read_bytes()
+        first_newline = content.index(b"\n")
+        offsets = [0, first_newline + 1, content.index(b"\n", first_newline + 1) + 1]
+        corpus_path.with_suffix(".mmindex.json").write_text(json.dumps(offsets))
+
+        reader = JsonlCorpusReader(corpus_path=corpus_path)
+        assert list(reader) == ITEMS
+        reader.close()
+
+    def test_without_trailing_newline(self, tmp_path: Path) -> None:
+        """Test that the last item is found when the file lacks a final newline."""
+        corpus_path = tmp_path / "corpus.jsonl"
+        corpus_path.write_text('{"id": 1}\n{"id": 2}')
+
+        reader = JsonlCorpusReader(corpus_path=corpus_path)
+        assert [item["id"] for item in reader] == [1, 2]
+        reader.close()
+
+    def test_empty_corpus(self, tmp_path: Path) -> None:
+        """Test that an empty corpus file is supported."""
+        corpus_path = tmp_path / "corpus.jsonl"
+        corpus_path.touch()
+
+        reader = JsonlCorpusReader(corpus_path=corpus_path)
+        assert len(reader) == 0
+        reader.close()
@@ -0,0 +1,71 @@
+import random
+from typing import List
+
+import bm25s
+import numpy as np
+import pytest
+from ragathon.indexing.maxscore import MaxScoreScorer, compute_max_impacts
+
+
+@pytest.fixture
+def corpus_tokens() -> List[List[str]]:
+    # Zipf-like term distribution, so that queries mix rare and frequent terms
+    rng = random.Random(7)
+    vocabulary = [f"term{i}" for i in range(300)]
+    weights = [1 / (i + 1) for i in range(len(vocabulary))]
+    return [
+        rng.choices(vocabulary, weights=weights, k=rng.randint(5, 40))
+        for _ in range(2000)
+    ]
+
+
+@pytest.fixture
+def model(corpus_tokens: List[List[str]]) -> bm25s.BM25:
+    model = bm25s.BM25()
+    model.index(corpus_tokens, show_progress=False)
+    return model
+
+
+def test_compute_max_impacts(model: bm25s.BM25) -> None:
+    """Test that the maximum impact of a term is the maximum of its scores."""
+    max_impacts = compute_max_impacts(scores=model.scores)
+
+    for token in ["term0", "term50", "term299"]:
+        token_id = model.vocab_dict[token]
+        assert max_impacts[token_id] == pytest.approx(
+            model.get_scores([token]).max(), rel=1e-6
+        )
+
+
+@pytest.mark.parametrize("k", [1, 5, 50])
+def test_matches_exhaustive_scoring(model: bm25s.BM25, k: int) -> None:
+    """Test that pruning returns the same top k as scoring every document."""
+    scorer = MaxScoreScorer(
+        scores=model.scores, max_impacts=compute_max_impacts(scores=model.scores)
+    )
+
+    rng = random.Random(k)
+    for _ in range(50):
+        query = [f"term{rng.randint(0, 299)}" for _ in range(rng.randint(1, 5))]
+        indices, scores = scorer.top_k(
+            token_ids=[model.vocab_dict[token] for token in query], k=k
+        )
+
+        expected_scores = model.get_scores(query)
+        expected_top = np.sort(expected_scores[expected_scores > 0])[::-1][:k]
+        assert scores == pytest.approx(expected_top.tolist(), rel=1e-5)
+        assert expected_scores[indices].tolist() == pytest.approx(scores, rel=1e-5)
+
+
+def test_repeated_and_unknown_terms(model: bm25s.BM25) -> None:
+    """Test that repeated terms count twice and queries without terms match nothing."""
+    scorer = MaxScoreScorer(
+        scores=model.scores, max_impacts=compute_max_impacts(scores=model.scores)
+    )
+
+    query = ["term3", "term3", "term40"]
+    _, scores = scorer.top_k(token_ids=[model.vocab_dict[t] for t in query], k=3)
+    expected = np.sort(model.get_scores(query))[::-1][:3]
+    assert scores == pytest.approx(expected.tolist(), rel=1e-5)
+
+    assert scorer.top_k(token_ids=[], k=3) == ([], [])
@@ -0,0 +1,74 @@
+import asyncio
+from typing import List
+
+import numpy as np
+import pytest
+from numpy.typing import NDArray
+from ragathon.llms.batching import MicroBatchingEmbedder
+from ragathon.llms.common import Embedder
+
+
+class RecordingEmbedder(Embedder):
+    """Embeds a text as its length, and records the batches."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: List[List[str]] = []
+        self._fail = fail
+
+    async def embed(self, texts: List[str]) -> List[NDArray[np.float32]]:
+        self.batches.append(texts)
+        await asyncio.sleep(0)
+        if self._fail:
+            raise RuntimeError("Rate limited")
+        return [np.array([len(text)], dtype=np.float32) for text in texts]
+
+    def get_embedding_size(self) -> int:
+        return 1
+
+
+@pytest.mark.anyio
+async def test_concurrent_requests_are_coalesced() -> None:
+    """Test that concurrent requests share batches and get their own embeddings."""
+    inner = RecordingEmbedder()
+    embedder = MicroBatchingEmbedder(embedder=inner, max_batch_size=8, max_wait=0.01)
+
+    texts = [["a" * (i % 5 + 1)] for i in range(20)] + [["bb", "ccc"]]
+    results = await asyncio.gather(*[embedder.embed(texts=t) for t in texts])
+
+    for request, embeddings in zip(texts, results):
+        assert [embedding[0] for embedding in embeddings] == [len(t) for t in request]
+    assert len(inner.batches) == 3
+    # Duplicate texts within a batch are embedded once
+    assert all(len(batch) == len(set(batch)) for batch in inner.batches)
+
+    assert [e[0] for e in await embedder.embed(texts=["x" * 3] * 8)] == [3] * 8
+    assert inner.batches[-1] == ["xxx"] * 8
+
+
+@pytest.mark.anyio
+async def test_errors_are_raised_to_every_caller() -> None:
+    """Test that a failed batch fails the requests that were coalesced into it."""
+    embedder = MicroBatchingEmbedder(embedder=RecordingEmbedder(fail=True))
+
+    results = await asyncio.gather(
+        embedder.embed(texts=["a"]), embedder.embed(texts=["b"]), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.anyio
+async def test_concurrent_matrix_requests_are_coalesced() -> None:
+    """Test that every caller of embed_matrix gets a contiguous matrix of its own."""
+    inner = RecordingEmbedder()
+    embedder = MicroBatchingEmbedder(embedder=inner, max_batch_size=8, max_wait=0.01)
+
+    texts = [["a", "bbb"], ["cc"], ["bbb", "dddd"]]
+    results = await asyncio.gather(*[embedder.embed_matrix(texts=t) for t in texts])
+
+    assert len(inner.batches) == 1
+    for request, matrix in zip(texts, results):
+        assert matrix.shape == (len(request), 1)
+        assert matrix.flags.c_contiguous
+        assert matrix[:, 0].tolist() == [len(text) for text in request]
+
+    assert (await embedder.embed_matrix(texts=[])).shape == (0, 1)
@@ -0,0 +1,102 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import List
+
+import pytest
+from ragathon.pipelines.common import (
+    GenerationMetrics,
+    QueryInfo,
+    RAGPipeline,
+    RAGPipelineConfig,
+    RAGPipelineOutput,
+    RetrievalMetrics,
+)
+from ragathon.pipelines.runner import PipelineBatchRunner
+
+
+class FakePipeline(RAGPipeline):
+    """Answers every query with itself after a delay, and fails on request."""
+
+    def __init__(self, failing: List[str]) -> None:
+        self.queries: List[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._failing = failing
+
+    async def build_or_load(self) -> None:
+        pass
+
+    async def run(self, query: str, max_retrieved_docs: int) -> RAGPipelineOutput:
+        self.queries.append(query)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+        if query in self._failing:
+            raise RuntimeError("The LLM is down")
+
+        return RAGPipelineOutput(
+            config=RAGPipelineConfig(
+                version="1",
+                chunking_method="naive",
+                max_chunk_size=128,
+                chunk_overlap=0,
+                retrieval_method="fake",
+                generation_model_name="fake",
+            ),
+            query_info=QueryInfo(original_query=query),
+            retrieved_chunks=[],
+            generated_answer=query.upper(),
+            retrieval_metrics=RetrievalMetrics(
+                retrieval_method="fake",
+                max_retrieve_docs=max_retrieved_docs,
+                total_chunks_retrieved=0,
+                retrieval_time_ms=0,
+            ),
+            generation_metrics=GenerationMetrics(
+                llm_name="fake",
+                input_token_count=0,
+                output_token_count=0,
+                generation_time_ms=0,
+            ),
+            completed_at=None,
+        )
+
+
+def read_answers(path: Path) -> List[str]:
+    lines = path.read_text().splitlines()
+    return [json.loads(line)["generated_answer"] for line in lines]
+
+
+@pytest.mark.anyio
+async def test_queries_run_concurrently_and_resume(tmp_path: Path) -> None:
+    """Test that outputs are appended, and answered queries are not run again."""
+    output_path = tmp_path / "run" / "result.jsonl"
+    queries = [f"q{i}" for i in range(20)] + ["q0"]
+
+    pipeline = FakePipeline(failing=["q3"])
+    runner = PipelineBatchRunner(
+        pipeline=pipeline, output_path=output_path, max_concurrency=4
+    )
+    summary = await runner.run(queries=queries)
+
+    assert (summary.completed, summary.skipped, summary.failed) == (19, 0, 1)
+    assert pipeline.max_in_flight == 4
+    assert len(pipeline.queries) == 20
+    assert sorted(read_answers(path=output_path)) == sorted(
+        f"Q{i}" for i in range(20) if i != 3
+    )
+
+    # A crash while writing leaves an incomplete line behind
+    with open(output_path, mode="a") as f:
+        f.write('{"config": {"vers')
+
+    pipeline = FakePipeline(failing=[])
+    runner = PipelineBatchRunner(pipeline=pipeline, output_path=output_path)
+    summary = await runner.run(queries=queries)
+
+    assert (summary.completed, summary.skipped, summary.failed) == (1, 20, 0)
+    assert pipeline.queries == ["q3"]
+    assert len(read_answers(path=output_path)) == 20
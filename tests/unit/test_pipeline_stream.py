@@ -0,0 +1,167 @@
+import asyncio
+from pathlib import Path
+from typing import AsyncGenerator, List, Optional, Sequence, Type, TypeVar
+
+import pytest
+from ragathon.data.models import MatchedChunk, SearchResult
+from ragathon.llms.common import LLM, ChatMessage, TokenUsage
+from ragathon.pipelines import sparse_bm25
+from ragathon.pipelines.common import (
+    AnswerFragmentStreamEvent,
+    CompletedStreamEvent,
+    RAGPipelineStreamEvent,
+    RetrievalStreamEvent,
+)
+from ragathon.pipelines.sparse_bm25 import NaiveChunkingBM25Pipeline
+
+T = TypeVar("T")
+
+
+class FakeLLM(LLM):
+    """Streams fixed fragments after a delay, and optionally reports the usage."""
+
+    def __init__(
+        self,
+        fragments: List[str],
+        delay: float,
+        usage: Optional[TokenUsage] = None,
+    ) -> None:
+        self.fragments = fragments
+        self.delay = delay
+        self.usage = usage
+
+    async def chat_stream(
+        self,
+        messages: Sequence[ChatMessage],
+        temperature: Optional[float] = None,
+        usage: Optional[TokenUsage] = None,
+    ) -> AsyncGenerator[str, None]:
+        for fragment in self.fragments:
+            await asyncio.sleep(self.delay)
+            yield fragment
+        if self.usage is not None and usage is not None:
+            usage.prompt_tokens = self.usage.prompt_tokens
+            usage.completion_tokens = self.usage.completion_tokens
+
+    async def chat(
+        self, messages: Sequence[ChatMessage], temperature: Optional[float] = None
+    ) -> str:
+        raise AssertionError("The pipeline should stream the answer")
+
+    async def structured_completion(
+        self,
+        messages: Sequence[ChatMessage],
+        response_model: Type[T],
+        temperature: Optional[float] = None,
+    ) -> T:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeIndex:
+    async def search(self, query: str, k: int) -> SearchResult:
+        return SearchResult(
+            query=query,
+            matches=[
+                MatchedChunk(
+                    chunk_id="c1", section_id="s", chunk_text="text", rank=1, score=1.0
+                )
+            ],
+        )
+
+
+@pytest.fixture
+def pipeline(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> NaiveChunkingBM25Pipeline:
+    llm = FakeLLM(fragments=["The ", "answer ", "is 42."], delay=0.02)
+    monkeypatch.setattr(sparse_bm25, "init_settings", lambda: None)
+    monkeypatch.setattr(sparse_bm25, "instantiate_llm_for_rag", lambda settings: llm)
+    monkeypatch.setattr(sparse_bm25, "BM25Index", lambda **kwargs: FakeIndex())
+
+    return NaiveChunkingBM25Pipeline(
+        markdown_file_path=tmp_path / "doc.json", language="danish", output_dir=tmp_path
+    )
+
+
+@pytest.mark.anyio
+async def test_retrieval_results_are_streamed_before_the_answer(
+    pipeline: NaiveChunkingBM25Pipeline,
+) -> None:
+    """Test that the chunks, the answer fragments and the output come in order."""
+    events: List[RAGPipelineStreamEvent] = [
+        event async for event in pipeline.run_stream(query="q", max_retrieved_docs=3)
+    ]
+
+    assert isinstance(events[0], RetrievalStreamEvent)
+    assert [chunk.chunk_id for chunk in events[0].retrieved_chunks] == ["c1"]
+    assert [
+        event.text for event in events if isinstance(event, AnswerFragmentStreamEvent)
+    ] == ["The ", "answer ", "is 42."]
+    assert isinstance(events[-1], CompletedStreamEvent)
+
+    output = events[-1].output
+    assert output.generated_answer == "The answer is 42."
+    assert output.completed_at is not None
+
+    metrics = output.generation_metrics
+    assert metrics.output_token_count > 0
+    assert metrics.time_to_first_token_ms is not None
+    assert 10 <= metrics.time_to_first_token_ms < metrics.generation_time_ms
+    assert metrics.tokens_per_second is not None and metrics.tokens_per_second > 0
+
+
+@pytest.mark.anyio
+async def test_run_returns_the_streamed_output(
+    pipeline: NaiveChunkingBM25Pipeline,
+) -> None:
+    """Test that the blocking run collects the streamed answer."""
+    output = await pipeline.run(query="q", max_retrieved_docs=3)
+
+    assert output.generated_answer == "The answer is 42."
+    assert output.generation_metrics.time_to_first_token_ms is not None
+
+
+@pytest.mark.anyio
+async def test_empty_fragments_are_skipped(
+    pipeline: NaiveChunkingBM25Pipeline,
+) -> None:
+    """Test that the role-only first chunk does not count as the first token."""
+    llm = FakeLLM(fragments=["", "The ", "answer."], delay=0.02)
+    pipeline._llm = llm
+
+    events: List[RAGPipelineStreamEvent] = [
+        event async for event in pipeline.run_stream(query="q", max_retrieved_docs=3)
+    ]
+
+    assert [
+        event.text for event in events if isinstance(event, AnswerFragmentStreamEvent)
+    ] == ["The ", "answer."]
+    assert isinstance(events[-1], CompletedStreamEvent)
+    metrics = events[-1].output.generation_metrics
+    assert metrics.time_to_first_token_ms is not None
+    # The first non-empty fragment arrives after two delays
+    assert metrics.time_to_first_token_ms >= 30
+
+
+@pytest.mark.anyio
+async def test_token_counts_reported_by_the_llm_are_used(
+    pipeline: NaiveChunkingBM25Pipeline,
+) -> None:
+    """Test that the token counts of the LLM replace the estimates."""
+    usage = TokenUsage(prompt_tokens=123, completion_tokens=7)
+    pipeline._llm = FakeLLM(fragments=["The ", "answer."], delay=0.05, usage=usage)
+
+    output = await pipeline.run(query="q", max_retrieved_docs=3)
+
+    metrics = output.generation_metrics
+    assert metrics.input_token_count == 123
+    assert metrics.output_token_count == 7
+    assert metrics.time_to_first_token_ms is not None
+    assert metrics.tokens_per_second is not None
+    decoding_ms = metrics.generation_time_ms - metrics.time_to_first_token_ms
+    assert metrics.tokens_per_second == pytest.approx(
+        7 / (decoding_ms / 1000), rel=0.2
+    )
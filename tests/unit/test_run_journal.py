@@ -0,0 +1,169 @@
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+from ragathon.pipelines.common import (
+    GenerationMetrics,
+    QueryInfo,
+    RAGPipelineConfig,
+    RAGPipelineOutput,
+    RetrievalMetrics,
+)
+from ragathon.pipelines.journal import (
+    JOURNAL_INDEX_DTYPE,
+    JOURNAL_INDEX_SUFFIX,
+    RunJournal,
+    get_query_id,
+)
+
+
+def make_output(query: str) -> RAGPipelineOutput:
+    return RAGPipelineOutput(
+        config=RAGPipelineConfig(
+            version="1",
+            chunking_method="naive",
+            max_chunk_size=128,
+            chunk_overlap=0,
+            retrieval_method="fake",
+            generation_model_name="fake",
+        ),
+        query_info=QueryInfo(original_query=query),
+        retrieved_chunks=[],
+        generated_answer=query.upper(),
+        retrieval_metrics=RetrievalMetrics(
+            retrieval_method="fake",
+            max_retrieve_docs=5,
+            total_chunks_retrieved=0,
+            retrieval_time_ms=0,
+        ),
+        generation_metrics=GenerationMetrics(
+            llm_name="fake",
+            input_token_count=0,
+            output_token_count=0,
+            generation_time_ms=0,
+        ),
+        completed_at=None,
+    )
+
+
+async def write_journal(log_path: Path, queries: List[str]) -> None:
+    journal = RunJournal(log_path=log_path, sync_interval=2)
+    await journal.open()
+    for query in queries:
+        await journal.append(output=make_output(query=query))
+    await journal.close()
+
+
+async def read_answer(journal: RunJournal, query: str) -> Optional[str]:
+    output = await journal.read(query_id=get_query_id(query=query))
+    return None if output is None else output.generated_answer
+
+
+@pytest.mark.anyio
+async def test_outputs_are_read_back_and_appended_to(tmp_path: Path) -> None:
+    """Test that outputs are found by query ID, before and after reopening."""
+    log_path = tmp_path / "run" / "result.jsonl"
+    await write_journal(log_path=log_path, queries=["q0", "q1", "q2"])
+
+    journal = RunJournal(log_path=log_path)
+    await journal.open()
+    assert len(journal) == 3
+    assert get_query_id(query="q1") in journal
+    assert get_query_id(query="q3") not in journal
+
+    await journal.append(output=make_output(query="q3"))
+    # Appended outputs can be read before the journal is synced
+    assert await read_answer(journal=journal, query="q3") == "Q3"
+    assert await read_answer(journal=journal, query="q1") == "Q1"
+    assert await read_answer(journal=journal, query="q4") is None
+    await journal.close()
+
+    index_path = log_path.with_suffix(JOURNAL_INDEX_SUFFIX)
+    assert index_path.stat().st_size == 4 * JOURNAL_INDEX_DTYPE.itemsize
+    assert len(log_path.read_text().splitlines()) == 4
+
+
+@pytest.mark.anyio
+async def test_journal_recovers_from_a_crash(tmp_path: Path) -> None:
+    """Test that the index and the log are repaired when the journal is opened."""
+    log_path = tmp_path / "result.jsonl"
+    index_path = log_path.with_suffix(JOURNAL_INDEX_SUFFIX)
+    await write_journal(log_path=log_path, queries=["q0", "q1", "q2"])
+
+    # The last line was written but its index record was not
+    index = index_path.read_bytes()
+    index_path.write_bytes(index[: 2 * JOURNAL_INDEX_DTYPE.itemsize + 5])
+    # The next line was written half way
+    with open(log_path, mode="ab") as f:
+        f.write(b'{"config": {"vers')
+
+    journal = RunJournal(log_path=log_path)
+    await journal.open()
+    assert journal.query_ids == [get_query_id(query=f"q{i}") for i in range(3)]
+    assert await read_answer(journal=journal, query="q2") == "Q2"
+    await journal.close()
+
+    assert index_path.read_bytes() == index
+    assert len(log_path.read_text().splitlines()) == 3
+
+    # The log was truncated, e.g. by a crash before it was synced
+    log_path.write_bytes(log_path.read_bytes()[:-10])
+
+    journal = RunJournal(log_path=log_path)
+    await journal.open()
+    assert journal.query_ids == [get_query_id(query=f"q{i}") for i in range(2)]
+    await journal.append(output=make_output(query="q2"))
+    await journal.close()
+
+    assert index_path.read_bytes() == index
+
+
+@pytest.mark.anyio
+async def test_a_log_without_index_is_indexed(tmp_path: Path) -> None:
+    """Test that the JSON Lines file of an older run is indexed when opened."""
+    log_path = tmp_path / "result.jsonl"
+    log_path.write_text(
+        "".join(make_output(query=f"q{i}").model_dump_json() + "\n" for i in range(3))
+    )
+
+    journal = RunJournal(log_path=log_path)
+    await journal.open()
+    assert len(journal) == 3
+    assert await read_answer(journal=journal, query="q0") == "Q0"
+    await journal.close()
+
+    index_path = log_path.with_suffix(JOURNAL_INDEX_SUFFIX)
+    assert index_path.stat().st_size == 3 * JOURNAL_INDEX_DTYPE.itemsize
+
+
+@pytest.mark.anyio
+async def test_read_only_journal_leaves_the_files_unchanged(tmp_path: Path) -> None:
+    """Test that a read-only journal is loaded without repairing or creating files."""
+    log_path = tmp_path / "result.jsonl"
+    index_path = log_path.with_suffix(JOURNAL_INDEX_SUFFIX)
+    await write_journal(log_path=log_path, queries=["q0", "q1", "q2"])
+
+    # The last line was not indexed, and the next one is being written
+    index_path.write_bytes(index_path.read_bytes()[: 2 * JOURNAL_INDEX_DTYPE.itemsize])
+    with open(log_path, mode="ab") as f:
+        f.write(b'{"config": {"vers')
+    log, index = log_path.read_bytes(), index_path.read_bytes()
+
+    journal = RunJournal(log_path=log_path, read_only=True)
+    await journal.open()
+    assert journal.query_ids == [get_query_id(query=f"q{i}") for i in range(3)]
+    assert await read_answer(journal=journal, query="q2") == "Q2"
+    with pytest.raises(ValueError, match="read-only"):
+        await journal.append(output=make_output(query="q3"))
+    await journal.close()
+
+    assert log_path.read_bytes() == log
+    assert index_path.read_bytes() == index
+
+    # A run without an index is read without creating one
+    index_path.unlink()
+    journal = RunJournal(log_path=log_path, read_only=True)
+    await journal.open()
+    assert len(journal) == 3
+    await journal.close()
+    assert not index_path.exists()
@@ -0,0 +1,142 @@
+import random
+from pathlib import Path
+from typing import List
+
+import pytest
+from nltk.stem.api import StemmerI
+from ragathon.data.models import ChunkedText, ChunkedTextSet, ChunkingMethod
+from ragathon.indexing.analyzer import BM25Analyzer
+from ragathon.indexing.bm25 import BM25Index
+from ragathon.indexing.sharded import ShardedBM25Index, shard_for_section
+
+WORDS = [
+    "persondata",
+    "behandling",
+    "samtykke",
+    "sletning",
+    "opbevaring",
+    "indsigt",
+    "klage",
+    "tilsyn",
+    "sikkerhed",
+    "brud",
+]
+
+
+class IdentityStemmer(StemmerI):
+    def stem(self, token: str) -> str:
+        return token
+
+
+@pytest.fixture(autouse=True)
+def analyzer(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Avoid depending on the NLTK stop word corpus being downloaded
+    monkeypatch.setattr(
+        BM25Analyzer,
+        "for_language",
+        classmethod(
+            lambda cls, language: cls(stemmer=IdentityStemmer(), stop_words=["og"])
+        ),
+    )
+
+
+@pytest.fixture
+def data_set() -> ChunkedTextSet:
+    # All chunks have the same length, so every shard has the same average document
+    # length as the entire data set
+    rng = random.Random(42)
+    chunks: List[ChunkedText] = [
+        ChunkedText(section_id=f"section-{i % 13}", text=" ".join(rng.sample(WORDS, 4)))
+        for i in range(200)
+    ]
+    return ChunkedTextSet(chunking_method=ChunkingMethod.NAIVE, chunks=chunks)
+
+
+def test_shard_for_section_is_stable() -> None:
+    """Test that sections are always assigned to the same shard."""
+    shards = [shard_for_section(section_id="abc", n_shards=7) for _ in range(3)]
+    assert len(set(shards)) == 1
+    assert 0 <= shards[0] < 7
+
+
+@pytest.mark.anyio
+async def test_matches_unsharded_index(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that sharding does not change the scores of the matches."""
+    index = BM25Index(storage_dir=tmp_path / "single", language="danish")
+    await index.create(data_set=data_set)
+    await index.load()
+
+    sharded = ShardedBM25Index(
+        storage_dir=tmp_path / "sharded", language="danish", n_shards=3
+    )
+    await sharded.create(data_set=data_set)
+    assert await sharded.exists()
+    await sharded.load()
+
+    queries = ["samtykke og sletning", "brud på sikkerhed", "klage"]
+    expected = await index.search_many(queries=queries, k=5)
+    actual = await sharded.search_many(queries=queries, k=5)
+    await sharded.close()
+
+    for expected_result, actual_result in zip(expected, actual):
+        assert [match.rank for match in actual_result.matches] == [1, 2, 3, 4, 5]
+        assert [match.score for match in actual_result.matches] == pytest.approx(
+            [match.score for match in expected_result.matches], rel=1e-5
+        )
+
+
+@pytest.mark.anyio
+async def test_is_searchable_after_create(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that a created index can be searched without loading it, and recreated."""
+    sharded = ShardedBM25Index(storage_dir=tmp_path, language="danish", n_shards=3)
+    for _ in range(2):
+        await sharded.create(data_set=data_set)
+        results = await sharded.search_many(queries=["klage", "tilsyn"], k=5)
+        assert [len(result.matches) for result in results] == [5, 5]
+    await sharded.close()
+
+
+@pytest.mark.anyio
+async def test_rebuilt_shard_keeps_the_global_statistics(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that a shard scores its changes like the unsharded index, also merged."""
+    index = BM25Index(storage_dir=tmp_path / "single", language="danish")
+    await index.create(data_set=data_set)
+    await index.load()
+
+    sharded = ShardedBM25Index(
+        storage_dir=tmp_path / "sharded", language="danish", n_shards=3
+    )
+    await sharded.create(data_set=data_set)
+    await sharded.close()
+    shard = BM25Index(
+        storage_dir=tmp_path
+        / "sharded"
+        / f"shard-{shard_for_section(section_id='section-0', n_shards=3)}",
+        language="danish",
+        stem_table_dir=tmp_path / "sharded",
+    )
+    await shard.load()
+
+    new_chunk = ChunkedText(section_id="section-0", text="klage tilsyn brud indsigt")
+    for changed in [index, shard]:
+        await changed.add(chunks=[new_chunk])
+        await changed.delete(chunk_ids=[data_set.chunks[0].id])
+
+    for merged in [False, True]:
+        if merged:
+            await index.merge()
+            await shard.merge()
+
+        expected = await index.search(query="klage og brud", k=len(data_set.chunks))
+        actual = await shard.search(query="klage og brud", k=len(data_set.chunks))
+        expected_scores = {match.chunk_id: match.score for match in expected.matches}
+        assert new_chunk.id in {match.chunk_id for match in actual.matches}
+        assert [match.score for match in actual.matches] == pytest.approx(
+            [expected_scores[match.chunk_id] for match in actual.matches], rel=1e-5
+        )
@@ -0,0 +1,38 @@
+import sqlite3
+from pathlib import Path
+from typing import List
+
+import pytest
+from ragathon.utils.sqlite import SQLITE_BATCH_SIZE, SqliteDatabase, select_many
+
+
+def insert(connection: sqlite3.Connection, keys: List[str]) -> None:
+    connection.executemany(
+        "INSERT INTO entries (key, value) VALUES (?, ?)",
+        [(key, len(key)) for key in keys],
+    )
+    connection.commit()
+
+
+@pytest.mark.anyio
+async def test_rows_are_selected_in_batches(tmp_path: Path) -> None:
+    """Test that more keys than fit in one statement are selected, with parameters."""
+    database = SqliteDatabase(
+        database_path=tmp_path / "cache" / "entries.db",
+        schema="CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value INT)",
+    )
+    keys = [f"key-{i}" for i in range(2 * SQLITE_BATCH_SIZE + 1)]
+    await database.run(insert, keys)
+
+    rows = await database.run(
+        lambda connection: select_many(
+            connection=connection,
+            query="SELECT key FROM entries WHERE key IN ({placeholders}) AND value > ?",
+            keys=keys + ["missing"],
+            parameters=[5],
+        )
+    )
+    assert sorted(key for (key,) in rows) == sorted(
+        key for key in keys if len(key) > 5
+    )
+    await database.close()
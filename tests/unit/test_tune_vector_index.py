@@ -0,0 +1,187 @@
+import zlib
+from pathlib import Path
+from typing import Any, List, Tuple
+
+import numpy as np
+import pytest
+from numpy.typing import NDArray
+from ragathon.data.models import ChunkedText, ChunkedTextSet, ChunkingMethod
+from ragathon.indexing.flat import EMBEDDINGS_FILE_NAME
+from ragathon.indexing.hnsw import (
+    HNSW_INDEX_FILE_NAME,
+    HNSW_LINKS_FILE_PATTERN,
+    HNSWGraph,
+)
+from ragathon.indexing.vector import (
+    VECTOR_INDEX_FILE_NAME,
+    AnnoyParameters,
+    ANNParameters,
+    HNSWParameters,
+    VectorIndex,
+    VectorIndexBackend,
+    current_version_dir,
+)
+from ragathon.llms.common import Embedder
+from tools.tune_vector_index import (
+    TrialResult,
+    TuningReport,
+    VectorIndexTunerCLI,
+    choose_trial,
+    mark_pareto_front,
+)
+
+EMBEDDING_SIZE = 16
+
+
+class FakeEmbedder(Embedder):
+    """Deterministic random embeddings per text."""
+
+    async def embed(self, texts: List[str]) -> List[NDArray[np.float32]]:
+        return [
+            np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+            .normal(size=EMBEDDING_SIZE)
+            .astype(np.float32)
+            for text in texts
+        ]
+
+    def get_embedding_size(self) -> int:
+        return EMBEDDING_SIZE
+
+
+@pytest.fixture
+def data_set() -> ChunkedTextSet:
+    chunks = [ChunkedText(section_id=f"s{i}", text=f"chunk {i}") for i in range(50)]
+    return ChunkedTextSet(chunking_method=ChunkingMethod.NAIVE, chunks=chunks)
+
+
+def make_trial(n_trees: int, recall: float, p95_latency_ms: float) -> TrialResult:
+    return TrialResult(
+        backend=VectorIndexBackend.ANNOY,
+        parameters=ANNParameters(annoy=AnnoyParameters(n_trees=n_trees)),
+        build_seconds=0.0,
+        recall=recall,
+        p50_latency_ms=p95_latency_ms / 2,
+        p95_latency_ms=p95_latency_ms,
+    )
+
+
+def test_pareto_front_and_chosen_trial() -> None:
+    """Test that dominated trials are marked, and the fastest good trial is chosen."""
+    trials = [
+        make_trial(n_trees=1, recall=0.80, p95_latency_ms=1.0),
+        make_trial(n_trees=2, recall=0.90, p95_latency_ms=2.0),
+        # Slower than the previous trial without a better recall
+        make_trial(n_trees=3, recall=0.90, p95_latency_ms=3.0),
+        make_trial(n_trees=4, recall=0.99, p95_latency_ms=5.0),
+    ]
+
+    mark_pareto_front(trials=trials)
+    assert [trial.pareto_optimal for trial in trials] == [True, True, False, True]
+
+    paths = [Path(f"annoy-{i}.ann") for i in range(len(trials))]
+    chosen = choose_trial(trials=list(zip(trials, paths)), target_recall=0.85)
+    assert chosen == (trials[1], paths[1])
+    assert choose_trial(trials=list(zip(trials, paths)), target_recall=1.0) is None
+
+
+@pytest.mark.anyio
+async def test_applied_annoy_index_is_loaded(
+    data_set: ChunkedTextSet, tmp_path: Path
+) -> None:
+    """Test that the chosen index and parameters are installed in the index dir."""
+    embedder = FakeEmbedder()
+    await VectorIndex(
+        storage_dir=tmp_path / "index",
+        embedder=embedder,
+        backend=VectorIndexBackend.ANNOY,
+        annoy_parameters=AnnoyParameters(n_trees=1),
+    ).create(data_set=data_set)
+
+    tuner = VectorIndexTunerCLI(
+        index_dir=tmp_path / "index",
+        output_path=tmp_path / "report.json",
+        backend=VectorIndexBackend.ANNOY,
+        k=5,
+        target_recall=0.0,
+        n_queries=20,
+        n_trees=[5],
+        search_k=[200],
+        apply=True,
+    )
+    await tuner.run()
+
+    report = TuningReport.model_validate_json((tmp_path / "report.json").read_text())
+    assert report.chosen is not None
+    assert report.chosen.parameters.annoy.n_trees == 5
+    # The chosen index is installed as a new version, next to the previous one
+    data_dir = current_version_dir(tmp_path / "index")
+    assert (data_dir / VECTOR_INDEX_FILE_NAME).exists()
+    assert len([path for path in (tmp_path / "index").iterdir() if path.is_dir()]) == 2
+
+    index = VectorIndex(storage_dir=tmp_path / "index", embedder=embedder)
+    await index.load()
+    assert index.uses_ann
+    assert index.parameters.annoy == report.chosen.parameters.annoy
+    result = await index.search(query="chunk 7", k=5)
+    assert result.matches[0].section_id == "s7"
+
+
+@pytest.mark.parametrize("built_backend", ["annoy", "hnsw"])
+@pytest.mark.anyio
+async def test_applied_hnsw_graph_is_loaded(
+    data_set: ChunkedTextSet,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    built_backend: str,
+) -> None:
+    """Test that both files of the chosen graph replace the index of the dir."""
+    embedder = FakeEmbedder()
+    await VectorIndex(
+        storage_dir=tmp_path / "index",
+        embedder=embedder,
+        backend=VectorIndexBackend(built_backend),
+        hnsw_parameters=HNSWParameters(m=16),
+    ).create(data_set=data_set)
+
+    tuner = VectorIndexTunerCLI(
+        index_dir=tmp_path / "index",
+        output_path=tmp_path / "report.json",
+        backend=VectorIndexBackend.HNSW,
+        k=5,
+        target_recall=0.0,
+        n_queries=20,
+        # The last graph built is not the chosen one
+        m=[4, 8],
+        ef_construction=[50],
+        ef_search=[64],
+        apply=True,
+    )
+    tune_hnsw = tuner._tune_hnsw
+
+    def tune_hnsw_preferring_m_4(**kwargs: Any) -> List[Tuple[TrialResult, Path]]:
+        trials = tune_hnsw(**kwargs)
+        for trial, _ in trials:
+            if trial.parameters.hnsw.m == 4:
+                trial.p95_latency_ms = 0.0
+        return trials
+
+    monkeypatch.setattr(tuner, "_tune_hnsw", tune_hnsw_preferring_m_4)
+    await tuner.run()
+
+    index = VectorIndex(storage_dir=tmp_path / "index", embedder=embedder)
+    await index.load()
+    assert index.uses_ann
+    assert index.parameters.hnsw.m == 4
+    data_dir = current_version_dir(tmp_path / "index")
+    assert not (data_dir / VECTOR_INDEX_FILE_NAME).exists()
+
+    graph = HNSWGraph.load(
+        path=data_dir / HNSW_INDEX_FILE_NAME,
+        vectors=np.load(data_dir / EMBEDDINGS_FILE_NAME, mmap_mode="r"),
+    )
+    assert graph.m == 4
+    # The bottom layer links have 2 * m columns
+    assert graph._links_0.shape == (len(data_set.chunks), 8)
+    assert len(list(data_dir.glob(HNSW_LINKS_FILE_PATTERN))) == 1
+    result = await index.search(query="chunk 7", k=5)
+    assert result.matches[0].section_id == "s7"
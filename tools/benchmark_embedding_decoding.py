@@ -0,0 +1,143 @@
+import base64
+import json
+import time
+from typing import List
+
+import anyio
+import click
+import numpy as np
+from aiohttp import web
+from loguru import logger
+from numpy.typing import NDArray
+from openai import AsyncAzureOpenAI
+from ragathon.llms.azure import decode_embeddings
+
+API_VERSION = "2024-02-01"
+DEPLOYMENT_ID = "embedding"
+
+
+def create_fake_endpoint(vectors: NDArray[np.float32]) -> web.Application:
+    """Create an app that answers embedding requests like Azure OpenAI.
+
+    The response bodies are encoded once up front, so the benchmark measures the
+    client rather than the server.
+
+    Args:
+        vectors (NDArray[np.float32]): The embeddings returned for every request.
+
+    Returns:
+        web.Application: The app.
+    """
+    bodies = {}
+    for encoding_format in ["float", "base64"]:
+        data = [
+            {
+                "object": "embedding",
+                "index": i,
+                "embedding": (
+                    base64.b64encode(vector.tobytes()).decode()
+                    if encoding_format == "base64"
+                    else vector.tolist()
+                ),
+            }
+            for i, vector in enumerate(vectors)
+        ]
+        bodies[encoding_format] = json.dumps(
+            {
+                "object": "list",
+                "data": data,
+                "model": "fake",
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        ).encode()
+
+    async def embeddings(request: web.Request) -> web.Response:
+        payload = await request.json()
+        body = bodies[payload.get("encoding_format", "float")]
+        return web.Response(body=body, content_type="application/json")
+
+    app = web.Application(client_max_size=1024**3)
+    app.router.add_post(f"/openai/deployments/{DEPLOYMENT_ID}/embeddings", embeddings)
+    return app
+
+
+async def embed_default(
+    client: AsyncAzureOpenAI, texts: List[str], dimensions: int
+) -> List[NDArray[np.float32]]:
+    """Embed texts the way the embedder did before, without an encoding format.
+
+    The SDK then requests base64 itself, but decodes every embedding into a list of
+    Python floats, which the embedder converted back into an array.
+    """
+    result = await client.embeddings.create(
+        model="fake", input=texts, dimensions=dimensions
+    )
+    return [
+        np.array(embedding.embedding, dtype=np.float32) for embedding in result.data
+    ]
+
+
+async def embed_base64(
+    client: AsyncAzureOpenAI, texts: List[str], dimensions: int
+) -> NDArray[np.float32]:
+    """Embed texts as base64 and decode them into one matrix."""
+    result = await client.embeddings.create(
+        model="fake", input=texts, dimensions=dimensions, encoding_format="base64"
+    )
+    return decode_embeddings(data=result.data)
+
+
+async def run_benchmark(batch_size: int, dimensions: int, repeats: int) -> None:
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(batch_size, dimensions)).astype(np.float32)
+    texts = [f"text {i}" for i in range(batch_size)]
+
+    runner = web.AppRunner(create_fake_endpoint(vectors=vectors))
+    await runner.setup()
+    site = web.TCPSite(runner, host="127.0.0.1", port=0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # pyre-ignore[16]
+
+    client = AsyncAzureOpenAI(
+        api_key="fake",
+        api_version=API_VERSION,
+        azure_endpoint=f"http://127.0.0.1:{port}",
+        azure_deployment=DEPLOYMENT_ID,
+    )
+
+    try:
+        for name, embed in [("default", embed_default), ("base64", embed_base64)]:
+            # Warm up the connection
+            embeddings = await embed(client, texts, dimensions)
+            assert np.array_equal(np.vstack(embeddings), vectors)
+
+            timings: List[float] = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                await embed(client, texts, dimensions)
+                timings.append(time.perf_counter() - start)
+
+            logger.info(
+                f"{name:<8} median {np.median(timings) * 1000:8.1f} ms, "
+                f"min {np.min(timings) * 1000:8.1f} ms per batch of {batch_size}"
+            )
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+@click.command()
+@click.option("-b", "--batch-size", type=int, default=512, help="Texts per request.")
+@click.option("-d", "--dimensions", type=int, default=3072, help="Embedding size.")
+@click.option("-r", "--repeats", type=int, default=10, help="Timed requests per format.")
+def main(batch_size: int, dimensions: int, repeats: int) -> None:
+    async def run_main() -> None:
+        await run_benchmark(
+            batch_size=batch_size, dimensions=dimensions, repeats=repeats
+        )
+
+    anyio.run(run_main)
+
+
+if __name__ == "__main__":
+    main()
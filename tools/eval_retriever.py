@@ -1,6 +1,7 @@
+import asyncio
 from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import anyio
 import click
@@ -14,11 +15,15 @@ from ragathon.data.models import (
     EvaluatedQuery,
     MetricScore,
     RetrievalEvaluation,
+    SearchResult,
 )
 from ragathon.indexing import Indexer
 from ragathon.indexing.bm25 import BM25Index
-from ragathon.indexing.vector import VECTOR_INDEX_FILE_NAME, VectorIndex
+from ragathon.indexing.cache import CachedIndexer
+from ragathon.indexing.hybrid import FusionMethod, HybridIndex
+from ragathon.indexing.vector import VectorIndex, is_vector_index
 from ragathon.llms.azure import instantiate_embedder
+from ragathon.llms.cache import CachedEmbedder
 from ragathon.llms.common import Embedder
 
 
@@ -113,11 +118,21 @@ class RetrievalEvaluatorCLI:
         annotation_set_file_path: Path,
         k_values: List[int],
         output_path: Path,
+        cache_path: Optional[Path] = None,
+        embedding_cache_path: Optional[Path] = None,
+        bm25_index_dir: Optional[Path] = None,
+        fusion: str = FusionMethod.RRF.value,
+        concurrency: int = 1,
     ) -> None:
         self._index_dir: Path = index_dir
+        self._bm25_index_dir: Optional[Path] = bm25_index_dir
+        self._fusion: FusionMethod = FusionMethod(fusion)
+        self._cache_path: Optional[Path] = cache_path
+        self._embedding_cache_path: Optional[Path] = embedding_cache_path
         self._annotation_set_file_path: Path = annotation_set_file_path
         self._output_path: Path = output_path
         self._k_values: List[int] = k_values
+        self._concurrency: int = concurrency
 
         if not self._annotation_set_file_path.exists():
             raise FileNotFoundError(f"File {self._annotation_set_file_path} not found.")
@@ -125,18 +140,53 @@ class RetrievalEvaluatorCLI:
         if not self._index_dir.exists():
             raise FileNotFoundError(f"Directory {self._index_dir} not found.")
 
+        if self._bm25_index_dir is not None and not is_vector_index(
+            storage_dir=self._index_dir
+        ):
+            raise ValueError(
+                "A BM25 index can only be fused with a vector index, but "
+                f"{self._index_dir} is not one."
+            )
+
     async def run(self) -> None:
         annotations: AnnotationSet = await self._load_annotations()
 
-        vector_index_file_path = self._index_dir / VECTOR_INDEX_FILE_NAME
-        if vector_index_file_path.exists():
+        embedder: Optional[Embedder] = None
+        if is_vector_index(storage_dir=self._index_dir):
             app_settings: Settings = init_settings()
-            embedder: Embedder = instantiate_embedder(settings=app_settings)
+            # Reuse the question embeddings across runs and indices, and coalesce the
+            # embedding requests of concurrent searches
+            embedder = instantiate_embedder(
+                settings=app_settings,
+                cache_path=self._embedding_cache_path,
+                micro_batching=self._concurrency > 1,
+            )
             index: Indexer = VectorIndex(storage_dir=self._index_dir, embedder=embedder)
+
+            if self._bm25_index_dir is not None:
+                index = HybridIndex(
+                    sparse=BM25Index(
+                        storage_dir=self._bm25_index_dir, language="danish", mmap=True
+                    ),
+                    dense=index,
+                    fusion=self._fusion,
+                )
         else:
-            index: Indexer = BM25Index(storage_dir=self._index_dir, language="danish")
+            index: Indexer = BM25Index(
+                storage_dir=self._index_dir, language="danish", mmap=True
+            )
+
+        if self._cache_path is not None:
+            # Reuse the search results of previous runs against the same index
+            index = CachedIndexer(index=index, ttl=None, database_path=self._cache_path)
 
-        await self._run_internal(annotations=annotations, index=index)
+        try:
+            await self._run_internal(annotations=annotations, index=index)
+        finally:
+            if isinstance(index, CachedIndexer):
+                await index.close()
+            if isinstance(embedder, CachedEmbedder):
+                await embedder.close()
 
     async def _run_internal(self, annotations: AnnotationSet, index: Indexer) -> None:
         await index.load()
@@ -145,7 +195,16 @@ class RetrievalEvaluatorCLI:
 
         evaluated_queries: List[EvaluatedQuery] = []
 
-        for item in annotations.items:
+        questions = [item.question for item in annotations.items]
+        if self._concurrency > 1:
+            search_results = await self._search_concurrently(
+                index=index, queries=questions, k=max_k
+            )
+        else:
+            # Search for all questions in one batch to avoid the per-query overhead
+            search_results = await index.search_many(queries=questions, k=max_k)
+
+        for item, search_result in zip(annotations.items, search_results):
             evaluated_query = EvaluatedQuery(
                 annotation_id=item.id,
                 question=item.question,
@@ -153,7 +212,6 @@ class RetrievalEvaluatorCLI:
             )
             evaluated_queries.append(evaluated_query)
 
-            search_result = await index.search(query=item.question, k=max_k)
             for match in search_result.matches:
                 evaluated_query.retrieved_chunks.append(match)
 
@@ -164,6 +222,18 @@ class RetrievalEvaluatorCLI:
         async with aio_open(self._output_path, mode="w") as file:
             await file.write(evaluation.model_dump_json(indent=2))
 
+    async def _search_concurrently(
+        self, index: Indexer, queries: List[str], k: int
+    ) -> List[SearchResult]:
+        """Search for every query on its own, like concurrent users of a service."""
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def search(query: str) -> SearchResult:
+            async with semaphore:
+                return await index.search(query=query, k=k)
+
+        return await asyncio.gather(*[search(query=query) for query in queries])
+
     async def _load_annotations(self) -> AnnotationSet:
         async with aio_open(self._annotation_set_file_path, mode="r") as file:
             content = await file.read()
@@ -310,6 +380,50 @@ class RetrievalEvaluatorCLI:
     ),
     help="Where to save the output file.",
 )
+@click.option(
+    "-c",
+    "--cache-path",
+    required=False,
+    type=click.Path(
+        exists=False, file_okay=True, dir_okay=False, writable=True, path_type=Path
+    ),
+    help="SQLite database caching the search results between runs.",
+)
+@click.option(
+    "-e",
+    "--embedding-cache-path",
+    required=False,
+    type=click.Path(
+        exists=False, file_okay=True, dir_okay=False, writable=True, path_type=Path
+    ),
+    help="SQLite database caching the question embeddings between runs.",
+)
+@click.option(
+    "-b",
+    "--bm25-index-dir",
+    required=False,
+    type=click.Path(
+        exists=True, file_okay=False, dir_okay=True, readable=True, path_type=Path
+    ),
+    help="BM25 index to fuse with the vector index, for hybrid search.",
+)
+@click.option(
+    "-f",
+    "--fusion",
+    type=click.Choice([method.value for method in FusionMethod]),
+    default=FusionMethod.RRF.value,
+    show_default=True,
+    help="How the results of a hybrid search are fused.",
+)
+@click.option(
+    "-j",
+    "--concurrency",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of questions searched concurrently, one search each. With more "
+    "than one, the embedding requests of concurrent searches are batched.",
+)
 def main(**kwargs) -> None:  # pyre-ignore [2]
     async def run_main() -> None:
         cli = RetrievalEvaluatorCLI(**kwargs)
@@ -0,0 +1,93 @@
+import json
+from pathlib import Path
+from typing import List
+
+import anyio
+import click
+from aiofiles import open as aio_open
+from loguru import logger
+from ragathon.config import Settings, init_settings
+from ragathon.data.models import AnnotationSet, SyntheticQuestionSet
+from ragathon.llms.azure import instantiate_embedder
+from ragathon.llms.cache import CachedEmbedder
+
+
+class QueryEmbeddingPrecomputerCLI:
+    def __init__(
+        self, questions_file_path: Path, embedding_cache_path: Path, batch_size: int
+    ) -> None:
+        self._questions_file_path: Path = questions_file_path
+        self._embedding_cache_path: Path = embedding_cache_path
+        self._batch_size: int = batch_size
+
+        if not self._questions_file_path.exists():
+            raise FileNotFoundError(f"File {self._questions_file_path} not found.")
+
+    async def run(self) -> None:
+        questions = await self._load_questions()
+
+        app_settings: Settings = init_settings()
+        embedder = instantiate_embedder(
+            settings=app_settings, cache_path=self._embedding_cache_path
+        )
+        assert isinstance(embedder, CachedEmbedder)
+
+        n_embedded = await embedder.precompute(
+            texts=questions, batch_size=self._batch_size
+        )
+        await embedder.close()
+
+        logger.info(
+            f"Embedded {n_embedded} new questions, "
+            f"{len(set(questions)) - n_embedded} were already cached"
+        )
+
+    async def _load_questions(self) -> List[str]:
+        async with aio_open(self._questions_file_path, mode="r") as file:
+            content = await file.read()
+
+        # Accept both annotation sets and synthetic question sets
+        if "items" in json.loads(content):
+            annotations = AnnotationSet.model_validate_json(json_data=content)
+            return [item.question for item in annotations.items]
+
+        question_set = SyntheticQuestionSet.model_validate_json(json_data=content)
+        return [question.question for question in question_set.questions]
+
+
+@click.command()
+@click.option(
+    "-q",
+    "--questions-file-path",
+    type=click.Path(
+        exists=True, file_okay=True, dir_okay=False, readable=True, path_type=Path
+    ),
+    required=True,
+    help="Location of the annotation set or synthetic question set.",
+)
+@click.option(
+    "-c",
+    "--embedding-cache-path",
+    required=True,
+    type=click.Path(
+        exists=False, file_okay=True, dir_okay=False, writable=True, path_type=Path
+    ),
+    help="SQLite database where the embeddings are stored.",
+)
+@click.option(
+    "-b",
+    "--batch-size",
+    type=int,
+    default=1000,
+    help="The number of questions embedded at once.",
+)
+def main(**kwargs) -> None:  # pyre-ignore [2]
+    async def run_main() -> None:
+        cli = QueryEmbeddingPrecomputerCLI(**kwargs)
+        await cli.run()
+
+    anyio.run(run_main)
+
+
+if __name__ == "__main__":
+    main()
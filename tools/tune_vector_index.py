@@ -0,0 +1,513 @@
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import anyio
+import click
+import numpy as np
+from aiofiles import open as aio_open
+from click_params import IntListParamType
+from loguru import logger
+from numpy.typing import NDArray
+from pydantic import BaseModel, Field
+from ragathon.config import Settings, init_settings
+from ragathon.data.models import AnnotationSet
+from ragathon.indexing.flat import EMBEDDINGS_FILE_NAME, normalize_embeddings, top_k
+from ragathon.indexing.hnsw import (
+    HNSW_INDEX_FILE_NAME,
+    HNSW_LINKS_FILE_PATTERN,
+    HNSWGraph,
+)
+from ragathon.indexing.vector import (
+    ANN_PARAMETERS_FILE_NAME,
+    VECTOR_INDEX_FILE_NAME,
+    AnnoyParameters,
+    ANNParameters,
+    HNSWParameters,
+    VectorIndexBackend,
+    build_annoy_index,
+    build_hnsw_graph,
+    create_version_dir,
+    current_version_dir,
+    read_ann_parameters,
+    search_annoy_index,
+    switch_version,
+    write_ann_parameters,
+)
+from ragathon.llms.azure import instantiate_embedder
+
+
+class TrialResult(BaseModel):
+    """The recall and latency of one set of parameters."""
+
+    backend: VectorIndexBackend = Field(..., description="The approximate index.")
+    parameters: ANNParameters = Field(..., description="The tested parameters.")
+    build_seconds: float = Field(..., description="Time to build the index.")
+    recall: float = Field(..., description="Mean recall@k against exact search.")
+    p50_latency_ms: float = Field(..., description="Median latency of one query.")
+    p95_latency_ms: float = Field(..., description="95th percentile latency.")
+    pareto_optimal: bool = Field(
+        default=False, description="Whether no other trial is better in both."
+    )
+
+
+class TuningReport(BaseModel):
+    """The results of a parameter search for a vector index."""
+
+    k: int = Field(..., description="The number of results per query.")
+    n_chunks: int = Field(..., description="The number of indexed chunks.")
+    n_queries: int = Field(..., description="The number of queries.")
+    target_recall: float = Field(..., description="The minimum accepted recall.")
+    trials: List[TrialResult] = Field(default_factory=list, description="All trials.")
+    chosen: Optional[TrialResult] = Field(
+        default=None, description="The fastest trial that reaches the target recall."
+    )
+
+
+def mark_pareto_front(trials: List[TrialResult]) -> None:
+    """Mark the trials that no other trial beats in both recall and p95 latency.
+
+    Args:
+        trials (List[TrialResult]): The trials.
+    """
+    for trial in trials:
+        trial.pareto_optimal = not any(
+            other.recall >= trial.recall
+            and other.p95_latency_ms <= trial.p95_latency_ms
+            and (
+                other.recall > trial.recall
+                or other.p95_latency_ms < trial.p95_latency_ms
+            )
+            for other in trials
+        )
+
+
+def choose_trial(
+    trials: List[Tuple[TrialResult, Path]], target_recall: float
+) -> Optional[Tuple[TrialResult, Path]]:
+    """Choose the trial with the lowest p95 latency that reaches the target recall.
+
+    Args:
+        trials (List[Tuple[TrialResult, Path]]): The trials, with the path of their
+            index.
+        target_recall (float): The minimum accepted recall.
+
+    Returns:
+        Optional[Tuple[TrialResult, Path]]: The chosen trial with the path of its
+            index, or None if no trial reaches the target recall.
+    """
+    accepted = [item for item in trials if item[0].recall >= target_recall]
+    if len(accepted) == 0:
+        return None
+    return min(accepted, key=lambda item: item[0].p95_latency_ms)
+
+
+def link_file(source: Path, path: Path) -> None:
+    """Add a file of the current version of an index to a new version.
+
+    The files of a version are never modified in place, so the versions share them
+    as hard links when the file system supports it, and copies otherwise.
+
+    Args:
+        source (Path): The file of the current version.
+        path (Path): The path of the file in the new version.
+    """
+    try:
+        os.link(source, path)
+    except OSError:
+        shutil.copyfile(source, path)
+
+
+class VectorIndexTunerCLI:
+    def __init__(
+        self,
+        index_dir: Path,
+        output_path: Path,
+        backend: VectorIndexBackend,
+        k: int,
+        target_recall: float,
+        n_queries: int,
+        annotation_set_file_path: Optional[Path] = None,
+        embedding_cache_path: Optional[Path] = None,
+        n_trees: Optional[List[int]] = None,
+        search_k: Optional[List[int]] = None,
+        m: Optional[List[int]] = None,
+        ef_construction: Optional[List[int]] = None,
+        ef_search: Optional[List[int]] = None,
+        apply: bool = False,
+    ) -> None:
+        self._index_dir: Path = index_dir
+        self._output_path: Path = output_path
+        self._backend: VectorIndexBackend = VectorIndexBackend(backend)
+        self._k: int = k
+        self._target_recall: float = target_recall
+        self._n_queries: int = n_queries
+        self._annotation_set_file_path: Optional[Path] = annotation_set_file_path
+        self._embedding_cache_path: Optional[Path] = embedding_cache_path
+        self._n_trees: List[int] = n_trees or [5, 10, 25, 50]
+        self._search_k: List[int] = search_k or [100, 500, 1000, 5000, 20000]
+        self._m: List[int] = m or [8, 16, 32]
+        self._ef_construction: List[int] = ef_construction or [100, 200]
+        self._ef_search: List[int] = ef_search or [16, 32, 64, 128, 256]
+        self._apply: bool = apply
+
+        if self._backend not in [VectorIndexBackend.ANNOY, VectorIndexBackend.HNSW]:
+            raise ValueError("Only the Annoy and HNSW backends can be tuned.")
+
+        data_dir = current_version_dir(storage_dir=self._index_dir)
+        if not (data_dir / EMBEDDINGS_FILE_NAME).exists():
+            raise FileNotFoundError(
+                f"No embeddings found in {self._index_dir}. Please recreate the index."
+            )
+
+    async def run(self) -> None:
+        data_dir = current_version_dir(storage_dir=self._index_dir)
+        embeddings = np.load(data_dir / EMBEDDINGS_FILE_NAME, mmap_mode="r")
+        queries = await self._load_queries(embeddings=embeddings)
+        truth, _ = top_k(similarities=queries @ embeddings.T, k=self._k)
+
+        report = TuningReport(
+            k=self._k,
+            n_chunks=len(embeddings),
+            n_queries=len(queries),
+            target_recall=self._target_recall,
+        )
+
+        with tempfile.TemporaryDirectory() as temporary_dir:
+            chosen_path: Optional[Path] = None
+
+            if self._backend == VectorIndexBackend.ANNOY:
+                trials = self._tune_annoy(
+                    embeddings=embeddings,
+                    queries=queries,
+                    truth=truth,
+                    storage_dir=Path(temporary_dir),
+                )
+            else:
+                trials = self._tune_hnsw(
+                    embeddings=embeddings,
+                    queries=queries,
+                    truth=truth,
+                    storage_dir=Path(temporary_dir),
+                )
+
+            for trial, _ in trials:
+                report.trials.append(trial)
+            mark_pareto_front(trials=report.trials)
+
+            chosen = choose_trial(trials=trials, target_recall=self._target_recall)
+            if chosen is not None:
+                report.chosen, chosen_path = chosen
+            else:
+                logger.warning(
+                    f"No parameters reach a recall of {self._target_recall}"
+                )
+
+            if self._apply and report.chosen is not None and chosen_path is not None:
+                self._apply_trial(trial=report.chosen, index_path=chosen_path)
+
+        self._log_report(report=report)
+        async with aio_open(self._output_path, mode="w") as file:
+            await file.write(report.model_dump_json(indent=2))
+
+    def _tune_annoy(
+        self,
+        embeddings: NDArray[np.float32],
+        queries: NDArray[np.float32],
+        truth: NDArray[np.int64],
+        storage_dir: Path,
+    ) -> List[Tuple[TrialResult, Path]]:
+        trials: List[Tuple[TrialResult, Path]] = []
+
+        for n_trees in self._n_trees:
+            logger.info(f"Building an Annoy index with {n_trees} trees...")
+            start = time.perf_counter()
+            index = build_annoy_index(
+                embeddings=embeddings,
+                parameters=AnnoyParameters(n_trees=n_trees),
+            )
+            build_seconds = time.perf_counter() - start
+
+            index_path = storage_dir / f"annoy-{n_trees}.ann"
+            index.save(str(index_path))
+
+            for search_k in self._search_k:
+                latencies: List[float] = []
+                found: List[List[int]] = []
+                for query in queries:
+                    start = time.perf_counter()
+                    indices, _ = search_annoy_index(
+                        index=index, query_embedding=query, k=self._k, search_k=search_k
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    found.append(indices)
+
+                parameters = ANNParameters(
+                    annoy=AnnoyParameters(n_trees=n_trees, search_k=search_k)
+                )
+                trials.append(
+                    (
+                        self._trial(
+                            backend=VectorIndexBackend.ANNOY,
+                            parameters=parameters,
+                            build_seconds=build_seconds,
+                            found=found,
+                            truth=truth,
+                            latencies=latencies,
+                        ),
+                        index_path,
+                    )
+                )
+
+        return trials
+
+    def _tune_hnsw(
+        self,
+        embeddings: NDArray[np.float32],
+        queries: NDArray[np.float32],
+        truth: NDArray[np.int64],
+        storage_dir: Path,
+    ) -> List[Tuple[TrialResult, Path]]:
+        trials: List[Tuple[TrialResult, Path]] = []
+
+        for m in self._m:
+            for ef_construction in self._ef_construction:
+                logger.info(
+                    f"Building an HNSW graph with m={m}, "
+                    f"ef_construction={ef_construction}..."
+                )
+                start = time.perf_counter()
+                graph: HNSWGraph = build_hnsw_graph(
+                    embeddings=embeddings,
+                    parameters=HNSWParameters(m=m, ef_construction=ef_construction),
+                )
+                build_seconds = time.perf_counter() - start
+
+                # The links file is saved next to the graph, so every graph gets a
+                # directory
+                graph_dir = storage_dir / f"hnsw-{m}-{ef_construction}"
+                graph_dir.mkdir()
+                graph_path = graph_dir / HNSW_INDEX_FILE_NAME
+                graph.save(path=graph_path)
+
+                for ef_search in self._ef_search:
+                    latencies: List[float] = []
+                    found: List[List[int]] = []
+                    for query in queries:
+                        start = time.perf_counter()
+                        indices, _ = graph.search(query=query, k=self._k, ef=ef_search)
+                        latencies.append(time.perf_counter() - start)
+                        found.append(indices.tolist())
+
+                    parameters = ANNParameters(
+                        hnsw=HNSWParameters(
+                            m=m, ef_construction=ef_construction, ef_search=ef_search
+                        )
+                    )
+                    trials.append(
+                        (
+                            self._trial(
+                                backend=VectorIndexBackend.HNSW,
+                                parameters=parameters,
+                                build_seconds=build_seconds,
+                                found=found,
+                                truth=truth,
+                                latencies=latencies,
+                            ),
+                            graph_path,
+                        )
+                    )
+
+        return trials
+
+    def _trial(
+        self,
+        backend: VectorIndexBackend,
+        parameters: ANNParameters,
+        build_seconds: float,
+        found: List[List[int]],
+        truth: NDArray[np.int64],
+        latencies: List[float],
+    ) -> TrialResult:
+        recalls = [
+            len(set(indices) & set(expected.tolist())) / len(expected)
+            for indices, expected in zip(found, truth)
+        ]
+        latencies_ms = np.array(latencies) * 1000.0
+
+        return TrialResult(
+            backend=backend,
+            parameters=parameters,
+            build_seconds=build_seconds,
+            recall=float(np.mean(recalls)),
+            p50_latency_ms=float(np.percentile(latencies_ms, 50)),
+            p95_latency_ms=float(np.percentile(latencies_ms, 95)),
+        )
+
+    def _apply_trial(self, trial: TrialResult, index_path: Path) -> None:
+        """Install the index of a trial and its parameters as a new index version."""
+        data_dir = current_version_dir(storage_dir=self._index_dir)
+        version_dir = create_version_dir(storage_dir=self._index_dir)
+
+        replaced_names = {
+            VECTOR_INDEX_FILE_NAME,
+            HNSW_INDEX_FILE_NAME,
+            ANN_PARAMETERS_FILE_NAME,
+        }
+        for path in data_dir.iterdir():
+            if (
+                path.is_file()
+                and path.name not in replaced_names
+                and not path.match(HNSW_LINKS_FILE_PATTERN)
+            ):
+                link_file(source=path, path=version_dir / path.name)
+
+        if trial.backend == VectorIndexBackend.ANNOY:
+            shutil.copyfile(index_path, version_dir / VECTOR_INDEX_FILE_NAME)
+        else:
+            # The graph and its links file
+            for path in index_path.parent.iterdir():
+                shutil.copyfile(path, version_dir / path.name)
+
+        # Keep the stored parameters of the other backend
+        parameters = read_ann_parameters(storage_dir=data_dir) or ANNParameters()
+        if trial.backend == VectorIndexBackend.ANNOY:
+            parameters.annoy = trial.parameters.annoy
+        else:
+            parameters.hnsw = trial.parameters.hnsw
+        write_ann_parameters(storage_dir=version_dir, parameters=parameters)
+
+        switch_version(storage_dir=self._index_dir, version_dir=version_dir)
+        logger.info(f"Applied the chosen {trial.backend} parameters to the index")
+
+    async def _load_queries(
+        self, embeddings: NDArray[np.float32]
+    ) -> NDArray[np.float32]:
+        if self._annotation_set_file_path is None:
+            # Without questions, use perturbed chunks as queries
+            rng = np.random.default_rng(0)
+            n_queries = min(self._n_queries, len(embeddings))
+            rows = rng.choice(len(embeddings), size=n_queries, replace=False)
+            noise = rng.normal(scale=0.01, size=(len(rows), embeddings.shape[1]))
+            return normalize_embeddings(
+                embeddings=embeddings[np.sort(rows)] + noise.astype(np.float32)
+            )
+
+        async with aio_open(self._annotation_set_file_path, mode="r") as file:
+            annotations = AnnotationSet.model_validate_json(await file.read())
+        questions = [item.question for item in annotations.items][: self._n_queries]
+
+        app_settings: Settings = init_settings()
+        embedder = instantiate_embedder(
+            settings=app_settings, cache_path=self._embedding_cache_path
+        )
+        return normalize_embeddings(
+            embeddings=await embedder.embed_matrix(texts=questions)
+        )
+
+    def _log_report(self, report: TuningReport) -> None:
+        lines = [
+            f"{'backend':<8}{'parameters':<48}{'recall':>8}{'p50 ms':>9}{'p95 ms':>9}"
+        ]
+        for trial in sorted(report.trials, key=lambda trial: trial.p95_latency_ms):
+            if trial.backend == VectorIndexBackend.ANNOY:
+                parameters = trial.parameters.annoy.model_dump_json()
+            else:
+                parameters = trial.parameters.hnsw.model_dump_json()
+            marker = "*" if trial.pareto_optimal else " "
+            lines.append(
+                f"{trial.backend:<8}{parameters:<48}{trial.recall:>8.3f}"
+                f"{trial.p50_latency_ms:>9.3f}{trial.p95_latency_ms:>9.3f} {marker}"
+            )
+        lines.append("* Pareto optimal")
+        logger.info("Tuning results:\n" + "\n".join(lines))
+
+        if report.chosen is not None:
+            logger.info(f"Chosen: {report.chosen.parameters.model_dump_json()}")
+
+
+@click.command()
+@click.option(
+    "-x",
+    "--index-dir",
+    type=click.Path(
+        exists=True, file_okay=False, dir_okay=True, readable=True, path_type=Path
+    ),
+    required=True,
+    help="Location of the vector index directory.",
+)
+@click.option(
+    "-o",
+    "--output-path",
+    required=True,
+    type=click.Path(
+        exists=False, file_okay=True, dir_okay=False, writable=True, path_type=Path
+    ),
+    help="Where to save the report.",
+)
+@click.option(
+    "-b",
+    "--backend",
+    type=click.Choice(
+        [VectorIndexBackend.ANNOY.value, VectorIndexBackend.HNSW.value]
+    ),
+    default=VectorIndexBackend.ANNOY.value,
+    help="The approximate index to tune.",
+)
+@click.option("-k", "--k", type=int, default=10, help="Number of results per query.")
+@click.option(
+    "-r",
+    "--target-recall",
+    type=float,
+    default=0.95,
+    help="The minimum recall@k of the chosen parameters.",
+)
+@click.option(
+    "-n",
+    "--n-queries",
+    type=int,
+    default=200,
+    help="The maximum number of queries.",
+)
+@click.option(
+    "-a",
+    "--annotation-set-file-path",
+    type=click.Path(
+        exists=True, file_okay=True, dir_okay=False, readable=True, path_type=Path
+    ),
+    required=False,
+    help="Questions used as queries. Defaults to perturbed chunk embeddings.",
+)
+@click.option(
+    "-c",
+    "--embedding-cache-path",
+    type=click.Path(
+        exists=False, file_okay=True, dir_okay=False, writable=True, path_type=Path
+    ),
+    required=False,
+    help="SQLite database caching the embeddings of the questions.",
+)
+@click.option("--n-trees", type=IntListParamType(separator=","), required=False)
+@click.option("--search-k", type=IntListParamType(separator=","), required=False)
+@click.option("--m", type=IntListParamType(separator=","), required=False)
+@click.option("--ef-construction", type=IntListParamType(separator=","), required=False)
+@click.option("--ef-search", type=IntListParamType(separator=","), required=False)
+@click.option(
+    "--apply",
+    is_flag=True,
+    default=False,
+    help="Install the chosen index and parameters in the index directory.",
+)
+def main(**kwargs) -> None:  # pyre-ignore [2]
+    async def run_main() -> None:
+        cli = VectorIndexTunerCLI(**kwargs)
+        await cli.run()
+
+    anyio.run(run_main)
+
+
+if __name__ == "__main__":
+    main()